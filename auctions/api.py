@@ -0,0 +1,151 @@
+import hashlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
+
+from .caching import listing_version
+from .models import Bid, Category, Comment, Listing
+from .pagination import get_page_size, keyset_page
+
+# Read-only JSON API for clients that would otherwise scrape the HTML pages.
+#
+# Responses are built from .values() projections, so no model instances and no templates are involved. Lists are
+# keyset paginated like the HTML pages (`?cursor=` from the previous page's `next`). The per-listing endpoints send
+# an ETag and Last-Modified derived from the listing's modified_at (auctions/caching.py), which every bid, comment,
+# edit and close moves forward: a poll with If-None-Match / If-Modified-Since of an unchanged listing gets a 304 after
+# a single primary-key lookup of that column, without building the response.
+
+LISTING_FIELDS = ('id', 'title', 'description', 'starting_bid', 'current_bid', 'is_active', 'created_at', 'ends_at',
+                  'category_id', 'category__name', 'creator__username')
+BID_FIELDS = ('id', 'bidder__username', 'bid_amount', 'is_winning', 'created_at')
+COMMENT_FIELDS = ('id', 'commenter__username', 'content', 'created_at')
+MAX_PAGE_SIZE = 100
+
+
+def api_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder)
+
+
+def page_size(request):
+    try:
+        return min(max(int(request.GET.get('limit', get_page_size())), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise Http404("Invalid page size.")
+
+
+# A page of `queryset.values(*fields)` with a link to the next page, keeping the other query parameters.
+def paginated(request, queryset, fields, serialize):
+    rows, next_cursor = keyset_page(queryset.values(*fields), request.GET.get('cursor'), page_size(request))
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = f'{request.path}?{params.urlencode()}'
+    return api_response({'results': [serialize(row) for row in rows], 'next': next_url})
+
+
+# The listing's modified_at, looked up once per request for both validators (None if there is no such listing).
+def listing_modified_at(request, listing_id):
+    if not hasattr(request, '_listing_modified_at'):
+        request._listing_modified_at = (
+            Listing.objects.filter(pk=listing_id).values_list('modified_at', flat=True).first()
+        )
+    return request._listing_modified_at
+
+
+# The query string (a page's cursor and limit) is part of the tag: each page of bids or comments is its own entity.
+def listing_etag(request, listing_id, **kwargs):
+    modified_at = listing_modified_at(request, listing_id)
+    if modified_at is None:
+        return None
+    query = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()[:12]
+    return f'"{listing_id}-{listing_version(modified_at)}-{query}"'
+
+
+def listing_last_modified(request, listing_id, **kwargs):
+    return listing_modified_at(request, listing_id)
+
+
+listing_condition = condition(etag_func=listing_etag, last_modified_func=listing_last_modified)
+
+
+def serialize_listing(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'starting_bid': row['starting_bid'],
+        'current_bid': row['current_bid'],
+        'is_active': row['is_active'],
+        'created_at': row['created_at'],
+        'ends_at': row['ends_at'],
+        'category': {'id': row['category_id'], 'name': row['category__name']},
+        'creator': row['creator__username'],
+        'url': reverse('api_listing', args=[row['id']]),
+    }
+
+
+def serialize_bid(row):
+    return {'id': row['id'], 'bidder': row['bidder__username'], 'amount': row['bid_amount'],
+            'is_winning': row['is_winning'], 'created_at': row['created_at']}
+
+
+def serialize_comment(row):
+    return {'id': row['id'], 'commenter': row['commenter__username'], 'content': row['content'],
+            'created_at': row['created_at']}
+
+
+# Active listings, newest first; ?category=<id> narrows them down to one category.
+@require_GET
+def listings(request):
+    queryset = Listing.objects.filter(is_active=True)
+    if request.GET.get('category'):
+        try:
+            queryset = queryset.filter(category_id=int(request.GET['category']))
+        except ValueError:
+            raise Http404("Invalid category.")
+    return paginated(request, queryset, LISTING_FIELDS, serialize_listing)
+
+
+@require_GET
+@listing_condition
+def listing(request, listing_id):
+    row = Listing.objects.filter(pk=listing_id).values(*LISTING_FIELDS, 'winning_bid__bid_amount',
+                                                       'winning_bid__bidder__username').first()
+    if row is None:
+        raise Http404("No listing with this id.")
+    data = serialize_listing(row)
+    data['winning_bid'] = None if row['winning_bid__bid_amount'] is None else {
+        'amount': row['winning_bid__bid_amount'], 'bidder': row['winning_bid__bidder__username'],
+    }
+    data['bids_url'] = reverse('api_listing_bids', args=[listing_id])
+    data['comments_url'] = reverse('api_listing_comments', args=[listing_id])
+    return api_response(data)
+
+
+def existing_listing(listing_id):
+    if not Listing.objects.filter(pk=listing_id).exists():
+        raise Http404("No listing with this id.")
+
+
+@require_GET
+@listing_condition
+def listing_bids(request, listing_id):
+    existing_listing(listing_id)
+    return paginated(request, Bid.objects.filter(listing_id=listing_id), BID_FIELDS, serialize_bid)
+
+
+@require_GET
+@listing_condition
+def listing_comments(request, listing_id):
+    existing_listing(listing_id)
+    return paginated(request, Comment.objects.filter(listing_id=listing_id), COMMENT_FIELDS, serialize_comment)
+
+
+# Categories with their number of active listings (maintained incrementally, see Category.active_listing_count).
+@require_GET
+def categories(request):
+    rows = Category.objects.order_by('name').values('id', 'name', 'active_listing_count')
+    return api_response({'results': list(rows)})
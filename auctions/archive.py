@@ -0,0 +1,119 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import (
+    ArchivedBid, ArchivedComment, ArchivedListing, Bid, Comment, Listing, OutboxEvent, ProxyBid, Watchlist,
+)
+
+# Archival of closed listings (hot/cold split).
+#
+# Listings closed more than AUCTIONS_ARCHIVE_AFTER_DAYS ago move to ArchivedListing, their bids and comments to
+# ArchivedBid and ArchivedComment, keeping their ids. A batch is moved in one short transaction with set-based
+# INSERT ... SELECT and DELETE statements, so no rows pass through Python and bids wait at most one batch. Their proxy
+# bids and watchlist entries are dropped: nobody can bid on or watch an archived listing. Listings with notifications
+# still in the outbox wait for the next run.
+# Like the expiry worker, the batch is picked before the transaction starts (SQLite can't upgrade a read transaction
+# to a write one when another writer got in first) and the transaction starts with its first INSERT; the rest of the
+# batch works on the ids that INSERT actually moved.
+#
+# get_archived_listing is the read-through lookup the listing page falls back to for ids no longer in Listing.
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_after_days():
+    return getattr(settings, 'AUCTIONS_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+
+
+def archivable_listings(cutoff):
+    return (
+        Listing.objects.filter(is_active=False, closed_at__lt=cutoff)
+        .exclude(Exists(OutboxEvent.objects.filter(listing=OuterRef('pk'))))
+        .order_by('closed_at', 'id')
+    )
+
+
+def _columns(model, exclude=()):
+    return [field.column for field in model._meta.concrete_fields if field.name not in exclude]
+
+
+def _copy_sql(archive, live, key):
+    columns = ', '.join(_columns(archive, exclude=['archived_at']))
+    extra = ', archived_at' if archive is ArchivedListing else ''
+    return (
+        f"INSERT INTO {archive._meta.db_table} ({columns}{extra}) "
+        f"SELECT {columns}{extra and ', %s'} FROM {live._meta.db_table} WHERE {key} IN ({{ids}})"
+    )
+
+
+LISTING_COPY_SQL = _copy_sql(ArchivedListing, Listing, 'id') + " AND is_active = %s AND closed_at < %s"
+CHILD_COPY_SQL = [_copy_sql(ArchivedBid, Bid, 'listing_id'), _copy_sql(ArchivedComment, Comment, 'listing_id')]
+# Everything pointing at the listings goes before them.
+DELETE_SQL = [
+    f"DELETE FROM {model._meta.db_table} WHERE {key} IN ({{ids}})"
+    for model, key in [(Bid, 'listing_id'), (Comment, 'listing_id'), (ProxyBid, 'listing_id'),
+                       (Watchlist.listings.through, 'listing_id'), (Listing, 'id')]
+]
+
+
+# archive_batch: Moves up to batch_size archivable listings closed before cutoff and returns the ids it moved.
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    ids = list(archivable_listings(cutoff).values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    return _move(ids, cutoff)
+
+
+@write_transaction
+def _move(ids, cutoff):
+    ops = connection.ops
+    with transaction.atomic(), connection.cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(ids))
+        # Re-checks that the listings are still closed: they were picked outside this transaction.
+        cursor.execute(LISTING_COPY_SQL.format(ids=placeholders), [
+            ops.adapt_datetimefield_value(timezone.now()), *ids, False, ops.adapt_datetimefield_value(cutoff),
+        ])
+        moved = list(ArchivedListing.objects.filter(id__in=ids).values_list('id', flat=True))
+        if not moved:
+            return []
+        placeholders = ', '.join(['%s'] * len(moved))
+        for sql in CHILD_COPY_SQL + DELETE_SQL:
+            cursor.execute(sql.format(ids=placeholders), moved)
+    # Nothing to invalidate: the page of an archived listing is rendered from the archive under its own cache key.
+    return moved
+
+
+# archive_closed_listings: Archives batch by batch every listing closed more than `days` days before `now` (or until
+# max_batches), and returns how many were moved.
+def archive_closed_listings(days=None, now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    days = archive_after_days() if days is None else days
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        batches += 1
+        total += len(moved)
+    return total
+
+
+# get_archived_listing: The archived listing with its category, seller, image and winner, or None.
+def get_archived_listing(listing_id):
+    return (
+        ArchivedListing.objects.select_related('category', 'creator', 'image', 'winning_bid__bidder')
+        .filter(pk=listing_id).first()
+    )
+
+
+async def aget_archived_listing(listing_id):
+    return await (
+        ArchivedListing.objects.select_related('category', 'creator', 'image', 'winning_bid__bidder')
+        .filter(pk=listing_id).afirst()
+    )
@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.deprecation import MiddlewareMixin
+
+from .archive import aget_archived_listing
+from .caching import get_fragment_timeout, listing_version
+from .comments import pending_comments
+from .forms import ProxyBidForm
+from .models import Category, Listing, Watchlist
+from .pagination import akeyset_page
+
+# Async versions of the read-only pages, served instead of the views in auctions/views.py to requests coming in
+# through commerce/asgi.py (see AsyncViewsMiddleware). While a query runs, the event loop goes on with other
+# connections instead of a whole worker thread waiting for the database.
+#
+# Templates are rendered synchronously, so everything they show has to be loaded beforehand: querysets are turned
+# into lists, relations are select_related, and request.user is resolved with the async auth API (the lazy
+# request.user would query the database from the event loop, which Django refuses). The listing pages are the
+# exception: they are rendered in a worker thread, so their comments stay a lazy queryset that only runs when the
+# {% cache %} tag has to render the comments fragment again, as in the sync views.
+
+
+async def resolve_user(request):
+    request.user = await request.auser()
+    return request.user
+
+
+async def index(request):
+    user = await resolve_user(request)
+    active_listings, next_cursor = await akeyset_page(
+        Listing.objects.filter(is_active=True).select_related('category', 'creator', 'image'),
+        request.GET.get('cursor'),
+    )
+    return render(request, 'auctions/index.html', {
+        'active_listings': active_listings,
+        'next_cursor': next_cursor,
+        'watched_ids': await Watchlist.ais_watching(user, [listing.id for listing in active_listings]),
+    })
+
+
+async def category_list(request):
+    await resolve_user(request)
+    categories = [category async for category in Category.objects.filter(active_listing_count__gt=0)]
+    return render(request, 'auctions/category_list.html', {'categories': categories})
+
+
+async def category_detail(request, category_id):
+    await resolve_user(request)
+    category = await Category.objects.filter(pk=category_id).afirst()
+    if category is None:
+        raise Http404("No category with this id.")
+    active_listings, next_cursor = await akeyset_page(
+        Listing.objects.filter(category=category, is_active=True), request.GET.get('cursor'),
+    )
+    return render(request, 'auctions/category_detail.html', {
+        'category': category,
+        'active_listings': active_listings,
+        'next_cursor': next_cursor,
+    })
+
+
+async def listing_detail(request, listing_id):
+    user = await resolve_user(request)
+    listing = await Listing.objects.select_related(
+        'category', 'creator', 'image', 'winning_bid__bidder'
+    ).filter(pk=listing_id).afirst()
+    if listing is None:
+        return await archived_listing_detail(request, listing_id)
+    return await sync_to_async(render)(request, 'auctions/listing_detail.html', {
+        'listing': listing,
+        'is_watched': listing.id in await Watchlist.ais_watching(user, [listing.id]),
+        'comments': listing.comments.select_related('commenter').order_by('created_at', 'id'),
+        'pending_comments': pending_comments(listing.id, user),
+        'cache_version': listing_version(listing.modified_at),
+        'cache_timeout': get_fragment_timeout(),
+        'proxy_form': ProxyBidForm(),
+    })
+
+
+async def archived_listing_detail(request, listing_id):
+    listing = await aget_archived_listing(listing_id)
+    if listing is None:
+        raise Http404("No listing with this id.")
+    return await sync_to_async(render)(request, 'auctions/archived_listing.html', {
+        'listing': listing,
+        'comments': listing.comments.select_related('commenter').order_by('created_at', 'id'),
+        'cache_timeout': get_fragment_timeout(),
+    })
+
+
+async def watchlist(request):
+    user = await resolve_user(request)
+    # Like @login_required on the sync view.
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    watchlist, _ = await Watchlist.objects.aget_or_create(user=user)
+    watchlist_items = [listing async for listing in watchlist.listings.select_related('image')]
+    return render(request, 'auctions/watchlist.html', {'watchlist_items': watchlist_items})
+
+
+# Routes requests that came in through the ASGI handler to the URLconf with the async views
+# (AUCTIONS_ASGI_URLCONF); WSGI requests keep using ROOT_URLCONF.
+class AsyncViewsMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.AUCTIONS_ASGI_URLCONF
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Listing
+
+# Versions of cached listing fragments.
+#
+# Every cached fragment of a listing page is keyed by (listing id, version), where the version is the listing's
+# modified_at column. Writes that change what the page shows (bids, comments, closing, editing the listing) move
+# modified_at forward in their own transaction, which makes the old fragments unreachable; they simply age out of the
+# cache. Readers never have to delete anything.
+# The version lives in the listing row, not in the cache, so every worker process reads the same one whatever cache
+# backend is configured: with a per-process cache (locmem) each process just renders a fragment once for itself.
+# Full saves of a listing set modified_at themselves (auto_now); queryset updates, bulk_create and new bids and comments
+# go through invalidate_listing.
+
+DEFAULT_TIMEOUT = 300
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_fragment_timeout():
+    return getattr(settings, 'AUCTIONS_LISTING_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+# listing_version: The fragment version for a listing's modified_at, in microseconds since the epoch.
+def listing_version(modified_at):
+    return (modified_at - EPOCH) // timedelta(microseconds=1)
+
+
+# invalidate_listings: Bumps the version of the listings in one UPDATE. Call it inside the transaction making the
+# change, so the new version commits (and replicates) together with the data it stands for.
+def invalidate_listings(listing_ids):
+    Listing.objects.filter(pk__in=listing_ids).update(modified_at=timezone.now())
+
+
+def invalidate_listing(listing_id):
+    invalidate_listings([listing_id])
@@ -0,0 +1,124 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+from .caching import invalidate_listings
+from .db import write_transaction
+from .models import Comment
+
+logger = logging.getLogger(__name__)
+
+# Write-behind ingestion of comments.
+#
+# add_comment validates a comment and queues it here instead of inserting it on the spot. The queue is written with
+# one bulk_create once AUCTIONS_COMMENT_BATCH_SIZE comments are waiting (by the request that fills it) or
+# AUCTIONS_COMMENT_FLUSH_INTERVAL seconds after the first of them was queued (by a background thread), so a burst of
+# comments on a busy listing takes the database write lock once per batch, and bids don't queue behind every single
+# comment. Until its batch is written the author still sees their comment (pending_comments), and watchers get it over
+# the live event stream right away. created_at is the time the batch is written, at most the flush interval later.
+#
+# The queue lives in the process: a clean exit writes it out, but comments queued in a worker that gets killed are
+# lost. A batch size of 1 writes every comment inline, which is what tests use.
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_pending = []
+# Only one flush at a time, so batches are written in the order they were queued.
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+def batch_size():
+    return getattr(settings, 'AUCTIONS_COMMENT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def flush_interval():
+    return getattr(settings, 'AUCTIONS_COMMENT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+# queue_comment: Queues an unsaved, validated Comment; writes the queue if that fills a batch.
+def queue_comment(comment):
+    with _lock:
+        _pending.append(comment)
+        full = len(_pending) >= batch_size()
+    if full:
+        flush_comments()
+    else:
+        _start_flusher()
+        _wakeup.set()
+
+
+# pending_comments: The user's comments on a listing that are queued but not written yet, oldest first.
+# A comment stays queued until its batch has committed, so it is never missing from the page in between.
+def pending_comments(listing_id, user):
+    if not user.is_authenticated:
+        return []
+    with _lock:
+        return [
+            comment for comment in _pending if comment.listing_id == listing_id and comment.commenter_id == user.pk
+        ]
+
+
+# flush_comments: Writes every queued comment and returns how many were taken off the queue.
+# If the batch fails (e.g. a listing was deleted in the meantime), its comments are written one by one and the ones
+# that still fail are dropped and logged, so one bad comment can't hold up the rest.
+def flush_comments():
+    with _flush_lock:
+        with _lock:
+            batch = list(_pending)
+        if not batch:
+            return 0
+        try:
+            _write(batch)
+        except DatabaseError:
+            logger.exception("Writing %d queued comments failed, writing them one by one", len(batch))
+            for comment in batch:
+                comment.pk = None
+                try:
+                    _write([comment])
+                except DatabaseError:
+                    logger.exception(
+                        "Dropping comment of user %s on listing %s", comment.commenter_id, comment.listing_id,
+                    )
+        with _lock:
+            del _pending[:len(batch)]
+        return len(batch)
+
+
+@write_transaction
+def _write(comments):
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        # bulk_create sends no post_save, so the cached pages are invalidated here.
+        invalidate_listings({comment.listing_id for comment in comments})
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_run_flusher, name='comment-flusher', daemon=True)
+        _flusher.start()
+    atexit.register(flush_comments)
+
+
+def _run_flusher():
+    while True:
+        _wakeup.wait()
+        # Comments queued while this waits go into the same batch.
+        time.sleep(flush_interval())
+        _wakeup.clear()
+        try:
+            flush_comments()
+        except Exception:
+            logger.exception("Flushing queued comments failed")
+        finally:
+            close_old_connections()
@@ -0,0 +1,69 @@
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+# SQLite tuning for deployments that stay on SQLite (see the AUCTIONS_DB_PROFILE = 'edge' profile in settings).
+#
+# configure_sqlite runs the AUCTIONS_SQLITE_PRAGMAS on every new connection (connected to connection_created in
+# auctions/signals.py): WAL lets readers carry on while a bid is being written, synchronous=NORMAL only syncs at
+# checkpoints (safe with WAL), mmap serves reads from the page cache, and busy_timeout makes a writer wait for the
+# lock instead of failing immediately. write_transaction (used by the bid and close services) queues a process's
+# writers up and re-runs transactions that still found the database locked.
+
+DEFAULT_WRITE_RETRIES = 3
+DEFAULT_WRITE_RETRY_BACKOFF = 0.05
+
+BUSY_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def configure_sqlite(connection):
+    pragmas = getattr(settings, 'AUCTIONS_SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_busy_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in BUSY_MESSAGES)
+
+
+# write_transaction: For functions that open their own write transaction.
+#
+# With AUCTIONS_SQLITE_SERIALIZE_WRITES, the threads of a process take turns on a process-local lock before they
+# begin: SQLite allows one writer at a time anyway, and waiting on a mutex hands the lock over immediately, whereas
+# SQLite's busy handler polls with sleeps of up to 100 ms, which under contention leaves the database idle between
+# writers. If the database is still locked (by another process) after the busy timeout, the whole function is re-run
+# up to AUCTIONS_WRITE_RETRIES more times after a randomized, growing pause. Nested in an outer transaction there is
+# nothing safe to retry or serialize, so the function just runs.
+_write_lock = threading.Lock()
+
+
+def write_transaction(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        retries = getattr(settings, 'AUCTIONS_WRITE_RETRIES', DEFAULT_WRITE_RETRIES)
+        backoff = getattr(settings, 'AUCTIONS_WRITE_RETRY_BACKOFF', DEFAULT_WRITE_RETRY_BACKOFF)
+        serialize = getattr(settings, 'AUCTIONS_SQLITE_SERIALIZE_WRITES', False) and connection.vendor == 'sqlite'
+        for attempt in range(retries + 1):
+            try:
+                with _write_lock if serialize else nullcontext():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == retries or not is_busy_error(e):
+                    raise
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.info("%s: %s, retrying in %.3fs", func.__qualname__, e, delay)
+                time.sleep(delay)
+    return wrapper
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Live listing events (new bids, new comments) pushed to browsers over server-sent events.
+#
+# Views publish an event once per database write; the broker fans it out to every connected client of that
+# listing, so watchers no longer have to poll listing_detail. The broker is pluggable through the
+# AUCTIONS_EVENT_BROKER setting: InMemoryBroker below only reaches clients connected to the same process,
+# a deployment running several ASGI workers would plug in a broker backed by a shared bus (e.g. Redis pub/sub)
+# implementing the same publish()/subscribe() interface.
+
+DEFAULT_BROKER = 'auctions.events.InMemoryBroker'
+
+
+def channel_name(listing_id):
+    return f'listing:{listing_id}'
+
+
+# Base class for brokers. publish() may be called from any thread (sync views run in a thread pool under ASGI);
+# subscribe() is an async context manager yielding a Subscription, used from the streaming view.
+class Broker:
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+
+class Subscription:
+    # Events a slow client has not consumed yet. When it is full the client is too far behind to care about
+    # old bids, so the oldest event is dropped rather than blocking the publisher.
+    MAX_PENDING = 100
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+
+    def deliver(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            # Hand the event to the subscriber's event loop; this never blocks on a slow client.
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def subscribe(self, channel):
+        return _InMemorySubscribe(self, channel)
+
+
+class _InMemorySubscribe:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+
+    async def __aenter__(self):
+        self.subscription = Subscription()
+        with self.broker.lock:
+            self.broker.subscribers.setdefault(self.channel, set()).add(self.subscription)
+        return self.subscription
+
+    async def __aexit__(self, *exc_info):
+        with self.broker.lock:
+            subscriptions = self.broker.subscribers.get(self.channel)
+            subscriptions.discard(self.subscription)
+            if not subscriptions:
+                del self.broker.subscribers[self.channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'AUCTIONS_EVENT_BROKER', DEFAULT_BROKER))()
+
+
+# Publish an event for a listing once the surrounding transaction commits, so clients never see a bid that
+# was rolled back.
+def publish_listing_event(listing_id, event_type, **data):
+    event = {'type': event_type, 'listing_id': listing_id, **data}
+    transaction.on_commit(lambda: get_broker().publish(channel_name(listing_id), event))
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
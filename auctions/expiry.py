@@ -0,0 +1,95 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from .db import is_busy_error, write_transaction
+from .models import Listing
+from .services import listings_closed
+
+logger = logging.getLogger(__name__)
+
+# Automatic closing of auctions whose ends_at has passed.
+#
+# Due listings are pulled in end-time order from the partial index on (ends_at, id) WHERE is_active, a batch per
+# transaction. Each listing is closed with a conditional UPDATE (... WHERE id = %s AND is_active AND ends_at <= now),
+# so when several workers run at once a listing is closed by exactly one of them; the others' updates simply match no
+# row, as do those of listings extended or reopened since the batch was read.
+# Where the database supports SELECT ... FOR UPDATE SKIP LOCKED the batch is claimed with it, so concurrent workers
+# take different batches instead of racing for the same rows. SQLite can't lock rows and a transaction that reads
+# before it writes can deadlock with another writer, so there the batch is read first and the transaction starts with
+# the UPDATEs. A batch that finds the database locked is retried (write_transaction). The winner needs no extra work: place_bid keeps Listing.winning_bid current and refuses bids once
+# ends_at has passed.
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def due_listings(now):
+    return Listing.objects.filter(is_active=True, ends_at__isnull=False, ends_at__lte=now).order_by('ends_at', 'id')
+
+
+# expire_batch: Closes up to batch_size due listings and returns the ids of those this call closed.
+@write_transaction
+def expire_batch(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    now = now or timezone.now()
+    due = due_listings(now).values_list('id', 'category_id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            return _close(list(due.select_for_update(skip_locked=True)[:batch_size]), now)
+    rows = list(due[:batch_size])
+    with transaction.atomic():
+        return _close(rows, now)
+
+
+# The per-listing UPDATE runs tens of thousands of times per backlog, so it skips the ORM's query building.
+CLOSE_SQL = (
+    f"UPDATE {Listing._meta.db_table} SET is_active = %s, closed_at = %s, modified_at = %s "
+    f"WHERE id = %s AND is_active = %s AND ends_at <= %s"
+)
+
+
+def _close(rows, now):
+    closed = []
+    closed_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    due_by = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        for listing_id, category_id in rows:
+            cursor.execute(CLOSE_SQL, [False, closed_at, closed_at, listing_id, True, due_by])
+            if cursor.rowcount:
+                closed.append((listing_id, category_id))
+    listings_closed(closed)
+    return [listing_id for listing_id, _ in closed]
+
+
+# expire_due_listings: Closes due listings batch by batch until none are left (or max_batches is reached) and
+# returns how many this worker closed. `now` is fixed at the start, so a run always terminates even while new
+# auctions keep ending.
+def expire_due_listings(now=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    now = now or timezone.now()
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        closed = expire_batch(now, batch_size)
+        batches += 1
+        total += len(closed)
+        if not closed and not due_listings(now).exists():
+            break
+    return total
+
+
+def run_worker(interval=None, batch_size=DEFAULT_BATCH_SIZE, stop=lambda: False):
+    interval = interval if interval is not None else getattr(settings, 'AUCTIONS_EXPIRY_INTERVAL', 5)
+    while not stop():
+        started = time.monotonic()
+        try:
+            closed = expire_due_listings(batch_size=batch_size)
+        except OperationalError as e:
+            # Still locked after the retries: the next sweep picks the listings up.
+            if not is_busy_error(e):
+                raise
+            logger.warning("Expiry sweep stopped: %s", e)
+            closed = 0
+        if closed:
+            logger.info("Closed %d expired auction(s) in %.2fs", closed, time.monotonic() - started)
+        time.sleep(interval)
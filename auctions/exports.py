@@ -0,0 +1,160 @@
+import csv
+import json
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+
+from .models import Bid, Listing
+
+# Exports of auction results: the listings closed in a range of days with their winner and full bid history, as CSV
+# or JSON lines, for the export_results command and the staff-only results_export view.
+#
+# There is one row per bid, with the listing's columns repeated and is_winning marking the winning bid, and one row
+# with empty bid columns for a listing that closed without bids. Listings are read in keyset batches of batch_size
+# in (closed_at, id) order from listing_closed_idx, never with OFFSET; the bids of a batch come from one query ordered
+# by (listing_id, id), which follows the index on Bid.listing, and are streamed with QuerySet.iterator(chunk_size).
+# So memory stays bounded by one batch however many bids are exported, and rows go out as they are read. Within a
+# batch the listings are written in id order. Like every read of the auctions models, exports go to a read replica
+# when one is configured (auctions/routers.py).
+
+EXPORT_COLUMNS = [
+    'listing_id', 'title', 'category', 'seller', 'starting_bid', 'final_price', 'ends_at', 'closed_at', 'winner',
+    'winning_bid_id', 'bid_id', 'bidder', 'bid_amount', 'bid_created_at', 'is_winning',
+]
+LISTING_FIELDS = ('id', 'title', 'category__name', 'creator__username', 'starting_bid', 'current_bid', 'ends_at',
+                  'closed_at', 'winning_bid_id', 'winning_bid__bidder__username')
+BID_FIELDS = ('listing_id', 'id', 'bidder__username', 'bid_amount', 'created_at')
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CHUNK_SIZE = 2000
+# Lines are sent in blocks of about this many characters rather than one by one.
+BLOCK_SIZE = 64 * 1024
+
+
+# day_range: The [start, end) of `days` days from `date` in the current time zone.
+def day_range(date, days=1):
+    start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(date + timedelta(days=days), datetime.min.time()))
+
+
+def closed_listings(start, end):
+    return Listing.objects.filter(closed_at__gte=start, closed_at__lt=end).order_by('closed_at', 'id')
+
+
+# export_rows: Yields the export rows (lists in EXPORT_COLUMNS order) of the listings closed in [start, end).
+def export_rows(start, end, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE):
+    listings = closed_listings(start, end).values(*LISTING_FIELDS)
+    last = None
+    while True:
+        page = listings
+        if last is not None:
+            page = page.filter(Q(closed_at__gt=last['closed_at']) | Q(closed_at=last['closed_at'], id__gt=last['id']))
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        yield from _batch_rows(sorted(batch, key=lambda listing: listing['id']), chunk_size)
+
+
+def _batch_rows(batch, chunk_size):
+    bids = (
+        Bid.objects.filter(listing_id__in=[listing['id'] for listing in batch])
+        .order_by('listing_id', 'id')
+        .values_list(*BID_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    bid = next(bids, None)
+    for listing in batch:
+        winning_bid_id = listing['winning_bid_id']
+        head = [
+            listing['id'], listing['title'], listing['category__name'], listing['creator__username'],
+            listing['starting_bid'], listing['current_bid'] if winning_bid_id else None, listing['ends_at'],
+            listing['closed_at'], listing['winning_bid__bidder__username'], winning_bid_id,
+        ]
+        if bid is None or bid[0] != listing['id']:
+            yield head + [None, None, None, None, None]
+            continue
+        while bid is not None and bid[0] == listing['id']:
+            _, bid_id, bidder, amount, created_at = bid
+            yield head + [bid_id, bidder, amount, created_at, bid_id == winning_bid_id]
+            bid = next(bids, None)
+
+
+class _Echo:
+    # csv.writer target that hands the formatted line back instead of storing it.
+    def write(self, value):
+        return value
+
+
+# Full-precision ISO 8601 times in both formats (DjangoJSONEncoder would cut them to milliseconds).
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, map(_cell, row))), cls=DjangoJSONEncoder) + '\n'
+
+
+# export_lines: The export of [start, end) as text blocks in the given format ('csv' or 'jsonl').
+def export_lines(start, end, fmt='csv', batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE):
+    lines = (csv_lines if fmt == 'csv' else jsonl_lines)(export_rows(start, end, batch_size, chunk_size))
+    block, size = [], 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield ''.join(block)
+            block, size = [], 0
+    if block:
+        yield ''.join(block)
+
+
+# Under ASGI a StreamingHttpResponse reads a synchronous iterator to the end before sending anything, so there the
+# blocks are pulled one at a time, all on the same thread (the database cursor belongs to it).
+async def _async_blocks(blocks):
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while (block := await next_block(blocks, None)) is not None:
+        yield block
+
+
+# Streams the results of ?date=YYYY-MM-DD (default: yesterday) and the following ?days=N-1 days as ?format=csv
+# (default) or jsonl.
+@staff_member_required
+@require_GET
+def results_export(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise Http404("Unknown export format.")
+    try:
+        date = parse_date(request.GET['date']) if 'date' in request.GET else timezone.localdate() - timedelta(days=1)
+        days = int(request.GET.get('days', 1))
+    except ValueError:
+        date = None
+    if date is None or not 1 <= days <= 366:
+        raise Http404("Invalid export date range.")
+    content_type, extension = FORMATS[fmt]
+    blocks = export_lines(*day_range(date, days), fmt)
+    if isinstance(request, ASGIRequest):
+        blocks = _async_blocks(blocks)
+    response = StreamingHttpResponse(blocks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="auction-results-{date.isoformat()}.{extension}"'
+    return response
@@ -1,15 +1,46 @@
+from decimal import Decimal
+
 from django import forms
+from .images import ingest_image, inspect_image
 from .models import Listing
 from django import forms
 
 class ListingForm(forms.ModelForm):
+    # Uploaded images go to the content-addressed image store (auctions/images.py), not to a model FileField.
+    image_file = forms.FileField(label='Image', required=False)
+
     class Meta:
         model = Listing
-        fields = ['title', 'description', 'starting_bid', 'category', 'is_active', 'url']
+        fields = ['title', 'description', 'starting_bid', 'category', 'is_active', 'url', 'ends_at']
+        widgets = {
+            'ends_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        }
+
+    def clean_image_file(self):
+        upload = self.cleaned_data.get('image_file')
+        if upload:
+            inspect_image(upload)
+        return upload
+
+    def save(self, commit=True):
+        listing = super().save(commit=False)
+        upload = self.cleaned_data.get('image_file')
+        if upload:
+            listing.image = ingest_image(upload)
+        if commit:
+            listing.save()
+            self.save_m2m()
+        return listing
 
 class BidForm(forms.Form):
     bid_amount = forms.DecimalField(label='Bid Amount', max_digits=10, decimal_places=2)
 
+class CommentForm(forms.Form):
+    content = forms.CharField(max_length=300, widget=forms.Textarea)
+
+class ProxyBidForm(forms.Form):
+    max_amount = forms.DecimalField(label='Maximum Bid', max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
 class YourBidForm(forms.Form):
     bid_amount = forms.DecimalField(
         label='Bid Amount',
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is only needed for image uploads.
+    Image = ImageOps = None
+
+from .caching import invalidate_listings
+from .models import StoredImage
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed storage for listing images.
+#
+# An upload is hashed while it is read; the original is stored as cas/<2 hex>/<sha256>.<ext> and resized copies
+# next to it as <sha256>_<size>.<webp|jpg>. Identical uploads map to the same path and the same StoredImage row,
+# so they are stored and thumbnailed once. Thumbnails are generated off the request thread by a small worker
+# pool (AUCTIONS_THUMBNAIL_WORKERS; 0 generates them inline, which is what tests and the backfill command use).
+
+CAS_DIR = 'cas'
+# The templates (listing_image.html) use the 300 and 600 sizes.
+DEFAULT_THUMBNAIL_SIZES = (300, 600)
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def thumbnail_sizes():
+    return getattr(settings, 'AUCTIONS_THUMBNAIL_SIZES', DEFAULT_THUMBNAIL_SIZES)
+
+
+def _prefix(sha256):
+    return f'{CAS_DIR}/{sha256[:2]}/{sha256}'
+
+
+def original_path(image):
+    return f'{_prefix(image.sha256)}.{image.extension}'
+
+
+def thumbnail_path(sha256, size, fmt):
+    return f"{_prefix(sha256)}_{size}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def original_url(image):
+    return default_storage.url(original_path(image))
+
+
+def thumbnail_urls(image):
+    return {
+        str(size): {fmt: default_storage.url(thumbnail_path(image.sha256, size, fmt)) for fmt in THUMBNAIL_FORMATS}
+        for size in thumbnail_sizes()
+    }
+
+
+# inspect_image: Returns (sha256, extension, width, height) of an uploaded or local file, reading it in chunks.
+# Raises ValidationError if it isn't an image Pillow can decode.
+def inspect_image(file):
+    if Image is None:
+        raise ValidationError("Image uploads require the Pillow package.")
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    try:
+        with Image.open(file) as picture:
+            image_format = picture.format
+            width, height = picture.size
+            picture.verify()
+    except Exception:
+        raise ValidationError("Upload a valid image.")
+    finally:
+        file.seek(0)
+    if image_format not in FORMAT_EXTENSIONS:
+        raise ValidationError(f"Unsupported image format: {image_format}.")
+    return digest.hexdigest(), FORMAT_EXTENSIONS[image_format], width, height
+
+
+# ingest_image: Stores the file (unless identical content is already stored) and returns its StoredImage.
+# Unless schedule is False, thumbnails are scheduled once the surrounding transaction commits.
+def ingest_image(file, schedule=True):
+    sha256, extension, width, height = inspect_image(file)
+    image, created = StoredImage.objects.get_or_create(
+        sha256=sha256, defaults={'extension': extension, 'width': width, 'height': height}
+    )
+    path = original_path(image)
+    if not default_storage.exists(path):
+        stored_as = default_storage.save(path, file)
+        if stored_as != path:
+            # Another request stored the same content in the meantime; keep a single copy.
+            default_storage.delete(stored_as)
+    if schedule and not image.thumbnails_ready:
+        transaction.on_commit(lambda: schedule_thumbnails(sha256))
+    return image
+
+
+def generate_thumbnails(sha256):
+    image = StoredImage.objects.get(pk=sha256)
+    with default_storage.open(original_path(image), 'rb') as original, Image.open(original) as picture:
+        picture = ImageOps.exif_transpose(picture).convert('RGB')
+        for size in thumbnail_sizes():
+            resized = picture.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            for fmt, pil_format in THUMBNAIL_FORMATS.items():
+                path = thumbnail_path(sha256, size, fmt)
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, quality=82, optimize=True)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                default_storage.save(path, ContentFile(buffer.getvalue()))
+    StoredImage.objects.filter(pk=sha256).update(thumbnails_ready=True)
+    # Cached listing pages still point at the original.
+    invalidate_listings(image.listings.values('id'))
+
+
+# ====================== worker pool ====================================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run_in_worker(sha256):
+    try:
+        generate_thumbnails(sha256)
+    except Exception:
+        logger.exception("Thumbnail generation failed for %s", sha256)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(sha256):
+    global _executor
+    workers = getattr(settings, 'AUCTIONS_THUMBNAIL_WORKERS', 2)
+    if not workers:
+        generate_thumbnails(sha256)
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+    return _executor.submit(_run_in_worker, sha256)
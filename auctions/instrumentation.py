@@ -0,0 +1,140 @@
+import bisect
+import logging
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('auctions.instrumentation')
+
+# Per-view request metrics: wall time, time spent in the database, number of queries and number of duplicate
+# queries (the same SQL run more than once in a request, the signature of an N+1 loop).
+#
+# Enabled with AUCTIONS_INSTRUMENTATION = True. The last AUCTIONS_INSTRUMENTATION_WINDOW requests of every view are
+# kept in memory (per process) and exposed as histograms at the staff-only `instrumentation` endpoint. A warning is
+# logged whenever a request runs more queries than its budget: AUCTIONS_QUERY_BUDGETS[view name] if set, otherwise
+# AUCTIONS_QUERY_BUDGET.
+
+DEFAULT_WINDOW = 1000
+DEFAULT_QUERY_BUDGET = 10
+
+# Upper bounds of the histogram buckets; the last bucket catches everything above.
+TIME_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    # Used as a connection execute_wrapper: sees every query run on the connection while installed.
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values())
+
+
+class MetricsRegistry:
+    FIELDS = ('wall_ms', 'db_ms', 'queries', 'duplicates')
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, view_name, **sample):
+        with self.lock:
+            self.samples[view_name].append(tuple(sample[field] for field in self.FIELDS))
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def snapshot(self):
+        with self.lock:
+            samples = {view: list(values) for view, values in self.samples.items()}
+        return {view: self.summarize(values) for view, values in sorted(samples.items())}
+
+    def summarize(self, values):
+        columns = dict(zip(self.FIELDS, zip(*values)))
+        summary = {'requests': len(values)}
+        for field, buckets in (('wall_ms', TIME_BUCKETS_MS), ('db_ms', TIME_BUCKETS_MS), ('queries', QUERY_BUCKETS)):
+            summary[field] = self.describe(columns[field], buckets)
+        summary['duplicates'] = {'max': max(columns['duplicates']), 'requests_with_duplicates':
+                                 sum(1 for n in columns['duplicates'] if n)}
+        return summary
+
+    @staticmethod
+    def describe(values, buckets):
+        ordered = sorted(values)
+        counts = [0] * (len(buckets) + 1)
+        for value in ordered:
+            counts[bisect.bisect_left(buckets, value)] += 1
+        labels = [f'<={bound}' for bound in buckets] + [f'>{buckets[-1]}']
+        return {
+            'p50': round(ordered[int(0.50 * (len(ordered) - 1))], 3),
+            'p95': round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+            'p99': round(ordered[int(0.99 * (len(ordered) - 1))], 3),
+            'max': round(ordered[-1], 3),
+            'mean': round(statistics.mean(ordered), 3),
+            'histogram': dict(zip(labels, counts)),
+        }
+
+
+registry = MetricsRegistry(getattr(settings, 'AUCTIONS_INSTRUMENTATION_WINDOW', DEFAULT_WINDOW))
+
+
+def query_budget(view_name):
+    budgets = getattr(settings, 'AUCTIONS_QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'AUCTIONS_QUERY_BUDGET', DEFAULT_QUERY_BUDGET))
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'AUCTIONS_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is None:
+            # 404s that didn't resolve to any view.
+            return response
+        view_name = match.view_name
+        registry.record(
+            view_name,
+            wall_ms=wall * 1000,
+            db_ms=recorder.duration * 1000,
+            queries=recorder.count,
+            duplicates=recorder.duplicates,
+        )
+        budget = query_budget(view_name)
+        if recorder.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d, %d duplicates) for %s",
+                view_name, recorder.count, budget, recorder.duplicates, request.path,
+            )
+        return response
@@ -0,0 +1,83 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from auctions.archive import DEFAULT_BATCH_SIZE, archive_after_days, archive_closed_listings
+from auctions.models import ArchivedBid, ArchivedComment, ArchivedListing, Bid, Comment, Listing
+
+HOT_AND_COLD = [Listing, Bid, Comment, ArchivedListing, ArchivedBid, ArchivedComment]
+
+
+# Moves listings closed more than --days days ago (default: AUCTIONS_ARCHIVE_AFTER_DAYS) with their bids and
+# comments to the archive tables, see auctions/archive.py. Run it from cron, e.g. nightly. --report prints the row
+# counts and sizes of the hot and cold tables and the latency of the active-path queries before and after.
+#
+#     python manage.py archive_listings
+#     python manage.py archive_listings --days 30 --batch-size 200 --report
+class Command(BaseCommand):
+    help = "Archive long-closed listings with their bids and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive listings closed more than this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Listings per transaction.")
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--report', action='store_true', help="Print table sizes and query latencies as JSON.")
+        parser.add_argument('--samples', type=int, default=200, help="Runs per query for the latency report.")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else archive_after_days()
+        if options['report']:
+            before = {'tables': self.tables(), 'latency_ms': self.latencies(options['samples'])}
+        started = time.perf_counter()
+        moved = archive_closed_listings(days=days, batch_size=options['batch_size'],
+                                        max_batches=options['max_batches'])
+        elapsed = time.perf_counter() - started
+        if options['report']:
+            after = {'tables': self.tables(), 'latency_ms': self.latencies(options['samples'])}
+            self.stdout.write(json.dumps({'archived': moved, 'seconds': round(elapsed, 2),
+                                          'before': before, 'after': after}, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} listing(s) closed more than {days} day(s) ago."))
+
+    def tables(self):
+        tables = {model._meta.db_table: {'rows': model.objects.count()} for model in HOT_AND_COLD}
+        if connection.vendor == 'sqlite':
+            # Bytes in use by each table and its indexes (pages freed by archiving are reused, not returned to the OS).
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT m.tbl_name, SUM(s.pgsize - s.unused) FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                    f"WHERE m.tbl_name IN ({', '.join(['%s'] * len(tables))}) GROUP BY m.tbl_name", list(tables),
+                )
+                for table, size in cursor.fetchall():
+                    tables[table]['bytes'] = size
+        return tables
+
+    # Median latency of the queries behind the active listing pages and bidding.
+    def latencies(self, samples):
+        listing = Listing.objects.filter(is_active=True).values('id', 'category_id', 'creator_id').first() or {}
+        queries = {
+            'active_feed': lambda: list(
+                Listing.objects.filter(is_active=True).order_by('-created_at', '-id').values_list('id')[:25]),
+            'category_feed': lambda: list(
+                Listing.objects.filter(is_active=True, category_id=listing.get('category_id'))
+                .order_by('-created_at', '-id').values_list('id')[:25]),
+            'listing_top_bid': lambda: list(
+                Bid.objects.filter(listing_id=listing.get('id')).order_by('-bid_amount').values_list('id')[:1]),
+            'listing_comments': lambda: list(
+                Comment.objects.filter(listing_id=listing.get('id')).order_by('created_at', 'id').values_list('id')),
+            'bidder_history': lambda: list(
+                Bid.objects.filter(bidder_id=listing.get('creator_id')).order_by('-id').values_list('id')[:50]),
+        }
+        report = {}
+        for name, query in queries.items():
+            query()
+            timings = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - started) * 1000)
+            report[name] = round(statistics.median(timings), 4)
+        return report
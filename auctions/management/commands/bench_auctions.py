@@ -0,0 +1,110 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from auctions.models import Category, Listing, User
+
+
+# Drives the main views through Django's test client against the configured database and reports, per view,
+# latency percentiles, queries per request and throughput as JSON, so runs can be diffed between releases:
+#
+#     python manage.py seed_auctions --listings 100000 --bids 1000000
+#     python manage.py bench_auctions --requests 500 --output bench-before.json
+#
+# The bid scenario places real bids, so run it against a seeded scratch database.
+class Command(BaseCommand):
+    help = "Benchmark the index, listing_detail, bid and category_list views; prints JSON."
+
+    SCENARIOS = ['index', 'listing_detail', 'bid', 'category_list']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per scenario.")
+        parser.add_argument('--scenario', action='append', choices=self.SCENARIOS,
+                            help="Scenario to run, may be repeated (default: all).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        listing_ids = list(Listing.objects.filter(is_active=True).values_list('id', flat=True)[:10000])
+        if not listing_ids:
+            raise CommandError("No active listings, seed the database first (manage.py seed_auctions).")
+        self.listing_ids = listing_ids
+        self.category_ids = list(Category.objects.values_list('id', flat=True)[:1000])
+
+        bidder = User.objects.order_by('id').first()
+        self.anonymous = Client()
+        self.authenticated = Client()
+        self.authenticated.force_login(bidder)
+
+        report = {
+            'requests_per_scenario': options['requests'],
+            'database': connection.vendor,
+            'scenarios': {},
+        }
+        # The test client talks to the host "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in options['scenario'] or self.SCENARIOS:
+                scenario = getattr(self, f'request_{name}')
+                for _ in range(options['warmup']):
+                    scenario()()
+                report['scenarios'][name] = self.run(scenario, options['requests'])
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+
+    def run(self, scenario, requests):
+        latencies = []
+        queries = []
+        elapsed = 0
+        for _ in range(requests):
+            send = scenario()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = send()
+                latency = time.perf_counter() - start
+            latencies.append(latency * 1000)
+            elapsed += latency
+            if response.status_code >= 400:
+                raise CommandError(f"{response.request['PATH_INFO']} returned {response.status_code}")
+            queries.append(len(captured))
+
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries_per_request': round(statistics.mean(queries), 2),
+            'max_queries': max(queries),
+            'throughput_rps': round(requests / elapsed, 1),
+        }
+
+    # ==================== scenarios ====================
+    # Each scenario prepares a request (outside the measurement) and returns a callable that sends it.
+    def request_index(self):
+        return lambda: self.anonymous.get(reverse('index'))
+
+    def request_listing_detail(self):
+        url = reverse('listing_detail', args=[self.rng.choice(self.listing_ids)])
+        return lambda: self.authenticated.get(url)
+
+    def request_category_list(self):
+        return lambda: self.anonymous.get(reverse('category_list'))
+
+    def request_bid(self):
+        listing = Listing.objects.only('current_bid', 'starting_bid').get(pk=self.rng.choice(self.listing_ids))
+        data = {'bid_amount': max(listing.current_bid, listing.starting_bid) + 1}
+        return lambda: self.authenticated.post(reverse('bid', args=[listing.id]), data)
@@ -0,0 +1,160 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from auctions.models import Category, Listing, User
+from auctions.services import place_bid
+
+
+# Hammers a few hot listings with bids from --writers processes while --readers processes load them, and reports bid
+# throughput (accepted bids, and all bids placed whether they won or were outbid), latency and how many bids failed
+# with "database is locked". Run it once per database setup, or let
+# --compare run it with the plain settings and with the SQLite edge profile (AUCTIONS_DB_PROFILE=edge, see
+# auctions/db.py), each in a fresh process:
+#
+#     python manage.py bench_bid_concurrency --compare --writers 16 --readers 16 --seconds 10
+#
+# The plain run switches the database file back to SQLite's default rollback journal (WAL mode is stored in the file)
+# and disables the write retries, to show the behaviour before tuning. Run it against a scratch database.
+class Command(BaseCommand):
+    help = "Measure concurrent bid throughput on SQLite; --compare runs the plain and the edge profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--reader-pause-ms', type=float, default=20.0,
+                            help="Pause between two reads of a reader, so readers behave like clients, not a busy loop.")
+        parser.add_argument('--listings', type=int, default=5, help="Number of hot listings the bids go to.")
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--compare', action='store_true')
+        parser.add_argument('--plain', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            self.compare(options)
+            return
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark is about SQLite.")
+        if options['plain']:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+            with override_settings(AUCTIONS_WRITE_RETRIES=0):
+                report = self.run(options)
+        else:
+            report = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def compare(self, options):
+        argv = [sys.argv[0], 'bench_bid_concurrency', '--writers', str(options['writers']),
+                '--readers', str(options['readers']),
+                '--reader-pause-ms', str(options['reader_pause_ms']), '--listings', str(options['listings']),
+                '--seconds', str(options['seconds']), '--seed', str(options['seed'])]
+        reports = {}
+        for name, profile, extra in (('plain', '', ['--plain']), ('edge', 'edge', [])):
+            env = dict(os.environ, AUCTIONS_DB_PROFILE=profile)
+            result = subprocess.run([sys.executable, *argv, *extra], env=env, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f"The {name} run failed:\n{result.stderr}")
+            reports[name] = json.loads(result.stdout)
+        reports['speedup'] = round(reports['edge']['bids_per_second'] / max(reports['plain']['bids_per_second'], 0.1), 2)
+        self.stdout.write(json.dumps(reports, indent=2))
+
+    def run(self, options):
+        tag = f'conc{int(time.time() * 1000)}'
+        seller = User.objects.create(username=f'{tag}-seller')
+        bidders = User.objects.bulk_create([User(username=f'{tag}-bidder{i}') for i in range(options['writers'])])
+        category, _ = Category.objects.get_or_create(name='Concurrency benchmark')
+        listing_ids = [
+            Listing.objects.create(
+                title=f'Hot listing {i}', description='Concurrency benchmark', category=category, creator=seller,
+                starting_bid=Decimal('1.00'), current_bid=Decimal('1.00'),
+            ).pk
+            for i in range(options['listings'])
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+
+        # One process per client, like the workers of an application server: they only share the database file.
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        barrier = context.Barrier(options['writers'] + options['readers'])
+        connections.close_all()
+        processes = [context.Process(target=self.writer, args=(bidder.pk, listing_ids, options, i, barrier, results))
+                     for i, bidder in enumerate(bidders)]
+        processes += [context.Process(target=self.reader, args=(listing_ids, options, i, barrier, results))
+                      for i in range(options['readers'])]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        stats = {'accepted': 0, 'rejected': 0, 'locked': 0, 'reads': 0, 'read_errors': 0}
+        latencies = []
+        for outcome in outcomes:
+            latencies += outcome.pop('latencies', [])
+            for key, value in outcome.items():
+                stats[key] += value
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else [0] * 99
+        return {
+            'profile': settings.AUCTIONS_DB_PROFILE or 'plain',
+            'journal_mode': journal_mode,
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'seconds': options['seconds'],
+            'bids_per_second': round(stats['accepted'] / options['seconds'], 1),
+            'attempted_bids_per_second': round((stats['accepted'] + stats['rejected']) / options['seconds'], 1),
+            'reads_per_second': round(stats['reads'] / options['seconds'], 1),
+            'bid_p50_ms': round(percentiles[49], 3),
+            'bid_p99_ms': round(percentiles[98], 3),
+            **stats,
+        }
+
+    @staticmethod
+    def writer(bidder_id, listing_ids, options, seed, barrier, results):
+        rng = random.Random(options['seed'] + seed)
+        bidder = User.objects.get(pk=bidder_id)
+        outcome = {'accepted': 0, 'rejected': 0, 'locked': 0, 'latencies': []}
+        barrier.wait()
+        stop = time.monotonic() + options['seconds']
+        while time.monotonic() < stop:
+            listing_id = rng.choice(listing_ids)
+            start = time.perf_counter()
+            try:
+                current = Listing.objects.values_list('current_bid', flat=True).get(pk=listing_id)
+                accepted = place_bid(listing_id, bidder, current + Decimal(rng.randint(1, 100)) / 100)
+            except OperationalError:
+                outcome['locked'] += 1
+                continue
+            outcome['latencies'].append((time.perf_counter() - start) * 1000)
+            outcome['accepted' if accepted is not None else 'rejected'] += 1
+        results.put(outcome)
+
+    @staticmethod
+    def reader(listing_ids, options, seed, barrier, results):
+        rng = random.Random(options['seed'] + 1000 + seed)
+        outcome = {'reads': 0, 'read_errors': 0}
+        barrier.wait()
+        stop = time.monotonic() + options['seconds']
+        while time.monotonic() < stop:
+            try:
+                list(Listing.objects.select_related('winning_bid').filter(pk=rng.choice(listing_ids)))
+                outcome['reads'] += 1
+            except OperationalError:
+                outcome['read_errors'] += 1
+            time.sleep(options['reader_pause_ms'] / 1000)
+        results.put(outcome)
@@ -0,0 +1,101 @@
+import json
+import random
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions.models import Bid, Category, Listing, ProxyBid, User
+from auctions.services import bid_increment, place_proxy_bid
+
+
+# Places thousands of competing maximum bids on one listing and reports the time per proxy, how many Bid rows were
+# written (against the increments a bid-by-bid war would have written), and whether the outcome is right: the highest
+# maximum wins at one increment above the runner-up.
+#
+#     python manage.py bench_proxy_bids --proxies 5000 --threads 4
+#
+# It creates its own users, category and listing; run it against a scratch database.
+class Command(BaseCommand):
+    help = "Benchmark proxy bid resolution with many competing maximums on one listing; prints JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proxies', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--max-price', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['proxies'] < 2 or options['threads'] < 1:
+            raise CommandError("Use at least 2 proxies and 1 thread.")
+        rng = random.Random(options['seed'])
+        tag = f'proxy{int(time.time() * 1000)}'
+        seller = User.objects.create(username=f'{tag}-seller')
+        bidders = User.objects.bulk_create(
+            [User(username=f'{tag}-bidder{i}') for i in range(options['proxies'])], batch_size=500,
+        )
+        category, _ = Category.objects.get_or_create(name='Proxy bids')
+        listing = Listing.objects.create(
+            title=f'Proxy bids {tag}', description='Proxy bid benchmark', category=category, creator=seller,
+            starting_bid=Decimal('1.00'), current_bid=Decimal('1.00'),
+        )
+        maximums = [Decimal(rng.randint(200, options['max_price'] * 100)) / 100 for _ in bidders]
+        work = list(zip(bidders, maximums))
+        chunks = [work[i::options['threads']] for i in range(options['threads'])]
+
+        latencies = []
+        accepted = []
+        lock = threading.Lock()
+
+        def run(chunk):
+            try:
+                for bidder, maximum in chunk:
+                    start = time.perf_counter()
+                    proxy = place_proxy_bid(listing.pk, bidder, maximum)
+                    latency = (time.perf_counter() - start) * 1000
+                    with lock:
+                        latencies.append(latency)
+                        if proxy is not None:
+                            accepted.append(proxy)
+            finally:
+                if options['threads'] > 1:
+                    connection.close()
+
+        started = time.perf_counter()
+        if options['threads'] > 1:
+            threads = [threading.Thread(target=run, args=(chunk,)) for chunk in chunks]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            run(work)
+        elapsed = time.perf_counter() - started
+
+        listing.refresh_from_db()
+        proxies = list(ProxyBid.objects.filter(listing=listing).order_by('-max_amount', 'created_at', 'id')
+                       .values_list('bidder_id', 'max_amount')[:2])
+        winning_bid = Bid.objects.get(pk=listing.winning_bid_id)
+        expected_price = min(proxies[0][1], proxies[1][1] + bid_increment())
+        increments = int((listing.current_bid - listing.starting_bid) / bid_increment())
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        report = {
+            'proxies': len(bidders),
+            'accepted': len(accepted),
+            'threads': options['threads'],
+            'elapsed_s': round(elapsed, 3),
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'bid_rows_written': Bid.objects.filter(listing=listing).count(),
+            'bid_by_bid_increments': increments,
+            'final_price': str(listing.current_bid),
+            'winner_is_highest_maximum': winning_bid.bidder_id == proxies[0][0],
+            'price_is_runner_up_plus_increment': listing.current_bid == expected_price,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+        if not (report['winner_is_highest_maximum'] and report['price_is_runner_up_plus_increment']):
+            raise CommandError("Proxy resolution produced the wrong outcome.")
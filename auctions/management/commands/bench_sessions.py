@@ -0,0 +1,90 @@
+import json
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions.models import Listing, User
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+# Replays the same authenticated browsing session under each session profile (AUCTIONS_SESSION_PROFILES in
+# commerce/settings.py) and counts the database queries per request: view a listing, add it to the watchlist, remove
+# it again (which flashes a message) and open the watchlist (which shows it). Sessions of the cache profiles go to a
+# temporary file-based cache. The watchlist rows are written under every profile; what changes is the django_session
+# traffic.
+#
+#     python manage.py bench_sessions --rounds 50
+class Command(BaseCommand):
+    help = "Count database queries and writes per authenticated request under each session profile; prints JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20, help="Times the browsing sequence is replayed.")
+        parser.add_argument('--profile', action='append', choices=sorted(settings.AUCTIONS_SESSION_PROFILES),
+                            help="Session profile to run, may be repeated (default: all).")
+
+    def handle(self, *args, **options):
+        listing = Listing.objects.filter(is_active=True).only('id').first()
+        if listing is None:
+            raise CommandError("No active listings, seed the database first (manage.py seed_auctions).")
+        user, created = User.objects.get_or_create(username='bench_sessions')
+        if created:
+            user.set_unusable_password()
+            user.save()
+
+        report = {'rounds': options['rounds'], 'profiles': {}}
+        for name in options['profile'] or list(settings.AUCTIONS_SESSION_PROFILES):
+            cache_dir = tempfile.mkdtemp()
+            caches = {**settings.CACHES, 'sessions': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+            }}
+            try:
+                with override_settings(CACHES=caches, **settings.AUCTIONS_SESSION_PROFILES[name]):
+                    report['profiles'][name] = self.run_profile(user, listing.id, options['rounds'])
+            finally:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_profile(self, user, listing_id, rounds):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        steps = [
+            ('get', reverse('listing_detail', args=[listing_id])),
+            ('post', reverse('add_to_watchlist', args=[listing_id])),
+            ('post', reverse('remove_from_watchlist', args=[listing_id])),
+            ('get', reverse('watchlist')),
+        ]
+        requests = queries = writes = session_queries = session_writes = 0
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for method, url in steps:
+                with CaptureQueriesContext(connection) as captured:
+                    response = getattr(client, method)(url)
+                if response.status_code >= 400:
+                    raise CommandError(f"{method.upper()} {url} returned {response.status_code}.")
+                requests += 1
+                for query in captured:
+                    sql = query['sql'].lstrip().upper()
+                    is_write = sql.startswith(WRITES)
+                    queries += 1
+                    writes += is_write
+                    if 'DJANGO_SESSION' in sql:
+                        session_queries += 1
+                        session_writes += is_write
+        elapsed = time.perf_counter() - started
+        client.logout()
+        return {
+            'requests': requests,
+            'ms_per_request': round(elapsed * 1000 / requests, 3),
+            'queries_per_request': round(queries / requests, 2),
+            'writes_per_request': round(writes / requests, 2),
+            'session_queries_per_request': round(session_queries / requests, 2),
+            'session_writes_per_request': round(session_writes / requests, 2),
+        }
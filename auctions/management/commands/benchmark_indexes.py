@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from auctions.models import Bid, Comment, Listing
+from auctions.seeding import Seeder
+
+
+# Shows the query plans and timings of the hot listing/bid/comment queries with and without the
+# indexes declared in the models' Meta.indexes (migration 0010).
+#
+#     python manage.py benchmark_indexes --seed --bids 1000000
+#
+# The indexes are dropped for the "before" run and re-created afterwards, so point this at a scratch
+# database, not at production.
+class Command(BaseCommand):
+    help = "Compare query plans and timings of the hot queries with and without the composite indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help="Insert synthetic data before measuring.")
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--listings', type=int, default=20000)
+        parser.add_argument('--bids', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported.")
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options)
+
+        listing = Listing.objects.order_by('?').only('id', 'category_id').first()
+        if listing is None:
+            self.stderr.write("No listings found, run with --seed first.")
+            return
+        queries = self.hot_queries(listing.id, listing.category_id)
+
+        indexes = [(model, index) for model in (Listing, Bid, Comment) for index in model._meta.indexes]
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        try:
+            before = self.measure(queries, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+        after = self.measure(queries, options['repeat'])
+
+        for name, _ in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  before: {before[name][0]:8.3f} ms\n    " + before[name][1].replace('\n', '\n    '))
+            self.stdout.write(f"  after:  {after[name][0]:8.3f} ms\n    " + after[name][1].replace('\n', '\n    '))
+
+    # Each entry is (name, callable returning a queryset or a value). Querysets are both explained and timed.
+    def hot_queries(self, listing_id, category_id):
+        active = Listing.objects.filter(is_active=True).order_by('-created_at', '-id')
+        return [
+            ('index page', lambda: active[:24]),
+            ('category page', lambda: active.filter(category_id=category_id)[:24]),
+            ('max bid (close_listing)', lambda: Bid.objects.filter(listing_id=listing_id).values('listing_id')
+                .annotate(max_bid=Max('bid_amount')).order_by()),
+            ('top bid', lambda: Bid.objects.filter(listing_id=listing_id).order_by('-bid_amount')[:1]),
+            ('comments (listing_detail)', lambda: Comment.objects.filter(listing_id=listing_id).order_by('created_at')),
+        ]
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, query in queries:
+            plan = query().explain()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(query())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (statistics.median(timings), plan)
+        return results
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seeder = Seeder(seed=options['random_seed'], prefix='bench',
+                        progress=lambda message: self.stdout.write(f"  {message}", ending='\r'))
+        seeder.seed(
+            users=options['users'],
+            categories=options['categories'],
+            listings=options['listings'],
+            bids=options['bids'],
+            comments=options['comments'],
+        )
+        self.stdout.write('')
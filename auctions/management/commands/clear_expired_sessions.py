@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from auctions.sessions import DEFAULT_BATCH_SIZE, clear_expired_sessions
+
+
+# Deletes expired sessions from django_session in small batches, so bids don't wait on one long DELETE. Run it from
+# cron (e.g. nightly) instead of Django's clearsessions.
+#
+#     python manage.py clear_expired_sessions --batch-size 500
+class Command(BaseCommand):
+    help = "Delete expired sessions from the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Sessions deleted per transaction.")
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired session(s)."))
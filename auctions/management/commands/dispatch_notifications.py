@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from auctions.notifications import DEFAULT_BATCH_SIZE, dispatch_notifications, run_worker
+
+
+# Sends the outbid and auction-closed notifications queued in the outbox (auctions/notifications.py). Run it once
+# (e.g. from cron), or as a long-running worker with --loop. Run a single dispatcher: two would send every
+# notification twice.
+#
+#     python manage.py dispatch_notifications
+#     python manage.py dispatch_notifications --loop --interval 1
+class Command(BaseCommand):
+    help = "Send queued outbid and auction-closed notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Outbox events per batch.")
+        parser.add_argument('--loop', action='store_true', help="Keep running, checking every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between checks (default: AUCTIONS_NOTIFICATION_INTERVAL).")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            run_worker(interval=options['interval'], batch_size=options['batch_size'])
+            return
+        handled = dispatch_notifications(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Dispatched {handled} notification event(s)."))
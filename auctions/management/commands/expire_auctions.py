@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from auctions.expiry import DEFAULT_BATCH_SIZE, expire_due_listings, run_worker
+
+
+# Closes the auctions whose end time has passed. Run it once (e.g. from cron), or as a long-running worker with
+# --loop; several workers may run at the same time.
+#
+#     python manage.py expire_auctions
+#     python manage.py expire_auctions --loop --interval 2 --batch-size 1000
+class Command(BaseCommand):
+    help = "Close auctions whose ends_at has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Listings closed per transaction.")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Stop after this many batches (single run only).")
+        parser.add_argument('--loop', action='store_true', help="Keep running, sweeping every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between sweeps (default: AUCTIONS_EXPIRY_INTERVAL).")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            run_worker(interval=options['interval'], batch_size=options['batch_size'])
+            return
+        closed = expire_due_listings(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} expired auction(s)."))
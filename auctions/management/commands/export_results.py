@@ -0,0 +1,44 @@
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from auctions.exports import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, FORMATS, day_range, export_lines
+
+
+# Writes the auctions closed on a day (default: yesterday, in TIME_ZONE) with their winners and bid histories, as CSV
+# or JSON lines, to a file or stdout. See auctions/exports.py for the row layout.
+#
+#     python manage.py export_results --date 2026-10-17 --output results-2026-10-17.csv
+#     python manage.py export_results --date 2026-10-01 --days 31 --format jsonl | gzip > october.jsonl.gz
+class Command(BaseCommand):
+    help = "Export closed auctions with winners and bid history as CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="First day to export, YYYY-MM-DD (default: yesterday).")
+        parser.add_argument('--days', type=int, default=1, help="Number of days to export.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write (default: stdout).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Listings read per query.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Bids fetched from the database cursor at a time.")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            date = parse_date(options['date'])
+            if date is None:
+                raise CommandError("--date must be YYYY-MM-DD.")
+        else:
+            date = timezone.localdate() - timedelta(days=1)
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1.")
+
+        blocks = export_lines(*day_range(date, options['days']), options['format'],
+                              options['batch_size'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(blocks)
+        else:
+            sys.stdout.writelines(blocks)
@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.images import CAS_DIR, generate_thumbnails, ingest_image, inspect_image
+from auctions.models import Listing, StoredImage
+
+
+# Moves the images sitting directly in MEDIA_ROOT (uploads from before the content-addressed store) into the store,
+# collapsing byte-identical copies into one, links listings whose url points at one of those files, and generates
+# any missing thumbnails.
+#
+#     python manage.py ingest_listing_images --dry-run
+#     python manage.py ingest_listing_images --delete-originals --workers 4
+class Command(BaseCommand):
+    help = "Backfill MEDIA_ROOT images into the content-addressed store, dedupe them and build thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true',
+                            help="Remove the legacy files once they are in the store.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Threads used to generate thumbnails.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be done.")
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        names = sorted(
+            name for name in os.listdir(root) if name != CAS_DIR and os.path.isfile(os.path.join(root, name))
+        ) if os.path.isdir(root) else []
+
+        seen = {}
+        total_bytes = duplicate_bytes = 0
+        for name in names:
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            total_bytes += size
+            try:
+                with open(path, 'rb') as f:
+                    image = self.ingest(f, options['dry_run'])
+            except ValidationError as e:
+                self.stderr.write(f"Skipping {name}: {e.messages[0]}")
+                continue
+            if image.sha256 in seen:
+                duplicate_bytes += size
+                self.stdout.write(f"{name}: duplicate of {seen[image.sha256]}")
+            else:
+                seen[image.sha256] = name
+                self.stdout.write(f"{name}: {image.sha256}")
+
+            if not options['dry_run']:
+                linked = Listing.objects.filter(url__endswith=f'/{name}', image__isnull=True).update(image=image)
+                if linked:
+                    self.stdout.write(f"  linked to {linked} listing(s)")
+                if options['delete_originals']:
+                    os.remove(path)
+
+        self.stdout.write(
+            f"{len(names)} file(s), {len(seen)} unique, {duplicate_bytes} of {total_bytes} bytes were duplicates."
+        )
+        if options['dry_run']:
+            return
+
+        pending = list(StoredImage.objects.filter(thumbnails_ready=False).values_list('sha256', flat=True))
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                errors = list(pool.map(self.thumbnails, pending))
+        else:
+            errors = [self.thumbnails(sha256, in_worker=False) for sha256 in pending]
+        for sha256, error in zip(pending, errors):
+            if error:
+                self.stderr.write(f"Thumbnails failed for {sha256}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Generated thumbnails for {len(pending)} image(s)."))
+
+    def ingest(self, file, dry_run):
+        if dry_run:
+            sha256, extension, width, height = inspect_image(file)
+            return StoredImage(sha256=sha256, extension=extension, width=width, height=height)
+        # Thumbnails are generated afterwards in one batch rather than through the request-time worker pool.
+        return ingest_image(file, schedule=False)
+
+    @staticmethod
+    def thumbnails(sha256, in_worker=True):
+        try:
+            generate_thumbnails(sha256)
+        except Exception as e:
+            return e
+        finally:
+            if in_worker:
+                close_old_connections()
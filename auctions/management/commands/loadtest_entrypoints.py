@@ -0,0 +1,175 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+
+from auctions.models import Category, Listing
+
+
+# Load-tests the WSGI (commerce/wsgi.py) and ASGI (commerce/asgi.py) entry points in-process, with the same number
+# of concurrent clients, on the read-only pages. WSGI gets --wsgi-threads worker threads (like `gunicorn --threads`)
+# and requests beyond that wait in line; ASGI serves all clients from one event loop. --io-latency-ms adds a delay to
+# every query to model a remote database.
+#
+#     python manage.py loadtest_entrypoints --concurrency 64 --requests 2000 --wsgi-threads 8 --io-latency-ms 5
+#
+# Note that Django runs the async ORM's queries on a single thread per process (sync_to_async with
+# thread_sensitive=True), so database time is not overlapped under ASGI; what the event loop saves is a thread per
+# waiting connection.
+class Command(BaseCommand):
+    help = "Compare throughput and latency of the WSGI and ASGI entry points under the same concurrency; prints JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per entry point.")
+        parser.add_argument('--wsgi-threads', type=int, default=8, help="WSGI worker threads.")
+        parser.add_argument('--io-latency-ms', type=float, default=0.0, help="Delay added to every query.")
+        parser.add_argument('--entrypoint', action='append', choices=['wsgi', 'asgi'],
+                            help="Entry point to test, may be repeated (default: both).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        listing_ids = list(Listing.objects.filter(is_active=True).values_list('id', flat=True)[:1000])
+        category_ids = list(Category.objects.filter(active_listing_count__gt=0).values_list('id', flat=True)[:100])
+        if not listing_ids:
+            raise CommandError("No active listings, seed the database first (manage.py seed_auctions).")
+        rng = random.Random(options['seed'])
+        paths = [reverse('index'), reverse('category_list')]
+        urls = [rng.choice(paths + [reverse('listing_detail', args=[rng.choice(listing_ids)]),
+                                    reverse('category_detail', args=[rng.choice(category_ids or [0])])])
+                for _ in range(options['requests'])]
+
+        if options['io_latency_ms']:
+            delay = options['io_latency_ms'] / 1000
+
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            # Connections are re-opened for every request (CONN_MAX_AGE = 0) but the wrapper objects are reused.
+            def add_latency(sender, connection, **kwargs):
+                if slow_query not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(slow_query)
+
+            connection_created.connect(add_latency, weak=False)
+            for connection in connections.all():
+                add_latency(None, connection)
+
+        report = {'concurrency': options['concurrency'], 'requests': options['requests'],
+                  'wsgi_threads': options['wsgi_threads'], 'io_latency_ms': options['io_latency_ms'],
+                  'entrypoints': {}}
+        for entrypoint in options['entrypoint'] or ['wsgi', 'asgi']:
+            run = self.run_wsgi if entrypoint == 'wsgi' else self.run_asgi
+            report['entrypoints'][entrypoint] = run(urls, options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def summarize(self, latencies, statuses, elapsed):
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'errors': sum(1 for status in statuses if status >= 400),
+        }
+
+    # ==================== WSGI ====================
+    def run_wsgi(self, urls, options):
+        from commerce.wsgi import application
+
+        workers = threading.Semaphore(options['wsgi_threads'])
+        queue = iter(urls)
+        lock = threading.Lock()
+        latencies, statuses = [], []
+
+        def call(url):
+            parts = urlsplit(url)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query,
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            body = application(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+            for _ in body:
+                pass
+            body.close()
+            return status[0]
+
+        def client():
+            while True:
+                with lock:
+                    url = next(queue, None)
+                if url is None:
+                    return
+                start = time.perf_counter()
+                with workers:
+                    status = call(url)
+                latency = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(latency)
+                    statuses.append(status)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for future in [pool.submit(client) for _ in range(options['concurrency'])]:
+                future.result()
+        return self.summarize(latencies, statuses, time.perf_counter() - start)
+
+    # ==================== ASGI ====================
+    def run_asgi(self, urls, options):
+        from commerce.asgi import application
+
+        async def call(url):
+            parts = urlsplit(url)
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': parts.path, 'raw_path': parts.path.encode(),
+                'query_string': parts.query.encode(), 'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+            }
+            status = []
+            requested = []
+
+            async def receive():
+                if not requested:
+                    requested.append(True)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected; Django cancels this once the response is sent.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await application(scope, receive, send)
+            return status[0]
+
+        async def main():
+            queue = iter(urls)
+            latencies, statuses = [], []
+
+            async def client():
+                for url in queue:
+                    start = time.perf_counter()
+                    status = await call(url)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    statuses.append(status)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+            return self.summarize(latencies, statuses, time.perf_counter() - start)
+
+        return asyncio.run(main())
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from auctions.models import Category, Listing
+
+
+# Recomputes Category.active_listing_count from the listings table.
+#
+#     python manage.py rebuild_category_counts           # fix any drift
+#     python manage.py rebuild_category_counts --check   # only report it, exit with an error if there is any
+class Command(BaseCommand):
+    help = "Recompute the cached number of active listings per category and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            actual = dict(
+                Listing.objects.filter(is_active=True)
+                .values_list('category_id')
+                .annotate(n=Count('id'))
+                .order_by()
+            )
+            drifted = []
+            for category in Category.objects.select_for_update().only('id', 'name', 'active_listing_count'):
+                expected = actual.get(category.id, 0)
+                if category.active_listing_count != expected:
+                    drifted.append((category, expected))
+                    self.stdout.write(
+                        f"{category.name} (#{category.id}): stored {category.active_listing_count}, actual {expected}"
+                    )
+
+            if options['check']:
+                if drifted:
+                    raise CommandError(f"{len(drifted)} category count(s) drifted.")
+                self.stdout.write(self.style.SUCCESS("All category counts are correct."))
+                return
+
+            for category, expected in drifted:
+                Category.objects.filter(pk=category.pk).update(active_listing_count=expected)
+        self.stdout.write(self.style.SUCCESS(f"Fixed {len(drifted)} category count(s)."))
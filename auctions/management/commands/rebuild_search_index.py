@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.search import get_backend
+
+
+# Re-indexes all active listings, e.g. after loading data with bulk inserts or raw SQL.
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of active listings."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from auctions.seeding import DEFAULT_BATCH_SIZE, SEED_PASSWORD, Seeder
+
+
+# Fills the database with synthetic users, categories, listings, bids, comments and watchlists.
+#
+#     python manage.py seed_auctions --users 100000 --listings 1000000 --bids 10000000 --seed 42
+#
+# Runs with the same --seed produce the same data; use a different --seed to add another, independent set of rows
+# to an already seeded database (usernames are prefixed with the seed).
+class Command(BaseCommand):
+    help = "Insert synthetic auction data in batches, for load testing and benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--bids', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--watchlist-entries', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, also used to prefix usernames.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        has_listings = options['listings'] > 0
+        counts = {
+            'users': max(options['users'], 1),
+            'categories': max(options['categories'], 1),
+            'listings': options['listings'],
+            'bids': options['bids'] if has_listings else 0,
+            'comments': options['comments'] if has_listings else 0,
+            'watchlist_entries': options['watchlist_entries'] if has_listings else 0,
+        }
+        Seeder(seed=options['seed'], batch_size=options['batch_size'], progress=self.progress).seed(**counts)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items())
+            + f". Every seeded user's password is {SEED_PASSWORD!r}."
+        ))
+
+    def progress(self, message):
+        self.stdout.write(f"  {message}", ending='\r')
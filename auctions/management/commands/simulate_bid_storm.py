@@ -0,0 +1,140 @@
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from auctions.models import Bid, Category, Listing, User
+from auctions.services import close_auction, place_bid
+
+
+# Replays a bid storm against a single listing: --bidders threads, each with a random budget up to --max-price,
+# keep outbidding each other until the auction (which ends after --duration seconds) is over or their budget is
+# spent, with the bids fired in the last moments before the end.
+# Soft close uses the --window/--extension given here (in seconds, scaled down from the production settings so a run
+# takes seconds). The report checks that the winner is the highest accepted bid and shows the time bidders spent in
+# the conditional UPDATE of the listing row, i.e. waiting for the row (or, on SQLite, database) lock.
+#
+#     python manage.py simulate_bid_storm --bidders 16 --duration 3 --window 1 --extension 1
+#     python manage.py simulate_bid_storm --window 0    # without soft close
+#
+# It creates its own users, category and listing; run it against a scratch database.
+class Command(BaseCommand):
+    help = "Simulate a last-second bid storm on one listing and report the winner and lock wait time as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bidders', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=3.0, help="Seconds until the auction ends.")
+        parser.add_argument('--window', type=float, default=1.0, help="Soft-close window in seconds (0 = off).")
+        parser.add_argument('--extension', type=float, default=1.0, help="Soft-close extension in seconds.")
+        parser.add_argument('--max-price', type=int, default=500, help="Upper bound of the bidders' budgets.")
+        parser.add_argument('--max-seconds', type=float, default=60.0,
+                            help="Stop bidding after this long even if the auction keeps being extended.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['bidders'] < 1:
+            raise CommandError("--bidders must be at least 1.")
+        with override_settings(AUCTIONS_SOFT_CLOSE_WINDOW=options['window'],
+                               AUCTIONS_SOFT_CLOSE_EXTENSION=options['extension']):
+            report = self.simulate(options)
+        self.stdout.write(json.dumps(report, indent=2))
+        if not report['winner_is_highest_bid']:
+            raise CommandError("The recorded winner is not the highest accepted bid.")
+
+    def simulate(self, options):
+        tag = f'storm{int(time.time() * 1000)}'
+        seller = User.objects.create(username=f'{tag}-seller')
+        bidders = [User.objects.create(username=f'{tag}-bidder{i}') for i in range(options['bidders'])]
+        category, _ = Category.objects.get_or_create(name='Bid storm')
+        ends_at = timezone.now() + timedelta(seconds=options['duration'])
+        listing = Listing.objects.create(
+            title=f'Bid storm {tag}', description='Simulated bid storm', category=category, creator=seller,
+            starting_bid=Decimal('1.00'), current_bid=Decimal('1.00'), ends_at=ends_at,
+        )
+
+        lock_waits = []
+        accepted = []
+        rejected = [0]
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(bidders))
+        started = time.monotonic()
+        deadline = started + options['max_seconds']
+
+        def timed_update(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                # Only the conditional UPDATE that takes the listing row lock.
+                if sql.startswith('UPDATE') and '"current_bid"' in sql.split('WHERE')[0]:
+                    with lock:
+                        lock_waits.append((time.perf_counter() - start) * 1000)
+
+        def bidder_loop(bidder, seed):
+            rng = random.Random(seed)
+            budget = Decimal(rng.randint(2, options['max_price']))
+            try:
+                with connection.execute_wrapper(timed_update):
+                    barrier.wait()
+                    while time.monotonic() < deadline:
+                        current = Listing.objects.values_list('current_bid', 'ends_at').get(pk=listing.pk)
+                        remaining = (current[1] - timezone.now()).total_seconds()
+                        if remaining <= 0:
+                            break
+                        # Snipers hold back until close to the end.
+                        if remaining > options['window'] + 0.2:
+                            time.sleep(min(remaining - options['window'], 0.05) * rng.random())
+                            continue
+                        amount = min(current[0] + Decimal(rng.randint(1, 500)) / 100, budget)
+                        if amount <= current[0]:
+                            break
+                        if place_bid(listing.pk, bidder, amount) is not None:
+                            with lock:
+                                accepted.append(amount)
+                        else:
+                            with lock:
+                                rejected[0] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bidder_loop, args=(bidder, options['seed'] + i))
+                   for i, bidder in enumerate(bidders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        # Close the storm listing only (and freeze its winner), even if --max-seconds stopped the bidding before its
+        # end: expiring everything due by then would close other listings in the database early too.
+        close_auction(listing.pk, seller)
+        listing.refresh_from_db()
+        winning_bid = Bid.objects.filter(pk=listing.winning_bid_id).first()
+        highest = max(accepted) if accepted else None
+        return {
+            'listing_id': listing.pk,
+            'bidders': len(bidders),
+            'elapsed_s': round(elapsed, 3),
+            'bids_accepted': len(accepted),
+            'bids_rejected': rejected[0],
+            'scheduled_end': ends_at.isoformat(),
+            'final_end': listing.ends_at.isoformat(),
+            'extended_by_s': round((listing.ends_at - ends_at).total_seconds(), 3),
+            'closed': not listing.is_active,
+            'winning_bid': str(winning_bid.bid_amount) if winning_bid else None,
+            'winner': winning_bid.bidder.username if winning_bid else None,
+            'winner_is_highest_bid': (winning_bid.bid_amount if winning_bid else None) == highest,
+            'lock_wait_ms': {
+                'total': round(sum(lock_waits), 3),
+                'mean': round(statistics.mean(lock_waits), 3) if lock_waits else 0,
+                'max': round(max(lock_waits), 3) if lock_waits else 0,
+            },
+        }
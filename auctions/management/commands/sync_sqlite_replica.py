@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Stand-in for replication when a second SQLite file plays the read replica (AUCTIONS_REPLICA_DB): copies the primary
+# into every SQLite replica with SQLite's online backup API, once or every --interval seconds. The delay between two
+# copies is the replication lag the read-your-writes pinning (auctions/routers.py) has to cover.
+#
+#     AUCTIONS_REPLICA_DB=replica.sqlite3 python manage.py sync_sqlite_replica --interval 1
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the SQLite read replicas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help="Keep copying every this many seconds.")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        replicas = [settings.DATABASES[alias] for alias in settings.AUCTIONS_READ_REPLICAS]
+        if not replicas:
+            raise CommandError("No read replicas configured (set AUCTIONS_REPLICA_DB).")
+        if any(db['ENGINE'] != 'django.db.backends.sqlite3' for db in [primary, *replicas]):
+            raise CommandError("Only SQLite databases can be synced this way.")
+        while True:
+            start = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            try:
+                for replica in replicas:
+                    target = sqlite3.connect(replica['NAME'])
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(f"Synced {len(replicas)} replica(s) in {time.perf_counter() - start:.3f}s.")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
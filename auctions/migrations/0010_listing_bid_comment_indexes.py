@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_bid_is_winning'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['listing', '-bid_amount'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['listing', 'created_at'], name='comment_listing_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='listing_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'created_at', 'id'], name='listing_active_cat_created_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Point every listing that already has bids at its highest one (the earliest, on ties) and make that bid
+# the only one flagged as winning.
+def backfill_winning_bid(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    Bid.objects.filter(is_winning=True).update(is_winning=False)
+    for listing_id in Bid.objects.values_list('listing_id', flat=True).distinct():
+        top = Bid.objects.filter(listing_id=listing_id).order_by('-bid_amount', 'id').first()
+        Listing.objects.filter(pk=listing_id).update(winning_bid=top)
+        Bid.objects.filter(pk=top.pk).update(is_winning=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_listing_bid_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='winning_bid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bid'),
+        ),
+        migrations.RunPython(backfill_winning_bid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:56
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_active_listing_count(apps, schema_editor):
+    Category = apps.get_model('auctions', 'Category')
+    Listing = apps.get_model('auctions', 'Listing')
+    counts = Listing.objects.filter(is_active=True).values('category_id').annotate(n=Count('id')).order_by()
+    for row in counts:
+        Category.objects.filter(pk=row['category_id']).update(active_listing_count=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_listing_winning_bid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_listing_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_active_listing_count, migrations.RunPython.noop),
+    ]
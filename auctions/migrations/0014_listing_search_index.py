@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# Full-text index of active listings, see auctions/search.py. Only SQLite uses the FTS5 table; other databases
+# need a search backend of their own. The statements are spelled out here rather than taken from SQLiteFTSBackend, so
+# later changes to the backend can't change what this migration does.
+TABLE = 'auctions_listing_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(title, description, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM auctions_listing WHERE is_active"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_storedimage_listing_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
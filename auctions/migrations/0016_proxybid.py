@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyBid',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to='auctions.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', '-max_amount', 'created_at', 'id'], name='proxybid_listing_max_idx')],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'bidder'), name='proxybid_listing_bidder_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:33
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# The close time of listings closed before closed_at existed isn't recorded anywhere; the best estimate is their end
+# time, else their last bid, else their creation.
+def populate_closed_at(apps, schema_editor):
+    Bid = apps.get_model('auctions', 'Bid')
+    Listing = apps.get_model('auctions', 'Listing')
+    last_bid_at = Bid.objects.filter(listing=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    Listing.objects.filter(is_active=False).update(
+        closed_at=Coalesce(F('ends_at'), Subquery(last_bid_at), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_proxybid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_closed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('closed_at__isnull', False)), fields=['closed_at', 'id'], name='listing_closed_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBid',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('bid_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('is_winning', models.BooleanField(default=False)),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedListing',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=25)),
+                ('description', models.TextField(max_length=500)),
+                ('starting_bid', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('current_bid', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('url', models.URLField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.category')),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.storedimage')),
+                ('winning_bid', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.archivedbid')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(max_length=300)),
+                ('created_at', models.DateTimeField()),
+                ('commenter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='auctions.archivedlisting')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedbid',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='auctions.archivedlisting'),
+        ),
+    ]
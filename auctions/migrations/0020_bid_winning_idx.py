@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(condition=models.Q(('is_winning', True)), fields=['id'], name='bid_winning_idx'),
+        ),
+    ]
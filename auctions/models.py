@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Greatest
 
 
 # This code extends Django's default user model to create a custom user model named User.
@@ -22,6 +23,20 @@ class Category(models.Model):
     # name (CharField): CharField for the category name. Represents a string attribute for the name of the category.
     # It is limited to a maximum length of 35 characters.
     name = models.CharField(max_length=35)
+    # active_listing_count (PositiveIntegerField): Number of active listings in this category. It is kept up to date
+    # incrementally (see auctions/signals.py and adjust_active_listing_count) so the categories page doesn't have
+    # to count the listings table. `manage.py rebuild_category_counts` recomputes it and reports drift.
+    active_listing_count = models.PositiveIntegerField(default=0)
+
+    # adjust_active_listing_count: Atomically adds delta to a category's counter (UPDATE ... SET n = MAX(n + delta, 0)).
+    # A counter that has drifted low (see rebuild_category_counts) stops at 0 rather than failing the positive-integer
+    # check, which would abort the close or expiry transaction it is part of.
+    @classmethod
+    def adjust_active_listing_count(cls, category_id, delta):
+        if category_id is not None and delta:
+            cls.objects.filter(pk=category_id).update(
+                active_listing_count=Greatest(models.F('active_listing_count') + delta, 0),
+            )
 
     # __str__ method: Overrides the default string representation method for instances of the Category model.
     # It specifies that when an instance of Category is converted to a string (for display purposes,
@@ -30,6 +45,35 @@ class Category(models.Model):
         return self.name
 
 
+# The StoredImage model is a content-addressed image store: an uploaded image is identified by the SHA-256 of its bytes,
+# so the same picture uploaded for several listings is stored (and thumbnailed) only once. The files themselves live
+# in MEDIA_ROOT under cas/, see auctions/images.py.
+class StoredImage(models.Model):
+    # sha256 (CharField): Hex digest of the original file, also the primary key.
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    # extension (CharField): File extension of the original, e.g. "jpg".
+    extension = models.CharField(max_length=8)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # thumbnails_ready (BooleanField): Set by the thumbnail workers once every size and format has been written.
+    thumbnails_ready = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.sha256}.{self.extension}'
+
+    @property
+    def original_url(self):
+        from .images import original_url
+        return original_url(self)
+
+    # urls: Thumbnail URLs by size and format, for templates: {{ image.urls.300.webp }}.
+    @property
+    def urls(self):
+        from .images import thumbnail_urls
+        return thumbnail_urls(self)
+
+
 # The Listing model captures essential information about an auction listing, including details like title,
 # description, bid amounts, status, category, creator, and creation timestamp.
 # In simply way: Listing Model: Represents an auction listing.
@@ -53,12 +97,43 @@ class Listing(models.Model):
     # created_at (DateTimeField): Records the timestamp when the listing is created, automatically set to the current
     # date and time.
     created_at = models.DateTimeField(auto_now_add=True)
+    # ends_at (DateTimeField): When the auction closes automatically (see auctions/expiry.py). Listings without an
+    # end time stay open until their creator closes them.
+    ends_at = models.DateTimeField(null=True, blank=True)
+    # closed_at (DateTimeField): When the auction was closed, by its creator or by the expiry worker; empty while it
+    # is active. Used to export a day's results (auctions/exports.py).
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
     # I added a new field named url to the Listing model. The models.URLField is used for storing URLs.
     # I set null=True and blank=True to allow for cases where the URL may not be provided.
     url = models.URLField(max_length=200, null=True, blank=True)
+    # image (ForeignKey to StoredImage model): An uploaded image, shown through its thumbnails. Takes precedence over url.
+    image = models.ForeignKey(StoredImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='listings')
+    # winning_bid (ForeignKey to Bid model): The current highest bid, kept up to date by auctions.services.place_bid.
+    # Once the listing is closed this is the winner, so it can be read with a single primary-key lookup
+    # instead of aggregating over all bids of the listing.
+    winning_bid = models.ForeignKey('Bid', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # modified_at (DateTimeField): When anything the listing page shows last changed: the listing itself, or a bid,
+    # comment or close touching it. It versions the cached fragments of the page, see auctions/caching.py.
+    modified_at = models.DateTimeField(auto_now=True)
     # the model has a __str__ method that returns the title of the listing as its string representation.
     # This is useful for human-readable display in the Django admin interface and other contexts.A field for images
 
+    class Meta:
+        # Partial indexes: only active listings are ever paged through, so closed ones are kept out of the index.
+        # (created_at) serves the index page, (category, created_at) the category pages.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True),
+                         name='listing_active_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='listing_active_cat_created_idx'),
+            # The expiry workers pull due auctions in end-time order.
+            models.Index(fields=['ends_at', 'id'], condition=models.Q(is_active=True, ends_at__isnull=False),
+                         name='listing_active_ends_idx'),
+            # Results exports read the listings closed in a time range, in close order.
+            models.Index(fields=['closed_at', 'id'], condition=models.Q(closed_at__isnull=False),
+                         name='listing_closed_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -76,7 +151,37 @@ class Bid(models.Model):
     bid_amount = models.DecimalField(max_digits=10, decimal_places=2)
     # Records the timestamp when the bid is created, automatically set to the current date and time.
     created_at = models.DateTimeField(auto_now_add=True)
-    is_winning = models.BooleanField(default=True)
+    # is_winning (BooleanField): True only for the current highest bid of the listing. Maintained by
+    # auctions.services.place_bid, which flips the previous winner off in the same transaction.
+    is_winning = models.BooleanField(default=False)
+
+    class Meta:
+        # The highest bid of a listing is the first entry of this index.
+        indexes = [
+            models.Index(fields=['listing', '-bid_amount'], name='bid_listing_amount_idx'),
+            # The admin's "winning bids" filter pages through these, newest first.
+            models.Index(fields=['id'], condition=models.Q(is_winning=True), name='bid_winning_idx'),
+        ]
+
+
+# A ProxyBid is a bidder's standing instruction to bid for them on a listing, up to max_amount. Proxies are resolved by
+# auctions.services whenever the listing receives a bid; only the resulting bids are stored as Bid rows.
+class ProxyBid(models.Model):
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='proxy_bids')
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE)
+    # max_amount (DecimalField): The most the bidder is willing to pay. It can only be raised.
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # created_at (DateTimeField): Between two equal maximums, the proxy placed first wins.
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'bidder'], name='proxybid_listing_bidder_unique'),
+        ]
+        # Resolution reads the two strongest proxies of a listing, the first entries of this index.
+        indexes = [
+            models.Index(fields=['listing', '-max_amount', 'created_at', 'id'], name='proxybid_listing_max_idx'),
+        ]
 
 
 # The Comment model is designed to capture information about comments made on auction listings.
@@ -95,9 +200,118 @@ class Comment(models.Model):
     # the current date and time.
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Comments are always shown per listing in the order they were written.
+        indexes = [
+            models.Index(fields=['listing', 'created_at'], name='comment_listing_created_idx'),
+        ]
+
 # ============================================
 
 
 class Watchlist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     listings = models.ManyToManyField('Listing')
+
+    # The membership rows live in the M2M table (watchlist_id, listing_id), which has a unique index on that pair.
+    # The helpers below work on those rows directly instead of loading a user's whole watchlist.
+
+    # is_watching: Returns the subset of listing_ids that the user is watching, in a single query.
+    # Pass a whole page of listing ids at once rather than calling it per listing.
+    @classmethod
+    def is_watching(cls, user, listing_ids):
+        if not user.is_authenticated:
+            return set()
+        return set(
+            cls.listings.through.objects
+            .filter(watchlist__user=user, listing_id__in=list(listing_ids))
+            .values_list('listing_id', flat=True)
+        )
+
+    @classmethod
+    async def ais_watching(cls, user, listing_ids):
+        if not user.is_authenticated:
+            return set()
+        return {
+            listing_id async for listing_id in cls.listings.through.objects
+            .filter(watchlist__user=user, listing_id__in=list(listing_ids))
+            .values_list('listing_id', flat=True)
+        }
+
+    # add_listing: Idempotent; adding a listing that is already watched is a no-op (INSERT ... ON CONFLICT DO NOTHING).
+    @classmethod
+    def add_listing(cls, user, listing_id):
+        watchlist, created = cls.objects.get_or_create(user=user)
+        cls.listings.through.objects.bulk_create(
+            [cls.listings.through(watchlist_id=watchlist.id, listing_id=listing_id)], ignore_conflicts=True
+        )
+
+    # remove_listing: A single DELETE; returns whether the listing was on the user's watchlist.
+    @classmethod
+    def remove_listing(cls, user, listing_id):
+        deleted, _ = cls.listings.through.objects.filter(watchlist__user=user, listing_id=listing_id).delete()
+        return deleted > 0
+
+
+# Notifications waiting to be sent (a transactional outbox, see auctions/notifications.py). A row is written in the
+# same transaction as the bid or close it reports, so a notification goes out if and only if the change committed;
+# the dispatcher works out the recipients and deletes the row once they have been notified.
+class OutboxEvent(models.Model):
+    OUTBID = 'outbid'
+    CLOSED = 'closed'
+    KIND_CHOICES = [(OUTBID, 'Outbid'), (CLOSED, 'Auction closed')]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    # listing (ForeignKey to Listing model): The listing the bid was placed on, or that was closed.
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    # bid (ForeignKey to Bid model): The new high bid (outbid events only; the winner of a closed auction is its
+    # winning_bid, which no longer changes).
+    bid = models.ForeignKey(Bid, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # outbid_user (ForeignKey to User model): The bidder who lost the lead (outbid events only).
+    outbid_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+# ============================================
+# Archive (cold) tables, see auctions/archive.py. Listings closed long enough ago are moved here together with their
+# bids and comments, keeping their ids, so the tables the live pages and bids work on only hold recent listings.
+# The rows are never changed once archived; the listing page falls back to them for ids no longer in Listing.
+class ArchivedListing(models.Model):
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=25)
+    description = models.TextField(max_length=500)
+    starting_bid = models.DecimalField(max_digits=10, decimal_places=2)
+    current_bid = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    ends_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    url = models.URLField(max_length=200, null=True, blank=True)
+    image = models.ForeignKey(StoredImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    winning_bid = models.ForeignKey('ArchivedBid', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # archived_at (DateTimeField): When the listing was moved to the archive.
+    archived_at = models.DateTimeField()
+
+    # Archived listings are always closed (for templates shared with Listing).
+    is_active = False
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedBid(models.Model):
+    id = models.IntegerField(primary_key=True)
+    listing = models.ForeignKey(ArchivedListing, on_delete=models.CASCADE, related_name='bids')
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    bid_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    is_winning = models.BooleanField(default=False)
+
+
+class ArchivedComment(models.Model):
+    id = models.IntegerField(primary_key=True)
+    listing = models.ForeignKey(ArchivedListing, on_delete=models.CASCADE, related_name='comments')
+    commenter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    content = models.TextField(max_length=300)
+    created_at = models.DateTimeField()
@@ -0,0 +1,170 @@
+import logging
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent, Watchlist
+
+logger = logging.getLogger(__name__)
+
+# Outbid and auction-closed notifications, sent from the outbox (OutboxEvent).
+#
+# place_bid, place_proxy_bid and the closing code (close_auction, the expiry worker) only insert an OutboxEvent in
+# their own transaction; the dispatcher (`manage.py dispatch_notifications`) picks the events up in batches and works
+# out who to tell:
+#   outbid  the bidder who lost the lead, and everyone watching the listing except the new leader,
+#   closed  the winner, the seller and everyone watching the listing.
+# The recipients of a whole batch come from two queries however many watchers a listing has: one for the events with
+# their bidders, winners and sellers joined in, and one streaming the watchers of all the batch's listings from the
+# Watchlist.listings table. The events of a batch are grouped by listing and each user gets at most one notification
+# per listing, about the latest event: a bidding war that puts twenty outbid events for one listing in a batch sends
+# its watchers one "new high bid" each, not twenty, and the outbid bidders one "you have been outbid" each (none if
+# they are leading again). Notifications are handed to the sink (AUCTIONS_NOTIFICATION_SINK) in groups of
+# AUCTIONS_NOTIFICATION_SEND_BATCH, and an event is deleted once all of its recipients have been handed over.
+# Delivery is at least once: if the dispatcher dies half way through a batch, the batch is sent again.
+
+DEFAULT_SINK = 'auctions.notifications.EmailSink'
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_SEND_BATCH = 500
+
+Notification = namedtuple('Notification', 'user_id username email subject body')
+
+EVENT_FIELDS = (
+    'id', 'kind', 'listing_id', 'listing__title',
+    'bid__bidder_id', 'bid__bidder__username', 'bid__bid_amount',
+    'outbid_user_id', 'outbid_user__username', 'outbid_user__email',
+    'listing__creator_id', 'listing__creator__username', 'listing__creator__email',
+    'listing__winning_bid__bidder_id', 'listing__winning_bid__bidder__username',
+    'listing__winning_bid__bidder__email', 'listing__winning_bid__bid_amount',
+)
+
+
+# Base class for sinks. deliver() gets a list of Notifications and must either deliver all of them or raise.
+class Sink:
+    def deliver(self, notifications):
+        raise NotImplementedError
+
+
+# Sends an email per notification through Django's EMAIL_BACKEND (the console or a file locally, SMTP in production),
+# a whole group over one connection. Users without an email address are skipped.
+class EmailSink(Sink):
+    def deliver(self, notifications):
+        messages = [
+            EmailMessage(notification.subject, notification.body, to=[notification.email])
+            for notification in notifications if notification.email
+        ]
+        if messages:
+            get_connection().send_messages(messages)
+
+
+# Writes the notifications to the log instead, e.g. while developing without an email backend.
+class LogSink(Sink):
+    def deliver(self, notifications):
+        for notification in notifications:
+            logger.info("Notify %s: %s", notification.username, notification.subject)
+
+
+@lru_cache(maxsize=None)
+def get_sink():
+    return import_string(getattr(settings, 'AUCTIONS_NOTIFICATION_SINK', DEFAULT_SINK))()
+
+
+def _direct_messages(event):
+    title = event['listing__title']
+    if event['kind'] == OutboxEvent.OUTBID:
+        yield (event['outbid_user_id'], event['outbid_user__username'], event['outbid_user__email'],
+               f'You have been outbid on "{title}"',
+               f'{event["bid__bidder__username"]} bid ${event["bid__bid_amount"]} on "{title}".')
+        return
+    if event['listing__winning_bid__bidder_id'] is not None:
+        yield (event['listing__winning_bid__bidder_id'], event['listing__winning_bid__bidder__username'],
+               event['listing__winning_bid__bidder__email'], f'You won "{title}"',
+               f'The auction has ended and your bid of ${event["listing__winning_bid__bid_amount"]} won.')
+    yield (event['listing__creator_id'], event['listing__creator__username'], event['listing__creator__email'],
+           f'Your auction "{title}" has ended', _closed_summary(event))
+
+
+def _watcher_message(event):
+    title = event['listing__title']
+    if event['kind'] == OutboxEvent.OUTBID:
+        return (f'New high bid on "{title}"',
+                f'{event["bid__bidder__username"]} bid ${event["bid__bid_amount"]} on "{title}".')
+    return f'Auction ended: "{title}"', _closed_summary(event)
+
+
+def _closed_summary(event):
+    if event['listing__winning_bid__bidder_id'] is None:
+        return f'"{event["listing__title"]}" has ended without bids.'
+    return (f'"{event["listing__title"]}" was won by {event["listing__winning_bid__bidder__username"]} '
+            f'for ${event["listing__winning_bid__bid_amount"]}.')
+
+
+# dispatch_batch: Notifies the recipients of up to batch_size outbox events, oldest first, and deletes the events.
+# Returns the number of events handled.
+def dispatch_batch(batch_size=DEFAULT_BATCH_SIZE):
+    events = list(OutboxEvent.objects.order_by('id').values(*EVENT_FIELDS)[:batch_size])
+    if not events:
+        return 0
+    sink = get_sink()
+    send_batch = getattr(settings, 'AUCTIONS_NOTIFICATION_SEND_BATCH', DEFAULT_SEND_BATCH)
+    pending = []
+
+    def notify(user_id, username, email, subject, body):
+        pending.append(Notification(user_id, username, email, subject, body))
+        if len(pending) >= send_batch:
+            sink.deliver(pending)
+            pending.clear()
+
+    # Per listing: the direct notifications by user, the leader after the batch's last bid (who isn't told about it),
+    # and what its watchers are told.
+    listings = {}
+    for event in events:
+        listing = listings.setdefault(event['listing_id'], {'direct': {}, 'leader': None, 'watchers': None})
+        if event['kind'] == OutboxEvent.OUTBID:
+            listing['leader'] = event['bid__bidder_id']
+            listing['direct'].pop(listing['leader'], None)
+        for user_id, username, email, subject, body in _direct_messages(event):
+            listing['direct'][user_id] = Notification(user_id, username, email, subject, body)
+        listing['watchers'] = _watcher_message(event)
+    for listing in listings.values():
+        for notification in listing['direct'].values():
+            notify(*notification)
+
+    watchers = (
+        Watchlist.listings.through.objects
+        .filter(listing_id__in=list(listings))
+        .order_by()
+        .values_list('listing_id', 'watchlist__user_id', 'watchlist__user__username', 'watchlist__user__email')
+        .iterator(chunk_size=send_batch)
+    )
+    for listing_id, user_id, username, email in watchers:
+        listing = listings[listing_id]
+        if user_id != listing['leader'] and user_id not in listing['direct']:
+            notify(user_id, username, email, *listing['watchers'])
+    if pending:
+        sink.deliver(pending)
+
+    OutboxEvent.objects.filter(id__in=[event['id'] for event in events]).delete()
+    return len(events)
+
+
+# dispatch_notifications: Dispatches batches until the outbox is empty and returns the number of events handled.
+def dispatch_notifications(batch_size=DEFAULT_BATCH_SIZE):
+    total = 0
+    while handled := dispatch_batch(batch_size):
+        total += handled
+    return total
+
+
+def run_worker(interval=None, batch_size=DEFAULT_BATCH_SIZE, stop=lambda: False):
+    interval = interval if interval is not None else getattr(settings, 'AUCTIONS_NOTIFICATION_INTERVAL', 2)
+    while not stop():
+        started = time.monotonic()
+        handled = dispatch_notifications(batch_size=batch_size)
+        if handled:
+            logger.info("Dispatched %d notification event(s) in %.2fs", handled, time.monotonic() - started)
+        time.sleep(interval)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# Keyset ("seek") pagination over (created_at, id), newest first.
+# Unlike OFFSET pagination the cost of a page does not grow with how deep the user has scrolled:
+# each page is a single indexed range scan that starts right after the last row of the previous page.
+
+DEFAULT_PAGE_SIZE = 24
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def get_page_size():
+    return getattr(settings, 'AUCTIONS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+
+
+# The cursor is "<microseconds since epoch>-<id>" of the last row shown, so it is short, opaque enough
+# for a query string and survives rows being inserted in front of it. Rows may be model instances or .values() dicts
+# (which must include created_at and id).
+def encode_cursor(obj):
+    created_at, pk = (obj['created_at'], obj['id']) if isinstance(obj, dict) else (obj.created_at, obj.pk)
+    delta = created_at - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f'{micros}-{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = cursor.split('-')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (ValueError, OverflowError):
+        raise Http404("Invalid page cursor.")
+
+
+# Returns (items, next_cursor). Exactly one query is issued: we fetch one row more than the page size
+# to find out whether there is a next page without a separate COUNT(*).
+def keyset_page(queryset, cursor=None, page_size=None):
+    page_size = page_size or get_page_size()
+    return _split(list(_page_queryset(queryset, cursor, page_size)), page_size)
+
+
+# akeyset_page: keyset_page for async views.
+async def akeyset_page(queryset, cursor=None, page_size=None):
+    page_size = page_size or get_page_size()
+    return _split([item async for item in _page_queryset(queryset, cursor, page_size)], page_size)
+
+
+def _page_queryset(queryset, cursor, page_size):
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return queryset[:page_size + 1]
+
+
+def _split(items, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+    return items, next_cursor
+
+
+# ==================== Estimated counts ====================
+# The admin changelists page with OFFSET and show the number of results, which on the bids table means a COUNT(*)
+# over millions of rows on every page view. EstimatedCountPaginator counts at most AUCTIONS_EXACT_COUNT_LIMIT rows
+# (SELECT COUNT(*) FROM (... LIMIT n)), so small tables and narrow filters get their exact count. Beyond that an
+# unfiltered table is estimated from the database's statistics (pg_class.reltuples on PostgreSQL, sqlite_stat1 after
+# ANALYZE on SQLite) or else from its id range, and a filtered result is reported as the limit. An estimate that is
+# too high only makes the last page links come up empty.
+DEFAULT_EXACT_COUNT_LIMIT = 10000
+
+
+def get_exact_count_limit():
+    return getattr(settings, 'AUCTIONS_EXACT_COUNT_LIMIT', DEFAULT_EXACT_COUNT_LIMIT)
+
+
+# estimated_row_count: The approximate number of rows in the queryset's table, without scanning it.
+def estimated_row_count(queryset):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        elif connection.vendor == 'sqlite':
+            # The first number of a table's statistics is its row count; the table only exists after ANALYZE.
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+            except DatabaseError:
+                row = None
+            if row:
+                return int(row[0].split()[0])
+    # Separate queries: SQLite only answers MIN() or MAX() from the index when it is the query's only aggregate.
+    rows = queryset.model._base_manager.using(queryset.db)
+    high = rows.aggregate(high=Max('pk'))['high']
+    return high - rows.aggregate(low=Min('pk'))['low'] + 1 if high is not None else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        limit = get_exact_count_limit()
+        count = queryset[:limit].count()
+        if count < limit or queryset.query.where:
+            return count
+        return max(estimated_row_count(queryset), limit)
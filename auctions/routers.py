@@ -0,0 +1,103 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read replicas for the auctions app.
+#
+# Reads of auctions models (except users and the notification outbox) go to one of AUCTIONS_READ_REPLICAS, writes
+# (and everything else) to the primary. Replicas
+# lag behind, so a client that has just written must not read from them, or a bidder wouldn't see their own bid:
+# views decorated with @pin_to_primary send the rest of a POST request to the primary and set a cookie that keeps
+# the client's requests on the primary for AUCTIONS_REPLICA_PIN_SECONDS (ReplicaPinningMiddleware). Reads inside
+# a transaction on the primary stay on the primary as well.
+
+DEFAULT_PIN_SECONDS = 5
+PIN_COOKIE = 'auctions_primary_until'
+
+_use_primary = ContextVar('auctions_use_primary', default=False)
+
+
+# Users are read on every request to authenticate it, right after they register or log in. The outbox is read by
+# the notification dispatcher, which deletes what it has sent; a lagging replica would hand those events out again.
+PRIMARY_ONLY = {'auctions.OutboxEvent'}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        label = model._meta.label
+        if model._meta.app_label != 'auctions' or label == settings.AUTH_USER_MODEL or label in PRIMARY_ONLY:
+            return None
+        replicas = getattr(settings, 'AUCTIONS_READ_REPLICAS', [])
+        if not replicas or _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    # Replicas hold the same data as the primary.
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+# pin_to_primary: For views that write. A POST reads and writes the primary from the start, and the client stays on
+# the primary for the next AUCTIONS_REPLICA_PIN_SECONDS.
+def pin_to_primary(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method == 'POST':
+            _use_primary.set(True)
+            request.auctions_pin_primary = True
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pin_seconds():
+    return getattr(settings, 'AUCTIONS_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return _use_primary.set(pinned)
+
+    def finish(self, request, response):
+        if getattr(request, 'auctions_pin_primary', False):
+            seconds = pin_seconds()
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True,
+                                samesite='Lax')
+        return response
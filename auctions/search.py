@@ -0,0 +1,199 @@
+import logging
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Full-text search over active listings (title and description).
+#
+# The index is maintained incrementally: listings are (re)indexed when saved and dropped from the index when they
+# are closed or deleted (auctions/signals.py, close_auction). The backend is pluggable through the
+# AUCTIONS_SEARCH_BACKEND setting; SQLiteFTSBackend keeps an FTS5 virtual table next to the listings table
+# (created by migration 0014).
+# A backend for another database (e.g. PostgreSQL tsvector + GIN index) implements the same methods. A backend that
+# doesn't support the database in use is replaced by NullSearchBackend, so saving listings keeps working there.
+# Prices are filtered and bucketed on the listing's effective price, its current bid or, before the first bid (when
+# current_bid is still 0.00), its starting bid.
+
+DEFAULT_BACKEND = 'auctions.search.SQLiteFTSBackend'
+DEFAULT_PAGE_SIZE = 20
+# Upper bounds of the price facet buckets (on current_bid); the last bucket is "above the last bound".
+DEFAULT_PRICE_BUCKETS = [10, 50, 100, 500, 1000]
+
+
+class SearchBackend:
+    # Database vendors the backend works with (empty: any).
+    vendors = ()
+
+    # Re-indexes every active listing from scratch, e.g. after bulk loads that bypass the signals.
+    def rebuild(self):
+        raise NotImplementedError
+
+    def index_listing(self, listing):
+        raise NotImplementedError
+
+    def remove_listing(self, listing_id):
+        raise NotImplementedError
+
+    def remove_listings(self, listing_ids):
+        for listing_id in listing_ids:
+            self.remove_listing(listing_id)
+
+    # (Re)indexes listings by id, e.g. after a bulk reopen that bypassed the signals. Closed ones leave the index.
+    def index_listings(self, listing_ids):
+        from .models import Listing
+        for listing in Listing.objects.filter(pk__in=list(listing_ids)).only('id', 'title', 'description', 'is_active'):
+            self.index_listing(listing)
+
+    # Returns (ids of the requested page in rank order, total hits, facets).
+    def search(self, terms, category_id=None, min_price=None, max_price=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+        raise NotImplementedError
+
+
+# Indexes nothing and finds nothing.
+class NullSearchBackend(SearchBackend):
+    def rebuild(self):
+        pass
+
+    def index_listing(self, listing):
+        pass
+
+    def remove_listing(self, listing_id):
+        pass
+
+    def index_listings(self, listing_ids):
+        pass
+
+    def search(self, terms, category_id=None, min_price=None, max_price=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+        return [], 0, {'categories': {}, 'prices': [(low, high, 0) for low, high in price_ranges()]}
+
+
+class SQLiteFTSBackend(SearchBackend):
+    vendors = ('sqlite',)
+    TABLE = 'auctions_listing_fts'
+    PRICE = 'MAX(l.current_bid, l.starting_bid)'
+    REBUILD_SQL = (
+        f"INSERT INTO {TABLE} (rowid, title, description) "
+        f"SELECT id, title, description FROM auctions_listing WHERE is_active"
+    )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+            cursor.execute(self.REBUILD_SQL)
+
+    def index_listing(self, listing):
+        if not listing.is_active:
+            self.remove_listing(listing.pk)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE rowid = %s", [listing.pk])
+            cursor.execute(
+                f"INSERT INTO {self.TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+                [listing.pk, listing.title, listing.description],
+            )
+
+    def remove_listing(self, listing_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE rowid = %s", [listing_id])
+
+    def remove_listings(self, listing_ids):
+        listing_ids = list(listing_ids)
+        with connection.cursor() as cursor:
+            # Chunked to stay below SQLite's limit on query parameters.
+            for start in range(0, len(listing_ids), 500):
+                chunk = listing_ids[start:start + 500]
+                cursor.execute(
+                    f"DELETE FROM {self.TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+
+    def index_listings(self, listing_ids):
+        listing_ids = list(listing_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(listing_ids), 500):
+                chunk = listing_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.TABLE} WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(f"{self.REBUILD_SQL} AND id IN ({placeholders})", chunk)
+
+    def search(self, terms, category_id=None, min_price=None, max_price=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+        # Every term has to match, as a prefix so that partially typed words find results.
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        # bm25() can only be evaluated directly on the FTS table, so the ranked matches are a subquery.
+        base = (
+            f"FROM (SELECT rowid AS id, bm25({self.TABLE}, 10.0, 1.0) AS rank FROM {self.TABLE} "
+            f"WHERE {self.TABLE} MATCH %s) m JOIN auctions_listing l ON l.id = m.id WHERE l.is_active"
+        )
+        params = [match]
+        # Facets are counted over all matches of the text query, before the facet filters themselves are applied.
+        facet_base, facet_params = base, list(params)
+        if category_id is not None:
+            base += " AND l.category_id = %s"
+            params.append(category_id)
+        if min_price is not None:
+            # An expression has no column affinity, so the text parameter is cast to compare as a number.
+            base += f" AND {self.PRICE} >= CAST(%s AS REAL)"
+            params.append(str(min_price))
+        if max_price is not None:
+            base += f" AND {self.PRICE} < CAST(%s AS REAL)"
+            params.append(str(max_price))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT l.id, COUNT(*) OVER () {base} ORDER BY m.rank, l.id LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            rows = cursor.fetchall()
+            total = rows[0][1] if rows else self._count(cursor, base, params, offset)
+
+            cursor.execute(f"SELECT l.category_id, COUNT(*) {facet_base} GROUP BY l.category_id", facet_params)
+            categories = dict(cursor.fetchall())
+
+            bounds = price_buckets()
+            cases = ' '.join(f"WHEN {self.PRICE} < {Decimal(bound)} THEN {i}" for i, bound in enumerate(bounds))
+            cursor.execute(
+                f"SELECT CASE {cases} ELSE {len(bounds)} END AS bucket, COUNT(*) {facet_base} GROUP BY bucket",
+                facet_params,
+            )
+            prices = dict(cursor.fetchall())
+
+        facets = {
+            'categories': categories,
+            'prices': [(low, high, prices.get(i, 0)) for i, (low, high) in enumerate(price_ranges())],
+        }
+        return [row[0] for row in rows], total, facets
+
+    # Only needed when the requested page is past the last hit.
+    def _count(self, cursor, base, params, offset):
+        if not offset:
+            return 0
+        cursor.execute(f"SELECT COUNT(*) {base}", params)
+        return cursor.fetchone()[0]
+
+
+def price_buckets():
+    return getattr(settings, 'AUCTIONS_SEARCH_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS)
+
+
+# [(low, high), ...] with None for open ends, matching the price facet buckets.
+def price_ranges():
+    bounds = price_buckets()
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    backend = import_string(getattr(settings, 'AUCTIONS_SEARCH_BACKEND', DEFAULT_BACKEND))()
+    if backend.vendors and connection.vendor not in backend.vendors:
+        logger.warning("%s doesn't support %s, search is disabled", type(backend).__name__, connection.vendor)
+        return NullSearchBackend()
+    return backend
+
+
+def parse_terms(query):
+    return re.findall(r'\w+', query or '')[:10]
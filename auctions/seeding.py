@@ -0,0 +1,149 @@
+import io
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Bid, Category, Comment, Listing, User, Watchlist
+from .search import get_backend as get_search_backend
+
+# Synthetic data for load tests and benchmarks (used by `manage.py seed_auctions` and `benchmark_indexes`).
+#
+# Rows are generated and inserted in batches with bulk_create, so memory stays flat no matter how many rows are
+# requested; only the ids of users and listings and the running top bid of each listing are kept around.
+# Given the same seed the same data is produced. The denormalized columns that the app normally maintains
+# (current_bid, winning_bid, Bid.is_winning, Category.active_listing_count, the search index) are filled in at the
+# end, since bulk_create bypasses the code paths that maintain them.
+
+DEFAULT_BATCH_SIZE = 5000
+# Every seeded user gets this password, so benchmarks and manual testing can log in as any of them.
+SEED_PASSWORD = 'seed-password'
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=DEFAULT_BATCH_SIZE, prefix='seed', progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = f'{prefix}{seed}'
+        self.progress = progress or (lambda message: None)
+        self.user_ids = []
+        self.category_ids = []
+        self.listing_ids = []
+        self.starting_bids = {}
+        # listing id -> (amount, bid id) of its highest bid so far.
+        self.top_bids = {}
+
+    def seed(self, users=0, categories=0, listings=0, bids=0, comments=0, watchlist_entries=0):
+        self.seed_users(users)
+        self.seed_categories(categories)
+        self.seed_listings(listings)
+        self.seed_bids(bids)
+        self.seed_comments(comments)
+        self.seed_watchlists(watchlist_entries)
+        self.finish()
+
+    # Inserts `total` rows built by make(i), one batch per transaction, yielding each created batch.
+    def insert(self, model, total, make, **bulk_options):
+        for start in range(0, total, self.batch_size):
+            batch = [make(i) for i in range(start, min(start + self.batch_size, total))]
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch, **bulk_options)
+            yield created
+            self.progress(f"{model.__name__}: {start + len(batch)}/{total}")
+
+    def seed_users(self, total):
+        password = make_password(SEED_PASSWORD)
+        for batch in self.insert(User, total, lambda i: User(
+            username=f'{self.prefix}_user_{i}', email=f'{self.prefix}_user_{i}@example.com', password=password,
+        )):
+            self.user_ids.extend(user.id for user in batch)
+
+    def seed_categories(self, total):
+        for batch in self.insert(Category, total, lambda i: Category(name=f'Category {i}')):
+            self.category_ids.extend(category.id for category in batch)
+
+    def seed_listings(self, total):
+        rng = self.rng
+
+        def make(i):
+            starting_bid = Decimal(rng.randint(100, 100000)) / 100
+            is_active = rng.random() < 0.8
+            return Listing(
+                title=f'Item {i}',
+                description=f'Synthetic listing number {i}.',
+                starting_bid=starting_bid,
+                current_bid=starting_bid,
+                is_active=is_active,
+                closed_at=None if is_active else timezone.now(),
+                category_id=rng.choice(self.category_ids),
+                creator_id=rng.choice(self.user_ids),
+            )
+
+        for batch in self.insert(Listing, total, make):
+            for listing in batch:
+                self.listing_ids.append(listing.id)
+                self.starting_bids[listing.id] = listing.starting_bid
+
+    # Each bid beats the previous top bid of its listing, the same invariant place_bid enforces.
+    def seed_bids(self, total):
+        rng = self.rng
+        for start in range(0, total, self.batch_size):
+            batch = []
+            for _ in range(start, min(start + self.batch_size, total)):
+                listing_id = rng.choice(self.listing_ids)
+                previous = self.top_bids.get(listing_id, (self.starting_bids[listing_id], None))[0]
+                amount = previous + Decimal(rng.randint(1, 500)) / 100
+                self.top_bids[listing_id] = (amount, None)
+                batch.append(Bid(listing_id=listing_id, bidder_id=rng.choice(self.user_ids), bid_amount=amount))
+            with transaction.atomic():
+                created = Bid.objects.bulk_create(batch)
+            # Bids of a listing are created in increasing order, so the last one seen is its top bid.
+            for bid in created:
+                self.top_bids[bid.listing_id] = (bid.bid_amount, bid.id)
+            self.progress(f"Bid: {start + len(batch)}/{total}")
+
+    def seed_comments(self, total):
+        rng = self.rng
+        for _ in self.insert(Comment, total, lambda i: Comment(
+            listing_id=rng.choice(self.listing_ids),
+            commenter_id=rng.choice(self.user_ids),
+            content=f'Synthetic comment {i}.',
+        )):
+            pass
+
+    def seed_watchlists(self, total):
+        if not total:
+            return
+        rng = self.rng
+        Watchlist.objects.bulk_create([Watchlist(user_id=user_id) for user_id in self.user_ids],
+                                      batch_size=self.batch_size, ignore_conflicts=True)
+        watchlist_ids = dict(
+            Watchlist.objects.filter(user_id__gte=min(self.user_ids), user_id__lte=max(self.user_ids))
+            .values_list('user_id', 'id')
+        )
+        through = Watchlist.listings.through
+        for _ in self.insert(through, total, lambda i: through(
+            watchlist_id=watchlist_ids[rng.choice(self.user_ids)],
+            listing_id=rng.choice(self.listing_ids),
+        ), ignore_conflicts=True):
+            pass
+
+    # Bring the denormalized columns in line with the inserted rows.
+    def finish(self):
+        items = list(self.top_bids.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            with transaction.atomic():
+                Listing.objects.bulk_update(
+                    [Listing(id=listing_id, current_bid=amount, winning_bid_id=bid_id)
+                     for listing_id, (amount, bid_id) in batch],
+                    ['current_bid', 'winning_bid'],
+                )
+                Bid.objects.filter(id__in=[bid_id for _, (_, bid_id) in batch]).update(is_winning=True)
+            self.progress(f"Top bids: {start + len(batch)}/{len(items)}")
+        if self.listing_ids:
+            call_command('rebuild_category_counts', stdout=io.StringIO())
+            get_search_backend().rebuild()
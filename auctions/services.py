@@ -0,0 +1,264 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .db import write_transaction
+from .events import publish_listing_event
+from .models import Bid, Category, Listing, OutboxEvent, ProxyBid
+from .search import get_backend as get_search_backend
+
+
+# open_for_bids: Filter for listings that still accept bids at `now`.
+def open_for_bids(now):
+    return Q(is_active=True) & (Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+
+
+# Soft close: a bid placed less than AUCTIONS_SOFT_CLOSE_WINDOW seconds before ends_at pushes the end out to
+# AUCTIONS_SOFT_CLOSE_EXTENSION seconds after the bid, so sniping in the last second gains nothing and the bids
+# spread out instead of piling up at the deadline. A window of 0 turns it off.
+DEFAULT_SOFT_CLOSE_WINDOW = 120
+DEFAULT_SOFT_CLOSE_EXTENSION = 120
+# Step by which proxy bids outbid each other.
+DEFAULT_BID_INCREMENT = '1.00'
+
+
+def soft_close_ends_at(now):
+    window = getattr(settings, 'AUCTIONS_SOFT_CLOSE_WINDOW', DEFAULT_SOFT_CLOSE_WINDOW)
+    extension = getattr(settings, 'AUCTIONS_SOFT_CLOSE_EXTENSION', DEFAULT_SOFT_CLOSE_EXTENSION)
+    if not window:
+        return F('ends_at')
+    extended = now + timedelta(seconds=extension)
+    # Never moves the end time earlier (when the extension is shorter than the window).
+    return Case(
+        When(ends_at__lt=min(now + timedelta(seconds=window), extended), then=Value(extended)),
+        default=F('ends_at'),
+    )
+
+
+# place_bid: Records a bid on an active listing if (and only if) it beats the current bid.
+# The check and the write happen in one conditional UPDATE:
+#
+#     UPDATE auctions_listing SET current_bid = %s, ends_at = CASE WHEN ends_at < %s THEN %s ELSE ends_at END
+#     WHERE id = %s AND is_active AND (ends_at IS NULL OR ends_at > %s) AND starting_bid <= %s AND current_bid < %s
+#
+# so two concurrent bidders can never both "win": the database serialises the UPDATEs on the listing row
+# and the second one re-evaluates the WHERE clause against the first one's committed value.
+# Auctions past their end time take no more bids, even before an expiry worker has closed them; bids close to the
+# end extend it (soft close) in the same statement.
+# Only current_bid, ends_at and winning_bid are written; the rest of the listing row is left alone.
+# Proxies of other bidders with a higher maximum answer the bid in the same transaction (see resolve_proxy_bids).
+# If the lead changed hands, the previous leader and the watchers are notified through the outbox.
+# Returns the new Bid, or None if the bid was too low or the listing is no longer active.
+@write_transaction
+def place_bid(listing_id, bidder, bid_amount):
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Listing.objects.filter(
+            open_for_bids(now),
+            pk=listing_id,
+            starting_bid__lte=bid_amount,
+            current_bid__lt=bid_amount,
+        ).update(current_bid=bid_amount, ends_at=soft_close_ends_at(now))
+        if not updated:
+            return None
+
+        # We hold the listing row now, so nobody else can be flipping these flags concurrently.
+        previous_leader_id = Listing.objects.filter(pk=listing_id).values_list(
+            'winning_bid__bidder_id', flat=True,
+        ).get()
+        Bid.objects.filter(listing_id=listing_id, is_winning=True).update(is_winning=False)
+        new_bid = Bid.objects.create(listing_id=listing_id, bidder=bidder, bid_amount=bid_amount, is_winning=True)
+        Listing.objects.filter(pk=listing_id).update(winning_bid=new_bid)
+        # Proxies of other bidders answer the bid before anyone else gets the row.
+        winning_bid = resolve_proxy_bids(listing_id, now, current_bid=bid_amount, leader_id=bidder.pk)
+        if winning_bid:
+            new_bid.is_winning = False
+        record_outbid(listing_id, winning_bid or new_bid, previous_leader_id)
+        publish_bid_event(listing_id)
+        return new_bid
+
+
+# place_proxy_bid: Sets (or raises) the bidder's maximum on a listing and lets the proxies bid it out.
+# The maximum has to beat the current bid, unless the bidder is already winning and only raises their limit.
+# Returns the ProxyBid, or None if the maximum is too low or the listing no longer takes bids.
+@write_transaction
+def place_proxy_bid(listing_id, bidder, max_amount):
+    now = timezone.now()
+    with transaction.atomic():
+        # A no-op UPDATE takes the listing row lock (on SQLite: the write lock) before anything is read, and checks
+        # that the auction is still open, in the same way place_bid does.
+        if not Listing.objects.filter(open_for_bids(now), pk=listing_id).update(current_bid=F('current_bid')):
+            return None
+        starting_bid, current_bid, leader_id = Listing.objects.filter(pk=listing_id).values_list(
+            'starting_bid', 'current_bid', 'winning_bid__bidder_id',
+        ).get()
+        proxy = ProxyBid.objects.filter(listing_id=listing_id, bidder=bidder).first()
+        if (max_amount < starting_bid or (leader_id != bidder.pk and max_amount <= current_bid)
+                or (proxy is not None and max_amount <= proxy.max_amount)):
+            return None
+        if proxy is None:
+            proxy = ProxyBid.objects.create(listing_id=listing_id, bidder=bidder, max_amount=max_amount)
+        else:
+            ProxyBid.objects.filter(pk=proxy.pk).update(max_amount=max_amount)
+            proxy.max_amount = max_amount
+        winning_bid = resolve_proxy_bids(
+            listing_id, now, current_bid=current_bid, leader_id=leader_id, starting_bid=starting_bid,
+        )
+        if winning_bid:
+            record_outbid(listing_id, winning_bid, leader_id)
+            publish_bid_event(listing_id)
+        return proxy
+
+
+def bid_increment():
+    return Decimal(str(getattr(settings, 'AUCTIONS_BID_INCREMENT', DEFAULT_BID_INCREMENT)))
+
+
+# resolve_proxy_bids: Settles the listing against its proxies. Must run under the listing row lock, with the listing's
+# current bid and the id of the bidder holding it. Before the first bid current_bid is only a placeholder (0.00 for
+# listings created through the form), so the opening bid is priced at least at the listing's starting_bid.
+#
+# Every resolution leaves the maximums of all proxies except the leader's at or below the current bid, so only the
+# two strongest proxies can matter: the strongest one wins, at one increment above the runner-up (the runner-up's
+# maximum or the standing bid), capped at its own maximum. The outcome of the whole bidding war is written at once:
+# at most a Bid for the runner-up at its maximum and one for the winner, instead of a row per increment.
+# Returns the winning Bid, or None if nothing changed.
+def resolve_proxy_bids(listing_id, now, current_bid, leader_id, starting_bid=Decimal('0.00')):
+    proxies = list(
+        ProxyBid.objects.filter(listing_id=listing_id)
+        .order_by('-max_amount', 'created_at', 'id')
+        .values_list('bidder_id', 'max_amount')[:2]
+    )
+    if not proxies:
+        return None
+    winner_id, winner_max = proxies[0]
+    runner_up_id, runner_up_max = proxies[1] if len(proxies) > 1 else (None, None)
+
+    if winner_id == leader_id:
+        # The leader only has to answer a runner-up that went above the current bid.
+        if runner_up_max is None or runner_up_max <= current_bid:
+            return None
+        rival = runner_up_max
+    else:
+        # A tie with the standing bid goes to the standing bid, which was there first.
+        if winner_max <= current_bid:
+            return None
+        rival = max(current_bid, runner_up_max) if runner_up_max is not None else current_bid
+    # Proxies below the starting bid are refused, so the winner's maximum always covers it.
+    price = min(winner_max, max(rival + bid_increment(), starting_bid))
+
+    bids = []
+    if runner_up_max is not None and current_bid < runner_up_max < price:
+        bids.append(Bid(listing_id=listing_id, bidder_id=runner_up_id, bid_amount=runner_up_max))
+    bids.append(Bid(listing_id=listing_id, bidder_id=winner_id, bid_amount=price, is_winning=True))
+    Bid.objects.filter(listing_id=listing_id, is_winning=True).update(is_winning=False)
+    winning_bid = Bid.objects.bulk_create(bids)[-1]
+    # bulk_create sends no post_save, so the cached pages are invalidated here (modified_at).
+    Listing.objects.filter(pk=listing_id).update(
+        current_bid=price, winning_bid=winning_bid, ends_at=soft_close_ends_at(now), modified_at=timezone.now(),
+    )
+    return winning_bid
+
+
+# record_outbid: Queues an outbid notification (auctions/notifications.py) if winning_bid took the lead from another
+# bidder. Runs in the bid's transaction, so the notification exists exactly when the bid does.
+def record_outbid(listing_id, winning_bid, previous_leader_id):
+    if previous_leader_id is not None and previous_leader_id != winning_bid.bidder_id:
+        OutboxEvent.objects.create(
+            kind=OutboxEvent.OUTBID, listing_id=listing_id, bid=winning_bid, outbid_user_id=previous_leader_id,
+        )
+
+
+# publish_bid_event: Tells the listing's live subscribers about its (final) current bid, once the transaction commits.
+def publish_bid_event(listing_id):
+    current_bid, bidder, ends_at = Listing.objects.filter(pk=listing_id).values_list(
+        'current_bid', 'winning_bid__bidder__username', 'ends_at',
+    ).get()
+    publish_listing_event(
+        listing_id, 'bid', current_bid=str(current_bid), bidder=bidder,
+        ends_at=ends_at.isoformat() if ends_at else None,
+    )
+
+
+# close_auction: Marks an active listing as closed and returns (closed, winning_bid).
+# Bids only land on active listings and place_bid maintains winning_bid under the same row lock, so flipping
+# is_active inside this transaction freezes the winner: the bid read afterwards is the one that won.
+@write_transaction
+def close_auction(listing_id, creator):
+    with transaction.atomic():
+        now = timezone.now()
+        closed = Listing.objects.filter(pk=listing_id, creator=creator, is_active=True).update(
+            is_active=False, closed_at=now, modified_at=now,
+        )
+        if closed:
+            listings_closed(Listing.objects.filter(pk=listing_id).values_list('id', 'category_id'))
+        winning_bid = (
+            Bid.objects.select_related('bidder')
+            .filter(pk=Listing.objects.filter(pk=listing_id).values('winning_bid')[:1])
+            .first()
+        )
+    return bool(closed), winning_bid
+
+
+# listings_closed: Bookkeeping for listings this transaction has just closed with a queryset update (which sends no
+# signals): category counters, the search index and the closing notifications. The closing UPDATE itself sets
+# modified_at, which invalidates the cached pages (auctions/caching.py).
+# rows are (listing id, category id) pairs.
+def listings_closed(rows):
+    rows = list(rows)
+    ids = [listing_id for listing_id, _ in rows]
+    per_category = {}
+    for listing_id, category_id in rows:
+        per_category[category_id] = per_category.get(category_id, 0) + 1
+    get_search_backend().remove_listings(ids)
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(kind=OutboxEvent.CLOSED, listing_id=listing_id) for listing_id, _ in rows]
+    )
+    for category_id, count in per_category.items():
+        Category.adjust_active_listing_count(category_id, -count)
+
+
+# close_listings: Closes every active listing in the queryset with one UPDATE (the admin's bulk action) and returns
+# how many it closed.
+# The rows are read inside the transaction, then updated with the same conditions, so the bookkeeping covers exactly
+# the listings the UPDATE changed: where the database can lock rows the read locks them (FOR UPDATE); SQLite lets only
+# one transaction write, and one whose rows were changed after its read fails with "database is locked" and is re-run
+# by write_transaction.
+@write_transaction
+def close_listings(queryset):
+    now = timezone.now()
+    with transaction.atomic():
+        listings = Listing.objects.filter(pk__in=queryset.values('pk'), is_active=True)
+        rows = list(listings.select_for_update().values_list('id', 'category_id'))
+        if rows:
+            listings.update(is_active=False, closed_at=now, modified_at=now)
+            listings_closed(rows)
+    return len(rows)
+
+
+# reopen_listings: Reopens every closed listing in the queryset with one UPDATE and returns how many it reopened,
+# reading the rows like close_listings. Listings whose end time has passed are reopened without one (until their
+# creator closes them), otherwise the expiry worker would close them again right away.
+@write_transaction
+def reopen_listings(queryset):
+    now = timezone.now()
+    with transaction.atomic():
+        listings = Listing.objects.filter(pk__in=queryset.values('pk'), is_active=False)
+        rows = list(listings.select_for_update().values_list('id', 'category_id'))
+        if not rows:
+            return 0
+        listings.update(
+            is_active=True, closed_at=None, modified_at=now,
+            ends_at=Case(When(ends_at__lte=now, then=Value(None)), default=F('ends_at')),
+        )
+        per_category = {}
+        for _, category_id in rows:
+            per_category[category_id] = per_category.get(category_id, 0) + 1
+        get_search_backend().index_listings([listing_id for listing_id, _ in rows])
+        for category_id, count in per_category.items():
+            Category.adjust_active_listing_count(category_id, count)
+    return len(rows)
@@ -0,0 +1,32 @@
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+from .db import write_transaction
+
+# Removal of expired sessions from django_session.
+#
+# Django's `clearsessions` deletes every expired row in one statement, which on SQLite holds the write lock (and with
+# it every bid) for as long as the whole table takes to scan. Here the expired keys are read first and deleted a
+# batch per short transaction instead, the same way auctions/expiry.py closes auctions. Sessions kept in a cache or
+# in signed cookies expire on their own; this only clears rows left behind by the db/cached_db session profiles.
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+# clear_expired_sessions: Deletes sessions that expired before `now` and returns how many were deleted.
+def clear_expired_sessions(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += _delete(keys, now)
+
+
+@write_transaction
+def _delete(keys, now):
+    with transaction.atomic():
+        # Re-checks the expiry date: a session may have been renewed since its key was read.
+        return Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
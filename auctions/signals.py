@@ -0,0 +1,97 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import invalidate_listing
+from .db import configure_sqlite
+from .search import get_backend as get_search_backend
+from .models import Bid, Category, Comment, Listing
+
+
+# ====================== listing page cache ====================================
+# Any saved listing, bid or comment changes what the listing page shows. A full save of a listing moves its
+# modified_at itself (auto_now), a save with update_fields only if they include it. Deleted listings have no page left.
+# (Queryset .update() calls don't send signals; code paths using them invalidate explicitly.)
+@receiver(post_save, sender=Listing)
+def listing_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'modified_at' not in update_fields:
+        invalidate_listing(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Bid)
+@receiver([post_save, post_delete], sender=Comment)
+def listing_child_changed(sender, instance, **kwargs):
+    invalidate_listing(instance.listing_id)
+
+
+# ====================== category counters ====================================
+# Category.active_listing_count follows every listing that is created, deleted, closed/reopened or moved to another
+# category. The values the counters currently reflect are remembered on the instance when it is loaded, so working
+# out the change on save doesn't need an extra query. (Queryset .update() calls, e.g. closing an auction, adjust
+# the counters themselves.)
+# Instances loaded with .only()/.defer() without these fields can't change them on save either (Django only saves
+# the loaded fields), so they are left alone rather than triggering a query per instance.
+UNKNOWN = object()
+
+
+def _counted_category(listing):
+    if 'is_active' not in listing.__dict__ or 'category_id' not in listing.__dict__:
+        return UNKNOWN
+    return listing.category_id if listing.is_active else None
+
+
+@receiver(post_init, sender=Listing)
+def remember_counted_category(sender, instance, **kwargs):
+    instance._counted_category = _counted_category(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Listing)
+def update_category_counts_on_save(sender, instance, **kwargs):
+    old, new = instance._counted_category, _counted_category(instance)
+    if old is not UNKNOWN and new is not UNKNOWN and old != new:
+        Category.adjust_active_listing_count(old, -1)
+        Category.adjust_active_listing_count(new, +1)
+        instance._counted_category = new
+
+
+@receiver(post_delete, sender=Listing)
+def update_category_counts_on_delete(sender, instance, **kwargs):
+    if instance._counted_category is not UNKNOWN:
+        Category.adjust_active_listing_count(instance._counted_category, -1)
+
+
+# ====================== close time ====================================
+# Listings closed or reopened through a full save (the listing form, the admin) get closed_at set or cleared here;
+# close_auction and the expiry worker set it in their own UPDATEs.
+@receiver(pre_save, sender=Listing)
+def update_closed_at(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None or 'is_active' not in instance.__dict__:
+        return
+    if instance.is_active:
+        instance.closed_at = None
+    elif instance.closed_at is None:
+        instance.closed_at = timezone.now()
+
+
+# ====================== search index ====================================
+# Active listings are (re)indexed whenever they are saved; closed and deleted ones leave the index.
+# Listings saved with update_fields that don't touch the indexed columns are skipped.
+SEARCH_FIELDS = {'title', 'description', 'is_active'}
+
+
+@receiver(post_save, sender=Listing)
+def update_search_index_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        get_search_backend().index_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove_listing(instance.pk)
+
+
+# ====================== database connections ====================================
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    configure_sqlite(connection)
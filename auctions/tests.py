@@ -1,3 +1,1516 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import os
+import json
+import random
+import shutil
+import tempfile
+import threading
+import warnings
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, async_views, comments, expiry, exports, instrumentation, notifications
+from .caching import listing_version
+from .db import write_transaction
+from .expiry import expire_due_listings
+from .events import InMemoryBroker, channel_name, get_broker
+from .forms import ListingForm
+from .images import Image, thumbnail_path
+from .pagination import EstimatedCountPaginator
+from .models import (
+    ArchivedBid, ArchivedComment, ArchivedListing, Bid, Category, Comment, Listing, OutboxEvent, ProxyBid, StoredImage,
+    User, Watchlist,
+)
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, pin_to_primary
+from .search import NullSearchBackend, get_backend as get_search_backend
+from .seeding import Seeder
+from .services import close_auction, close_listings, place_bid, place_proxy_bid, reopen_listings
+
+
+def make_listing(creator, category, **kwargs):
+    fields = {
+        'title': 'Item',
+        'description': 'Description',
+        'starting_bid': Decimal('1.00'),
+        'current_bid': Decimal('1.00'),
+        'category': category,
+        'creator': creator,
+    }
+    fields.update(kwargs)
+    return Listing.objects.create(**fields)
+
+
+# ==================== Active listings feed ====================
+@override_settings(AUCTIONS_PAGE_SIZE=5)
+class ListingFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        cls.users = [User.objects.create_user(f'user{i}', password='pass') for i in range(3)]
+        cls.listings = [
+            make_listing(cls.users[i % 3], cls.categories[i % 3], title=f'Item {i}')
+            for i in range(12)
+        ]
+        make_listing(cls.users[0], cls.categories[0], title='Closed', is_active=False)
+
+    def test_index_query_budget(self):
+        # One query per page, regardless of how many categories/creators appear on it.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['active_listings']), 5)
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse('index'), {'cursor': response.context['next_cursor']})
+
+    def test_index_walks_all_active_listings(self):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(reverse('index'), {'cursor': cursor} if cursor else {})
+            seen.extend(listing.id for listing in response.context['active_listings'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [listing.id for listing in reversed(self.listings)])
+
+    def test_category_detail_is_paginated(self):
+        category = self.categories[0]
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('category_detail', args=[category.id]))
+        self.assertEqual(len(response.context['active_listings']), 4)
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('index'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+# ==================== Bid placement ====================
+class PlaceBidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.category = Category.objects.create(name='Toys')
+
+    def setUp(self):
+        self.listing = make_listing(self.seller, self.category, starting_bid=Decimal('10.00'), current_bid=0)
+
+    def test_bid_below_starting_bid_is_rejected(self):
+        self.assertIsNone(place_bid(self.listing.id, self.bidder, Decimal('9.99')))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_only_latest_bid_is_winning(self):
+        first = place_bid(self.listing.id, self.bidder, Decimal('10.00'))
+        second = place_bid(self.listing.id, self.seller, Decimal('12.00'))
+        self.assertIsNone(place_bid(self.listing.id, self.bidder, Decimal('12.00')))
+
+        first.refresh_from_db()
+        self.assertFalse(first.is_winning)
+        self.assertTrue(second.is_winning)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_bid, Decimal('12.00'))
+
+    def test_closed_listing_rejects_bids(self):
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False)
+        self.assertIsNone(place_bid(self.listing.id, self.bidder, Decimal('50.00')))
+
+    def test_bid_does_not_overwrite_other_columns(self):
+        # A stale in-memory copy saved elsewhere must not be clobbered by the bid path, and vice versa.
+        Listing.objects.filter(pk=self.listing.pk).update(title='Renamed')
+        place_bid(self.listing.id, self.bidder, Decimal('15.00'))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.title, 'Renamed')
+
+    def test_bid_view(self):
+        self.client.login(username='bidder', password='pass')
+        response = self.client.post(reverse('bid', args=[self.listing.id]), {'bid_amount': '11.00'})
+        self.assertRedirects(response, reverse('listing_detail', args=[self.listing.id]))
+        response = self.client.post(reverse('bid', args=[self.listing.id]), {'bid_amount': '11.00'})
+        self.assertEqual(response.status_code, 403)
+
+
+# ==================== Closing auctions ====================
+class CloseAuctionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.category = Category.objects.create(name='Toys')
+
+    def setUp(self):
+        self.listing = make_listing(self.seller, self.category)
+
+    def test_winner_is_the_highest_bid(self):
+        place_bid(self.listing.id, self.bidder, Decimal('5.00'))
+        top = place_bid(self.listing.id, self.seller, Decimal('7.00'))
+
+        closed, winning_bid = close_auction(self.listing.id, self.seller)
+        self.assertTrue(closed)
+        self.assertEqual(winning_bid, top)
+        self.listing.refresh_from_db()
+        self.assertFalse(self.listing.is_active)
+        self.assertEqual(self.listing.winning_bid, top)
+        self.assertIsNone(place_bid(self.listing.id, self.bidder, Decimal('100.00')))
+
+    def test_only_creator_can_close(self):
+        closed, _ = close_auction(self.listing.id, self.bidder)
+        self.assertFalse(closed)
+        self.listing.refresh_from_db()
+        self.assertTrue(self.listing.is_active)
+
+    def test_close_view_and_winner_notice(self):
+        place_bid(self.listing.id, self.bidder, Decimal('5.00'))
+        self.client.login(username='seller', password='pass')
+        response = self.client.get(reverse('close_listing', args=[self.listing.id]))
+        self.assertEqual(response.context['winning_bid'].bidder, self.bidder)
+
+        response = self.client.post(reverse('close_listing', args=[self.listing.id]))
+        self.assertRedirects(response, reverse('listing_detail', args=[self.listing.id]))
+        self.client.login(username='bidder', password='pass')
+        response = self.client.get(reverse('listing_detail', args=[self.listing.id]))
+        self.assertContains(response, 'You won this auction')
+
+
+class PlaceBidConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    BIDS_PER_THREAD = 50
+
+    def test_no_lost_updates(self):
+        seller = User.objects.create(username='seller')
+        bidders = [User.objects.create(username=f'bidder{i}') for i in range(self.THREADS)]
+        listing = make_listing(seller, Category.objects.create(name='Toys'), current_bid=0)
+
+        accepted = []
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(bidder, seed):
+            rng = random.Random(seed)
+            try:
+                barrier.wait()
+                for _ in range(self.BIDS_PER_THREAD):
+                    amount = Decimal(rng.randint(100, 100000)) / 100
+                    if place_bid(listing.id, bidder, amount) is not None:
+                        accepted.append(amount)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(bidder, i)) for i, bidder in enumerate(bidders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        listing.refresh_from_db()
+        bids = list(Bid.objects.filter(listing=listing).order_by('id'))
+        self.assertEqual(len(bids), len(accepted))
+        # Every accepted bid beat the one before it, and the listing reflects the highest one.
+        amounts = [bid.bid_amount for bid in bids]
+        self.assertEqual(amounts, sorted(amounts))
+        self.assertEqual(len(set(amounts)), len(amounts))
+        self.assertEqual(listing.current_bid, max(accepted))
+        self.assertEqual([bid.bid_amount for bid in bids if bid.is_winning], [max(accepted)])
+
+
+# ==================== Live listing events ====================
+class InMemoryBrokerTests(TestCase):
+    async def test_fan_out_to_all_subscribers_of_a_channel(self):
+        broker = InMemoryBroker()
+        async with broker.subscribe('listing:1') as first, broker.subscribe('listing:1') as second, \
+                broker.subscribe('listing:2') as other:
+            # publish() is called from sync views running in worker threads.
+            await asyncio.to_thread(broker.publish, 'listing:1', {'type': 'bid'})
+            self.assertEqual(await first.get(timeout=1), {'type': 'bid'})
+            self.assertEqual(await second.get(timeout=1), {'type': 'bid'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await other.get(timeout=0.05)
+        self.assertEqual(broker.subscribers, {})
+
+    async def test_slow_subscriber_drops_oldest_events(self):
+        broker = InMemoryBroker()
+        async with broker.subscribe('listing:1') as subscription:
+            for i in range(subscription.MAX_PENDING + 10):
+                broker.publish('listing:1', i)
+            await asyncio.sleep(0)
+            self.assertEqual(await subscription.get(timeout=1), 10)
+
+
+@override_settings(AUCTIONS_COMMENT_BATCH_SIZE=1)
+class ListingEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.listing = make_listing(cls.seller, Category.objects.create(name='Toys'))
+
+    def test_events_are_published_on_commit(self):
+        received = []
+        broker = get_broker()
+        broker.publish, original = (lambda channel, event: received.append((channel, event))), broker.publish
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.listing.id, self.bidder, Decimal('3.00'))
+            self.client.login(username='bidder', password='pass')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('add_comment', args=[self.listing.id]), {'content': 'Nice'})
+        finally:
+            broker.publish = original
+
+        self.assertEqual([(channel, event['type']) for channel, event in received], [
+            (channel_name(self.listing.id), 'bid'),
+            (channel_name(self.listing.id), 'comment'),
+        ])
+        self.assertEqual(received[0][1]['current_bid'], '3.00')
+        self.assertEqual(received[1][1]['commenter'], 'bidder')
+
+    async def test_stream_starts_with_a_snapshot_then_pushes_bids(self):
+        response = await self.async_client.get(reverse('listing_events', args=[self.listing.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b'retry:'))
+        snapshot = await anext(content)
+        self.assertIn(b'event: snapshot', snapshot)
+
+        next_event = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0.05)
+        get_broker().publish(channel_name(self.listing.id), {'type': 'bid', 'current_bid': '9.00'})
+        event = await asyncio.wait_for(next_event, 1)
+        self.assertEqual(json.loads(event.decode().split('data: ')[1]), {'type': 'bid', 'current_bid': '9.00'})
+        await content.aclose()
+
+    def test_wsgi_stream_is_the_snapshot_served_synchronously(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = self.client.get(reverse('listing_events', args=[self.listing.id]))
+            self.assertFalse(response.is_async)
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        self.assertIn(b'event: snapshot', chunks[1])
+
+    def test_unknown_listing(self):
+        response = self.client.get(reverse('listing_events', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+# ==================== Listing page cache ====================
+@override_settings(AUCTIONS_COMMENT_BATCH_SIZE=1)
+class ListingDetailCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.listing = make_listing(cls.seller, Category.objects.create(name='Toys'))
+        for i in range(5):
+            cls.listing.comments.create(commenter=cls.bidder, content=f'Comment {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_detail(self):
+        return self.client.get(reverse('listing_detail', args=[self.listing.id]))
+
+    def test_cached_page_skips_comment_queries(self):
+        with self.assertNumQueries(2):
+            # listing (+ joins) and comments (+ commenters), no query per comment.
+            self.get_detail()
+        with self.assertNumQueries(1):
+            response = self.get_detail()
+        self.assertContains(response, 'Comment 4')
+
+    def test_writes_invalidate_the_page(self):
+        self.get_detail()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.listing.id, self.bidder, Decimal('42.00'))
+        self.assertContains(self.get_detail(), '42.00')
+
+        self.client.login(username='bidder', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_comment', args=[self.listing.id]), {'content': 'Fresh comment'})
+        self.assertContains(self.get_detail(), 'Fresh comment')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            close_auction(self.listing.id, self.seller)
+        self.assertContains(self.get_detail(), 'Active listing: False')
+
+    def test_version_is_stored_with_the_listing(self):
+        # Other worker processes see the new version too, whatever cache they use.
+        modified_at = Listing.objects.get(pk=self.listing.pk).modified_at
+        place_bid(self.listing.id, self.bidder, Decimal('42.00'))
+        self.assertGreater(Listing.objects.get(pk=self.listing.pk).modified_at, modified_at)
+        self.assertContains(self.get_detail(), '42.00')
+
+    def test_listing_form_save_invalidates_the_page(self):
+        self.get_detail()
+        form = ListingForm({
+            'title': 'Renamed', 'description': 'New description', 'starting_bid': '1.00',
+            'category': self.listing.category_id, 'is_active': True,
+        }, instance=self.listing)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        self.assertContains(self.get_detail(), 'New description')
+
+
+# ==================== Watchlist ====================
+class WatchlistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('watcher', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        category = Category.objects.create(name='Toys')
+        cls.listings = [make_listing(cls.other, category, title=f'Item {i}') for i in range(4)]
+
+    def test_is_watching_answers_a_page_in_one_query(self):
+        Watchlist.add_listing(self.user, self.listings[0].id)
+        Watchlist.add_listing(self.user, self.listings[2].id)
+        Watchlist.add_listing(self.other, self.listings[1].id)
+        with self.assertNumQueries(1):
+            watched = Watchlist.is_watching(self.user, [listing.id for listing in self.listings])
+        self.assertEqual(watched, {self.listings[0].id, self.listings[2].id})
+
+    def test_add_and_remove_are_idempotent(self):
+        Watchlist.add_listing(self.user, self.listings[0].id)
+        Watchlist.add_listing(self.user, self.listings[0].id)
+        self.assertEqual(self.user.watchlist.listings.count(), 1)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Watchlist.remove_listing(self.user, self.listings[0].id))
+        self.assertFalse(Watchlist.remove_listing(self.user, self.listings[0].id))
+
+    def test_views(self):
+        self.client.login(username='watcher', password='pass')
+        listing = self.listings[3]
+        self.client.post(reverse('add_to_watchlist', args=[listing.id]))
+        response = self.client.get(reverse('listing_detail', args=[listing.id]))
+        self.assertTrue(response.context['is_watched'])
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['watched_ids'], {listing.id})
+
+        self.client.post(reverse('remove_from_watchlist', args=[listing.id]))
+        response = self.client.get(reverse('listing_detail', args=[listing.id]))
+        self.assertFalse(response.context['is_watched'])
+
+
+# ==================== Category counts ====================
+class CategoryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.toys = Category.objects.create(name='Toys')
+        cls.books = Category.objects.create(name='Books')
+
+    def count(self, category):
+        category.refresh_from_db()
+        return category.active_listing_count
+
+    def test_counts_follow_listing_changes(self):
+        listing = make_listing(self.seller, self.toys)
+        make_listing(self.seller, self.toys, is_active=False)
+        self.assertEqual(self.count(self.toys), 1)
+
+        listing.category = self.books
+        listing.save()
+        self.assertEqual((self.count(self.toys), self.count(self.books)), (0, 1))
+
+        close_auction(listing.id, self.seller)
+        self.assertEqual(self.count(self.books), 0)
+
+        listing = Listing.objects.get(pk=listing.pk)
+        listing.is_active = True
+        listing.save()
+        self.assertEqual(self.count(self.books), 1)
+        listing.delete()
+        self.assertEqual(self.count(self.books), 0)
+
+    def test_drifted_counter_does_not_block_closing(self):
+        listing = make_listing(self.seller, self.toys)
+        Category.objects.filter(pk=self.toys.pk).update(active_listing_count=0)
+        closed, _ = close_auction(listing.id, self.seller)
+        self.assertTrue(closed)
+        self.assertEqual(self.count(self.toys), 0)
+
+    def test_category_list_uses_stored_counts(self):
+        make_listing(self.seller, self.toys)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category_list'))
+        self.assertEqual(list(response.context['categories']), [self.toys])
+
+    def test_rebuild_command(self):
+        make_listing(self.seller, self.toys)
+        Category.objects.filter(pk=self.toys.pk).update(active_listing_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_category_counts', '--check', stdout=io.StringIO())
+
+        call_command('rebuild_category_counts', stdout=io.StringIO())
+        self.assertEqual(self.count(self.toys), 1)
+        call_command('rebuild_category_counts', '--check', stdout=io.StringIO())
+
+
+# ==================== Seeding and benchmarks ====================
+class SeedingTests(TestCase):
+    def test_seeded_data_is_consistent(self):
+        Seeder(seed=3, batch_size=50).seed(users=20, categories=3, listings=40, bids=300, comments=50,
+                                           watchlist_entries=30)
+        self.assertEqual(Listing.objects.count(), 40)
+        self.assertEqual(Bid.objects.count(), 300)
+        for listing in Listing.objects.filter(bids__isnull=False).distinct().select_related('winning_bid'):
+            top = listing.bids.order_by('-bid_amount').first()
+            self.assertEqual(listing.winning_bid, top)
+            self.assertEqual(listing.current_bid, top.bid_amount)
+        self.assertEqual(Bid.objects.filter(is_winning=True).count(), Listing.objects.filter(bids__isnull=False)
+                         .distinct().count())
+        call_command('rebuild_category_counts', '--check', stdout=io.StringIO())
+
+    def test_bench_command_reports_json(self):
+        Seeder(seed=1).seed(users=5, categories=2, listings=10, bids=20)
+        out = io.StringIO()
+        call_command('bench_auctions', '--requests', '5', '--warmup', '1', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['scenarios']), {'index', 'listing_detail', 'bid', 'category_list'})
+        self.assertEqual(report['scenarios']['index']['queries_per_request'], 1)
+
+
+# ==================== Instrumentation ====================
+@override_settings(AUCTIONS_INSTRUMENTATION=True, AUCTIONS_QUERY_BUDGETS={'listing_detail': 1})
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.listing = make_listing(cls.staff, Category.objects.create(name='Toys'))
+
+    def setUp(self):
+        instrumentation.registry.clear()
+        cache.clear()
+
+    def test_records_per_view_metrics_and_warns_over_budget(self):
+        self.client.get(reverse('index'))
+        with self.assertLogs('auctions.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('listing_detail', args=[self.listing.id]))
+        self.assertIn('listing_detail ran', logs.output[0])
+
+        self.client.login(username='staff', password='pass')
+        report = self.client.get(reverse('instrumentation')).json()
+        self.assertEqual(report['views']['index']['requests'], 1)
+        self.assertEqual(report['views']['index']['queries']['max'], 1)
+        self.assertEqual(sum(report['views']['index']['wall_ms']['histogram'].values()), 1)
+
+    def test_counts_duplicate_queries(self):
+        recorder = instrumentation.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                Category.objects.filter(pk=self.listing.category_id).first()
+        self.assertEqual((recorder.count, recorder.duplicates), (3, 2))
+
+    def test_endpoint_is_staff_only(self):
+        response = self.client.get(reverse('instrumentation'))
+        self.assertEqual(response.status_code, 302)
+
+
+# ==================== Listing images ====================
+def make_jpeg(color, size=(1200, 900)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class ListingImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.category = Category.objects.create(name='Art')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, AUCTIONS_THUMBNAIL_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.login(username='seller', password='pass')
+
+    def create_listing(self, content, title='Painting'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create_listing'), {
+                'title': title, 'description': 'Oil on canvas', 'starting_bid': '10.00',
+                'category': self.category.id, 'is_active': True,
+                'image_file': SimpleUploadedFile('painting.jpg', content, content_type='image/jpeg'),
+            })
+        return Listing.objects.get(title=title)
+
+    def test_identical_uploads_are_stored_once_with_thumbnails(self):
+        content = make_jpeg('red')
+        first = self.create_listing(content, 'First')
+        second = self.create_listing(content, 'Second')
+        self.assertEqual(first.image_id, second.image_id)
+        self.assertEqual(StoredImage.objects.count(), 1)
+
+        image = StoredImage.objects.get()
+        self.assertTrue(image.thumbnails_ready)
+        self.assertEqual((image.width, image.height), (1200, 900))
+        with Image.open(f'{self.media_root}/{thumbnail_path(image.sha256, 300, "webp")}') as thumbnail:
+            self.assertEqual(thumbnail.size, (300, 225))
+        stored = [name for _, _, files in os.walk(self.media_root) for name in files]
+        self.assertEqual(len(stored), 5)
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, image.urls['300']['webp'])
+        self.assertNotContains(response, image.original_url)
+
+    def test_rejects_non_images(self):
+        response = self.client.post(reverse('create_listing'), {
+            'title': 'Fake', 'description': 'Not an image', 'starting_bid': '10.00',
+            'category': self.category.id, 'image_file': SimpleUploadedFile('fake.jpg', b'not an image'),
+        })
+        self.assertFormError(response.context['form'], 'image_file', 'Upload a valid image.')
+
+    def test_backfill_command_dedupes_legacy_files(self):
+        content = make_jpeg('blue', (100, 100))
+        for name in ('a.jpg', 'a_XYZ.jpg'):
+            with open(f'{self.media_root}/{name}', 'wb') as f:
+                f.write(content)
+        listing = make_listing(self.seller, self.category, url='http://example.com/listing_images/a_XYZ.jpg')
+
+        call_command('ingest_listing_images', '--delete-originals', '--workers', '1', stdout=io.StringIO())
+        listing.refresh_from_db()
+        self.assertEqual(StoredImage.objects.count(), 1)
+        self.assertEqual(listing.image, StoredImage.objects.get())
+        self.assertTrue(listing.image.thumbnails_ready)
+        self.assertFalse(os.path.exists(f'{self.media_root}/a.jpg'))
+
+
+# ==================== Search ====================
+@override_settings(AUCTIONS_PAGE_SIZE=2)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.toys = Category.objects.create(name='Toys')
+        cls.books = Category.objects.create(name='Books')
+        cls.train = make_listing(cls.seller, cls.toys, title='Wooden train', description='A toy train set',
+                                 current_bid=Decimal('25.00'))
+        cls.book = make_listing(cls.seller, cls.books, title='Trains of Europe',
+                                description='Railway history book', current_bid=Decimal('8.00'))
+        cls.car = make_listing(cls.seller, cls.toys, title='Toy car', description='Red, with a train sticker',
+                               current_bid=Decimal('300.00'))
+        make_listing(cls.seller, cls.toys, title='Lamp', description='Nothing to see here')
+
+    def api(self, **params):
+        return self.client.get(reverse('search_api'), params).json()
+
+    def ids(self, response):
+        return [result['id'] for result in response['results']]
+
+    def test_ranked_prefix_search_with_pagination(self):
+        response = self.api(q='train')
+        self.assertEqual(response['total'], 3)
+        # Matches in the title outrank matches in the description only.
+        self.assertEqual(set(self.ids(response)), {self.train.id, self.book.id})
+        self.assertTrue(response['has_next'])
+        self.assertEqual(self.ids(self.api(q='train', page=2)), [self.car.id])
+        self.assertEqual(self.ids(self.api(q='wood trai')), [self.train.id])
+
+    def test_facets_and_filters(self):
+        response = self.api(q='train')
+        self.assertEqual({f['name']: f['count'] for f in response['facets']['categories']}, {'Toys': 2, 'Books': 1})
+        self.assertEqual([f['count'] for f in response['facets']['prices']], [1, 1, 0, 1, 0, 0])
+
+        self.assertEqual(set(self.ids(self.api(q='train', category=self.toys.id))), {self.train.id, self.car.id})
+        self.assertEqual(self.ids(self.api(q='train', min_price=10, max_price=50)), [self.train.id])
+
+    def test_price_before_the_first_bid_is_the_starting_bid(self):
+        # As created through the listing form: current_bid stays at its default of 0.00 until the first bid.
+        lamp = Listing.objects.create(title='Brass lantern', description='Old', starting_bid=Decimal('60.00'),
+                                      category=self.toys, creator=self.seller)
+        response = self.api(q='lantern')
+        self.assertEqual([f['count'] for f in response['facets']['prices']], [0, 0, 1, 0, 0, 0])
+        self.assertEqual(self.ids(self.api(q='lantern', min_price=50, max_price=100)), [lamp.id])
+        self.assertEqual(self.api(q='lantern', max_price=10)['total'], 0)
+
+    def test_unsupported_database_disables_search(self):
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+        with mock.patch('auctions.search.connection') as fake_connection, self.assertLogs('auctions.search'):
+            fake_connection.vendor = 'postgresql'
+            backend = get_search_backend()
+        self.assertIsInstance(backend, NullSearchBackend)
+        with mock.patch('auctions.signals.get_search_backend', return_value=backend):
+            self.train.save()
+        self.assertEqual(backend.search(['train'])[1], 0)
+
+    def test_index_follows_edits_and_closing(self):
+        self.train.title = 'Wooden boat'
+        self.train.description = 'Floats'
+        self.train.save()
+        self.assertNotIn(self.train.id, self.ids(self.api(q='train')))
+        self.assertEqual(self.ids(self.api(q='boat')), [self.train.id])
+
+        close_auction(self.train.id, self.seller)
+        self.assertEqual(self.api(q='boat')['total'], 0)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.api(q='train* "(')['total'], 3)
+        self.assertEqual(self.api(q='')['total'], 0)
+
+    def test_out_of_range_parameters_are_not_found(self):
+        for params in ({'page': '99999999999999999999'}, {'page': '1001'}, {'category': '99999999999999999999'},
+                       {'category': '0'}, {'min_price': 'NaN'}, {'max_price': 'Infinity'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('search'), {'q': 'train', **params})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.api(q='train', min_price='1e400')['total'], 0)
+
+    def test_search_page(self):
+        response = self.client.get(reverse('search'), {'q': 'train'})
+        self.assertContains(response, 'Wooden train')
+        self.assertContains(response, 'Toys (2)')
+
+
+# ==================== Scheduled expiry ====================
+class ExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.bidder = User.objects.create(username='bidder')
+        cls.toys = Category.objects.create(name='Toys')
+
+    def test_closes_due_listings_and_keeps_the_winner(self):
+        now = timezone.now()
+        due = [make_listing(self.seller, self.toys, ends_at=now - timedelta(minutes=i)) for i in range(3)]
+        later = make_listing(self.seller, self.toys, ends_at=now + timedelta(hours=1))
+        open_ended = make_listing(self.seller, self.toys)
+        winning = place_bid(due[0].id, self.bidder, Decimal('5.00'))
+        Listing.objects.filter(pk=due[0].pk).update(ends_at=now - timedelta(seconds=1))
+
+        self.assertEqual(expire_due_listings(now=now, batch_size=2), 3)
+        self.assertEqual(set(Listing.objects.filter(is_active=True).values_list('id', flat=True)),
+                         {later.id, open_ended.id})
+        self.assertEqual(Listing.objects.get(pk=due[0].pk).winning_bid, winning)
+        self.assertFalse(Listing.objects.filter(is_active=False, closed_at__isnull=True).exists())
+        self.toys.refresh_from_db()
+        self.assertEqual(self.toys.active_listing_count, 2)
+        self.assertEqual(expire_due_listings(now=now), 0)
+
+    def test_listings_extended_after_the_batch_was_read_stay_open(self):
+        now = timezone.now()
+        listing = make_listing(self.seller, self.toys, ends_at=now - timedelta(seconds=1))
+        close = expiry._close
+
+        def extend_then_close(rows, due_by):
+            Listing.objects.filter(pk=listing.pk).update(ends_at=now + timedelta(hours=1))
+            return close(rows, due_by)
+
+        with mock.patch('auctions.expiry._close', extend_then_close):
+            self.assertEqual(expire_due_listings(now=now), 0)
+        self.assertTrue(Listing.objects.get(pk=listing.pk).is_active)
+
+    def test_no_bids_after_the_end_time(self):
+        listing = make_listing(self.seller, self.toys, ends_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(place_bid(listing.id, self.bidder, Decimal('5.00')))
+
+    def test_command(self):
+        make_listing(self.seller, self.toys, ends_at=timezone.now() - timedelta(seconds=1))
+        out = io.StringIO()
+        call_command('expire_auctions', stdout=out)
+        self.assertIn('Closed 1 expired auction(s).', out.getvalue())
+
+
+@override_settings(AUCTIONS_SOFT_CLOSE_WINDOW=120, AUCTIONS_SOFT_CLOSE_EXTENSION=300)
+class SoftCloseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.bidder = User.objects.create(username='bidder')
+        cls.toys = Category.objects.create(name='Toys')
+
+    def test_late_bid_extends_the_end(self):
+        listing = make_listing(self.seller, self.toys, ends_at=timezone.now() + timedelta(seconds=30))
+        before = timezone.now()
+        place_bid(listing.id, self.bidder, Decimal('5.00'))
+        listing.refresh_from_db()
+        self.assertGreaterEqual(listing.ends_at, before + timedelta(seconds=300))
+        self.assertLessEqual(listing.ends_at, timezone.now() + timedelta(seconds=300))
+
+    def test_early_bid_keeps_the_end(self):
+        ends_at = timezone.now() + timedelta(hours=1)
+        listing = make_listing(self.seller, self.toys, ends_at=ends_at)
+        open_ended = make_listing(self.seller, self.toys)
+        place_bid(listing.id, self.bidder, Decimal('5.00'))
+        place_bid(open_ended.id, self.bidder, Decimal('5.00'))
+        self.assertEqual(Listing.objects.get(pk=listing.pk).ends_at, ends_at)
+        self.assertIsNone(Listing.objects.get(pk=open_ended.pk).ends_at)
+
+    @override_settings(AUCTIONS_SOFT_CLOSE_WINDOW=0)
+    def test_disabled(self):
+        ends_at = timezone.now() + timedelta(seconds=30)
+        listing = make_listing(self.seller, self.toys, ends_at=ends_at)
+        place_bid(listing.id, self.bidder, Decimal('5.00'))
+        self.assertEqual(Listing.objects.get(pk=listing.pk).ends_at, ends_at)
+
+
+class ConcurrentExpiryTests(TransactionTestCase):
+    WORKERS = 4
+
+    def test_each_listing_is_closed_once(self):
+        seller = User.objects.create(username='seller')
+        toys = Category.objects.create(name='Toys')
+        now = timezone.now()
+        for i in range(200):
+            make_listing(seller, toys, ends_at=now - timedelta(seconds=i))
+
+        closed = []
+        errors = []
+        barrier = threading.Barrier(self.WORKERS)
+
+        def worker():
+            try:
+                barrier.wait()
+                closed.append(expire_due_listings(now=now, batch_size=25))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(closed), 200)
+        self.assertFalse(Listing.objects.filter(is_active=True).exists())
+        toys.refresh_from_db()
+        self.assertEqual(toys.active_listing_count, 0)
+
+    @override_settings(AUCTIONS_WRITE_RETRY_BACKOFF=0)
+    def test_locked_batches_are_retried(self):
+        listing = make_listing(User.objects.create(username='seller'), Category.objects.create(name='Toys'),
+                               ends_at=timezone.now() - timedelta(seconds=1))
+        close = expiry._close
+        attempts = []
+
+        def locked_once(rows, now):
+            attempts.append(rows)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return close(rows, now)
+
+        with mock.patch('auctions.expiry._close', locked_once):
+            self.assertEqual(expire_due_listings(), 1)
+        # The locked batch ran again, then one more found nothing left.
+        self.assertEqual(attempts, [[(listing.id, listing.category_id)]] * 2 + [[]])
+        self.assertFalse(Listing.objects.get(pk=listing.pk).is_active)
+
+
+class BidStormCommandTests(TransactionTestCase):
+    def test_closes_only_the_storm_listing(self):
+        seller = User.objects.create(username='seller')
+        other = make_listing(seller, Category.objects.create(name='Toys'),
+                             ends_at=timezone.now() + timedelta(seconds=30))
+        out = io.StringIO()
+        call_command('simulate_bid_storm', '--bidders', '2', '--duration', '0.2', '--window', '0',
+                     '--max-seconds', '60', stdout=out)
+        self.assertTrue(json.loads(out.getvalue())['closed'])
+        other.refresh_from_db()
+        self.assertTrue(other.is_active)
+        self.assertFalse(OutboxEvent.objects.filter(listing=other).exists())
+
+
+# ==================== JSON API ====================
+@override_settings(AUCTIONS_PAGE_SIZE=2)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.bidder = User.objects.create(username='bidder')
+        cls.toys = Category.objects.create(name='Toys')
+        cls.listings = [make_listing(cls.seller, cls.toys, title=f'Item {i}') for i in range(3)]
+        cls.listing = cls.listings[0]
+        for i in range(3):
+            cls.listing.comments.create(commenter=cls.bidder, content=f'Comment {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listings_are_keyset_paginated(self):
+        first = self.client.get(reverse('api_listings')).json()
+        self.assertEqual([row['title'] for row in first['results']], ['Item 2', 'Item 1'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['title'] for row in second['results']], ['Item 0'])
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['results'][0]['category'], {'id': self.toys.id, 'name': 'Toys'})
+
+    def test_unchanged_listing_is_not_modified(self):
+        url = reverse('api_listing', args=[self.listing.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['title'], 'Item 0')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.listing.id, self.bidder, Decimal('42.00'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['winning_bid'], {'amount': '42.00', 'bidder': 'bidder'})
+
+    def test_pages_have_their_own_etags(self):
+        url = reverse('api_listing_comments', args=[self.listing.id])
+        first = self.client.get(url, {'limit': 1})
+        second = self.client.get(first.json()['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        response = self.client.get(first.json()['next'], HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, {'limit': 1}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_bids_comments_and_categories(self):
+        place_bid(self.listing.id, self.bidder, Decimal('5.00'))
+        bids = self.client.get(reverse('api_listing_bids', args=[self.listing.id])).json()
+        self.assertEqual(bids['results'][0]['amount'], '5.00')
+        comments = self.client.get(reverse('api_listing_comments', args=[self.listing.id])).json()
+        self.assertEqual([row['content'] for row in comments['results']], ['Comment 2', 'Comment 1'])
+        self.assertIsNotNone(comments['next'])
+        categories = self.client.get(reverse('api_categories')).json()
+        self.assertEqual(categories['results'], [{'id': self.toys.id, 'name': 'Toys', 'active_listing_count': 3}])
+        self.assertEqual(self.client.get(reverse('api_listing', args=[999999])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('api_listings')).status_code, 405)
+
+
+# ==================== Proxy bidding ====================
+@override_settings(AUCTIONS_BID_INCREMENT='1.00', AUCTIONS_SOFT_CLOSE_WINDOW=0)
+class ProxyBidTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.alice, cls.bob, cls.carol = [User.objects.create(username=name) for name in ('alice', 'bob', 'carol')]
+        cls.toys = Category.objects.create(name='Toys')
+
+    def setUp(self):
+        self.listing = make_listing(self.seller, self.toys)
+
+    def state(self):
+        listing = Listing.objects.select_related('winning_bid__bidder').get(pk=self.listing.pk)
+        return listing.current_bid, listing.winning_bid.bidder.username
+
+    def bids(self):
+        return list(Bid.objects.filter(listing=self.listing).order_by('id').values_list('bidder__username',
+                                                                                      'bid_amount'))
+
+    def test_bidding_war_is_resolved_in_one_step(self):
+        self.assertIsNotNone(place_proxy_bid(self.listing.id, self.alice, Decimal('50.00')))
+        self.assertEqual(self.state(), (Decimal('2.00'), 'alice'))
+
+        place_proxy_bid(self.listing.id, self.bob, Decimal('30.00'))
+        self.assertEqual(self.state(), (Decimal('31.00'), 'alice'))
+        # Instead of 29 alternating increments: bob's last bid and alice's answer.
+        self.assertEqual(self.bids(), [('alice', Decimal('2.00')), ('bob', Decimal('30.00')),
+                                       ('alice', Decimal('31.00'))])
+
+        place_proxy_bid(self.listing.id, self.carol, Decimal('80.00'))
+        self.assertEqual(self.state(), (Decimal('51.00'), 'carol'))
+        self.assertEqual(Bid.objects.filter(listing=self.listing, is_winning=True).count(), 1)
+
+    def test_ties_go_to_the_earlier_maximum(self):
+        place_proxy_bid(self.listing.id, self.alice, Decimal('40.00'))
+        place_proxy_bid(self.listing.id, self.bob, Decimal('40.00'))
+        self.assertEqual(self.state(), (Decimal('40.00'), 'alice'))
+
+    def test_direct_bids_are_answered_by_proxies(self):
+        place_proxy_bid(self.listing.id, self.alice, Decimal('20.00'))
+        bid = place_bid(self.listing.id, self.bob, Decimal('10.00'))
+        self.assertFalse(bid.is_winning)
+        self.assertEqual(self.state(), (Decimal('11.00'), 'alice'))
+        place_bid(self.listing.id, self.bob, Decimal('25.00'))
+        self.assertEqual(self.state(), (Decimal('25.00'), 'bob'))
+
+    def test_invalid_maximums_are_rejected(self):
+        place_bid(self.listing.id, self.bob, Decimal('10.00'))
+        self.assertIsNone(place_proxy_bid(self.listing.id, self.alice, Decimal('10.00')))
+        self.assertIsNotNone(place_proxy_bid(self.listing.id, self.alice, Decimal('15.00')))
+        self.assertIsNone(place_proxy_bid(self.listing.id, self.alice, Decimal('12.00')))
+        # The leader may raise their own maximum without bidding against themselves.
+        self.assertIsNotNone(place_proxy_bid(self.listing.id, self.alice, Decimal('30.00')))
+        self.assertEqual(self.state(), (Decimal('11.00'), 'alice'))
+
+    def test_opening_bid_respects_the_starting_bid(self):
+        # As created through the listing form: current_bid keeps its default of 0.00 until the first bid.
+        listing = Listing.objects.create(title='Lamp', description='Brass', starting_bid=Decimal('10.00'),
+                                         category=self.toys, creator=self.seller)
+        self.assertIsNone(place_proxy_bid(listing.id, self.alice, Decimal('9.00')))
+        self.assertIsNotNone(place_proxy_bid(listing.id, self.alice, Decimal('50.00')))
+        listing.refresh_from_db()
+        self.assertEqual((listing.current_bid, listing.winning_bid.bid_amount), (Decimal('10.00'), Decimal('10.00')))
+        # A real bid above the starting bid is still accepted and answered by the proxy.
+        self.assertIsNotNone(place_bid(listing.id, self.bob, Decimal('15.00')))
+        listing.refresh_from_db()
+        self.assertEqual((listing.current_bid, listing.winning_bid.bidder_id), (Decimal('16.00'), self.alice.id))
+
+
+# ==================== Async read views ====================
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.toys = Category.objects.create(name='Toys')
+        cls.listing = make_listing(cls.seller, cls.toys, title='Wooden train')
+        cls.listing.comments.create(commenter=cls.seller, content='Still boxed')
+        Watchlist.add_listing(cls.seller, cls.listing.id)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_asgi_requests_use_the_async_views(self):
+        response = await self.async_client.get(reverse('index'))
+        self.assertIs(response.resolver_match.func, async_views.index)
+        self.assertContains(response, 'Wooden train')
+
+        response = await self.async_client.get(reverse('category_list'))
+        self.assertContains(response, 'Toys (1)')
+        response = await self.async_client.get(reverse('category_detail', args=[self.toys.id]))
+        self.assertContains(response, 'Wooden train')
+        self.assertEqual((await self.async_client.get(reverse('category_detail', args=[999]))).status_code, 404)
+
+    async def test_listing_detail_and_watchlist_for_a_user(self):
+        await self.async_client.aforce_login(self.seller)
+        response = await self.async_client.get(reverse('listing_detail', args=[self.listing.id]))
+        self.assertContains(response, 'Still boxed')
+        self.assertContains(response, 'Remove from Watchlist')
+        self.assertContains(response, 'You signed in as <strong>seller</strong>', html=False)
+
+        response = await self.async_client.get(reverse('watchlist'))
+        self.assertIs(response.resolver_match.func, async_views.watchlist)
+        self.assertContains(response, 'Wooden train')
+
+    async def test_listing_detail_loads_the_comments_when_their_fragment_is_rendered(self):
+        url = reverse('listing_detail', args=[self.listing.id])
+        self.assertContains(await self.async_client.get(url), 'Still boxed')
+        # The comments fragment expires while the rest of the page is still cached.
+        version = listing_version((await Listing.objects.aget(pk=self.listing.pk)).modified_at)
+        self.assertTrue(await cache.adelete(make_template_fragment_key('listing_comments', [self.listing.id, version])))
+        self.assertContains(await self.async_client.get(url), 'Still boxed')
+        self.assertContains(await self.async_client.get(url), 'Still boxed')
+
+    async def test_watchlist_redirects_anonymous_users_to_login(self):
+        response = await self.async_client.get(reverse('watchlist'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith('?next=/watchlist/'))
+        sync_response = await sync_to_async(self.client.get)(reverse('watchlist'))
+        self.assertEqual(response['Location'], sync_response['Location'])
+
+    def test_wsgi_requests_keep_the_sync_views(self):
+        response = self.client.get(reverse('index'))
+        self.assertIsNot(response.resolver_match.func, async_views.index)
+
+
+# ==================== SQLite tuning ====================
+class SQLiteTuningTests(TransactionTestCase):
+    @override_settings(AUCTIONS_SQLITE_PRAGMAS={'synchronous': 'NORMAL', 'cache_size': -8000})
+    def test_pragmas_are_applied_to_new_connections(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -8000)
+        connection.close()
+
+    @override_settings(AUCTIONS_WRITE_RETRIES=2, AUCTIONS_WRITE_RETRY_BACKOFF=0)
+    def test_locked_writes_are_retried(self):
+        calls = []
+
+        @write_transaction
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(flaky(), 'done')
+        self.assertEqual(len(calls), 3)
+
+        calls.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            # Inside an outer transaction there is nothing to retry.
+            flaky()
+        self.assertEqual(len(calls), 1)
+
+
+# ==================== Read replicas ====================
+@override_settings(AUCTIONS_READ_REPLICAS=['replica'], AUCTIONS_REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller')
+        cls.bidder = User.objects.create(username='bidder')
+        cls.listing = make_listing(cls.seller, Category.objects.create(name='Toys'))
+
+    def route(self, request):
+        # Where the view behind the middleware would read listings from.
+        seen = []
+
+        def view(request):
+            seen.append(ReplicaRouter().db_for_read(Listing))
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(pin_to_primary(view))(request)
+        return seen[0], response
+
+    def test_reads_go_to_replicas_and_writes_to_the_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Listing), 'default')
+        self.assertIsNone(router.db_for_read(User))
+        # TestCase wraps every test in a transaction on the primary, which keeps reads there.
+        self.assertEqual(router.db_for_read(Listing), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Listing), 'replica')
+
+    def test_writers_are_pinned_to_the_primary(self):
+        factory = RequestFactory()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(self.route(factory.get('/'))[0], 'replica')
+            db, response = self.route(factory.post('/'))
+            self.assertEqual(db, 'default')
+            self.assertIn(PIN_COOKIE, response.cookies)
+
+            pinned = factory.get('/')
+            pinned.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+            self.assertEqual(self.route(pinned)[0], 'default')
+            expired = factory.get('/')
+            expired.COOKIES[PIN_COOKIE] = '0'
+            self.assertEqual(self.route(expired)[0], 'replica')
+
+    def test_bid_view_sets_the_pin(self):
+        self.client.force_login(self.bidder)
+        response = self.client.post(reverse('bid', args=[self.listing.id]), {'bid_amount': '5.00'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_close_view_sets_the_pin(self):
+        self.client.force_login(self.seller)
+        response = self.client.post(reverse('close_listing', args=[self.listing.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+# ==================== Write-behind comments ====================
+@override_settings(AUCTIONS_COMMENT_BATCH_SIZE=3)
+class CommentBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.listing = make_listing(cls.seller, Category.objects.create(name='Toys'))
+
+    def setUp(self):
+        cache.clear()
+        # Batches are only written when full or flushed explicitly here, not by the background thread.
+        patcher = mock.patch.object(comments, '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(comments.flush_comments)
+        self.client.force_login(self.bidder)
+
+    def post_comment(self, data):
+        return self.client.post(reverse('add_comment', args=[self.listing.id]), data)
+
+    def test_comments_are_written_in_batches(self):
+        self.post_comment({'content': 'First'})
+        self.post_comment({'content': 'Second'})
+        self.assertFalse(Comment.objects.exists())
+        # The third comment fills the batch: one INSERT for all of them.
+        with CaptureQueriesContext(connection) as queries:
+            self.post_comment({'content': 'Third'})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "auctions_comment"')]), 1)
+        self.assertEqual(
+            list(Comment.objects.order_by('id').values_list('content', flat=True)), ['First', 'Second', 'Third']
+        )
+        self.assertEqual(comments.pending_comments(self.listing.id, self.bidder), [])
+
+    def test_author_sees_pending_comments(self):
+        self.post_comment({'content': 'Not written yet'})
+        url = reverse('listing_detail', args=[self.listing.id])
+        self.assertContains(self.client.get(url), 'Not written yet')
+        self.client.force_login(self.seller)
+        self.assertNotContains(self.client.get(url), 'Not written yet')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(comments.flush_comments(), 1)
+        self.assertContains(self.client.get(url), 'Not written yet', count=1)
+
+    def test_invalid_comments_are_rejected(self):
+        for data in ({}, {'content': '   '}, {'content': 'x' * 301}):
+            self.assertEqual(self.post_comment(data).status_code, 302)
+        self.assertEqual(comments.pending_comments(self.listing.id, self.bidder), [])
+
+
+class CommentFlusherTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('bidder', password='pass')
+        category = Category.objects.create(name='Toys')
+        self.listing = make_listing(self.user, category)
+        self.gone = make_listing(self.user, category)
+
+    @override_settings(AUCTIONS_COMMENT_BATCH_SIZE=10, AUCTIONS_COMMENT_FLUSH_INTERVAL=0.05)
+    def test_background_flush(self):
+        comments.queue_comment(Comment(listing=self.listing, commenter=self.user, content='Later'))
+        for _ in range(100):
+            if Comment.objects.exists():
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(list(Comment.objects.values_list('content', flat=True)), ['Later'])
+
+    @override_settings(AUCTIONS_COMMENT_BATCH_SIZE=10)
+    def test_failed_comments_dont_block_the_batch(self):
+        with mock.patch.object(comments, '_start_flusher'):
+            comments.queue_comment(Comment(listing=self.listing, commenter=self.user, content='Kept'))
+            comments.queue_comment(Comment(listing_id=self.gone.id, commenter=self.user, content='Dropped'))
+        Listing.objects.filter(pk=self.gone.id).delete()
+        with self.assertLogs('auctions.comments', 'ERROR'):
+            self.assertEqual(comments.flush_comments(), 2)
+        self.assertEqual(list(Comment.objects.values_list('content', flat=True)), ['Kept'])
+
+
+# ==================== Sessions and messages ====================
+class SessionProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bidder', password='pass')
+        cls.listing = make_listing(cls.user, Category.objects.create(name='Toys'), title='Teddy bear')
+
+    def remove_and_show(self):
+        # A new client: SessionMiddleware picks its session engine when the client's handler is first set up.
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+        Watchlist.add_listing(self.user, self.listing.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('remove_from_watchlist', args=[self.listing.id]))
+            response = self.client.get(reverse('watchlist'))
+        self.assertContains(response, 'Listing &quot;Teddy bear&quot; removed from your watchlist.')
+        return [query['sql'] for query in queries if 'django_session' in query['sql']]
+
+    def test_db_profile_keeps_messages_in_the_session(self):
+        self.assertTrue(self.remove_and_show())
+
+    def test_cache_profiles_skip_the_session_table(self):
+        caches = {'default': settings.CACHES['default'],
+                  'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'}}
+        for name in ('cached_db', 'cache', 'signed_cookies'):
+            with self.subTest(profile=name), override_settings(CACHES=caches,
+                                                               **settings.AUCTIONS_SESSION_PROFILES[name]):
+                self.assertEqual(self.remove_and_show(), [])
+
+    def test_clear_expired_sessions(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='current', session_data='', expire_date=now + timedelta(days=1))
+        out = io.StringIO()
+        call_command('clear_expired_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired session(s).', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+
+
+# ==================== Results exports ====================
+class ResultsExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass')
+        cls.bidder = User.objects.create_user('bidder', password='pass')
+        cls.staff = User.objects.create_user('finance', password='pass', is_staff=True)
+        category = Category.objects.create(name='Toys')
+        cls.sold = make_listing(cls.seller, category, title='Sold')
+        cls.unsold = make_listing(cls.seller, category, title='Unsold')
+        cls.open = make_listing(cls.seller, category, title='Open')
+        place_bid(cls.sold.id, cls.seller, Decimal('2.00'))
+        cls.winning_bid = place_bid(cls.sold.id, cls.bidder, Decimal('3.00'))
+        place_bid(cls.open.id, cls.bidder, Decimal('5.00'))
+        close_auction(cls.sold.id, cls.seller)
+        close_auction(cls.unsold.id, cls.seller)
+        cls.today = timezone.localdate()
+
+    def export(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('results_export'), {'date': self.today.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_bid(self):
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual([(row['title'], row['bid_amount'], row['is_winning']) for row in rows], [
+            ('Sold', '2.00', 'False'), ('Sold', '3.00', 'True'), ('Unsold', '', ''),
+        ])
+        self.assertEqual(rows[1]['winner'], 'bidder')
+        self.assertEqual(rows[1]['final_price'], '3.00')
+        self.assertEqual(rows[1]['winning_bid_id'], str(self.winning_bid.id))
+
+    def test_jsonl_and_keyset_batches(self):
+        lines = [json.loads(line) for line in self.export(format='jsonl').splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertIsNone(lines[2]['bid_id'])
+        start, end = exports.day_range(self.today)
+        # One listing per batch and one bid per fetch give the same rows.
+        self.assertEqual(list(exports.export_rows(start, end, batch_size=1, chunk_size=1)),
+                         list(exports.export_rows(start, end)))
+        self.assertEqual(self.export(date=(self.today - timedelta(days=1)).isoformat()).count('\n'), 1)
+
+    def test_staff_only(self):
+        self.client.force_login(self.bidder)
+        response = self.client.get(reverse('results_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        out = io.StringIO()
+        with mock.patch('sys.stdout', out):
+            call_command('export_results', date=self.today.isoformat(), format='jsonl')
+        self.assertEqual([json.loads(line)['title'] for line in out.getvalue().splitlines()],
+                         ['Sold', 'Sold', 'Unsold'])
+
+
+# ==================== Notifications ====================
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com')
+        cls.first = User.objects.create_user('first', 'first@example.com')
+        cls.second = User.objects.create_user('second', 'second@example.com')
+        cls.listing = make_listing(cls.seller, Category.objects.create(name='Toys'), title='Lamp')
+        cls.watchers = [User.objects.create_user(f'watcher{i}', f'watcher{i}@example.com') for i in range(50)]
+        for user in cls.watchers + [cls.first, cls.second]:
+            Watchlist.add_listing(user, cls.listing.id)
+
+    def recipients(self):
+        return {message.to[0].split('@')[0]: message.subject for message in mail.outbox}
+
+    def test_outbid(self):
+        place_bid(self.listing.id, self.first, Decimal('2.00'))
+        place_bid(self.listing.id, self.first, Decimal('3.00'))
+        self.assertFalse(OutboxEvent.objects.exists())
+        place_bid(self.listing.id, self.second, Decimal('4.00'))
+        # Events, watchers, delete, and the check for more events, however many watchers there are.
+        with self.assertNumQueries(4):
+            self.assertEqual(notifications.dispatch_notifications(), 1)
+        recipients = self.recipients()
+        self.assertEqual(recipients.pop('first'), 'You have been outbid on "Lamp"')
+        self.assertEqual(set(recipients), {user.username for user in self.watchers})
+        self.assertEqual(recipients['watcher0'], 'New high bid on "Lamp"')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_one_notification_per_recipient_and_listing(self):
+        for amount, bidder in enumerate([self.first, self.second] * 5 + [self.first], start=2):
+            place_bid(self.listing.id, bidder, Decimal(amount))
+        self.assertEqual(OutboxEvent.objects.count(), 10)
+        with self.assertNumQueries(4):
+            self.assertEqual(notifications.dispatch_notifications(), 10)
+        self.assertEqual(len(mail.outbox), 51)
+        recipients = self.recipients()
+        # first leads again, second was outbid by the last bid, and the watchers hear about that bid only.
+        self.assertNotIn('first', recipients)
+        self.assertEqual(recipients['second'], 'You have been outbid on "Lamp"')
+        self.assertIn('first bid $12.00', mail.outbox[-1].body)
+
+    def test_closed(self):
+        place_bid(self.listing.id, self.second, Decimal('4.00'))
+        close_auction(self.listing.id, self.seller)
+        notifications.dispatch_notifications()
+        recipients = self.recipients()
+        self.assertEqual(recipients['second'], 'You won "Lamp"')
+        self.assertEqual(recipients['seller'], 'Your auction "Lamp" has ended')
+        self.assertEqual(recipients['first'], 'Auction ended: "Lamp"')
+        self.assertEqual(len(mail.outbox), 53)
+        self.assertIn('won by second for $4.00', mail.outbox[-1].body)
+
+    @override_settings(AUCTIONS_NOTIFICATION_SEND_BATCH=7)
+    def test_failed_delivery_keeps_the_event(self):
+        close_auction(self.listing.id, self.seller)
+        with mock.patch.object(notifications.EmailSink, 'deliver', side_effect=OSError):
+            with self.assertRaises(OSError):
+                notifications.dispatch_notifications()
+        self.assertTrue(OutboxEvent.objects.exists())
+        notifications.dispatch_notifications()
+        self.assertEqual(len(mail.outbox), 53)
+
+
+# ==================== Archive ====================
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller')
+        cls.bidder = User.objects.create_user('bidder')
+        toys = Category.objects.create(name='Toys')
+        cls.old = make_listing(cls.seller, toys, title='Old lamp')
+        cls.recent = make_listing(cls.seller, toys, title='Recent lamp')
+        cls.active = make_listing(cls.seller, toys, title='Active lamp')
+        for listing in (cls.old, cls.recent, cls.active):
+            place_bid(listing.id, cls.bidder, Decimal('5.00'))
+            listing.comments.create(commenter=cls.bidder, content=f'Nice {listing.title}')
+        place_proxy_bid(cls.old.id, cls.bidder, Decimal('9.00'))
+        Watchlist.add_listing(cls.bidder, cls.old.id)
+        close_auction(cls.old.id, cls.seller)
+        close_auction(cls.recent.id, cls.seller)
+        Listing.objects.filter(pk=cls.old.pk).update(closed_at=timezone.now() - timedelta(days=100))
+        OutboxEvent.objects.all().delete()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_moves_long_closed_listings_with_their_bids_and_comments(self):
+        bid = self.old.bids.get()
+        self.assertEqual(archive.archive_closed_listings(), 1)
+
+        self.assertFalse(Listing.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(Bid.objects.filter(listing_id=self.old.pk).exists())
+        self.assertFalse(ProxyBid.objects.filter(listing_id=self.old.pk).exists())
+        self.assertFalse(Watchlist.is_watching(self.bidder, [self.old.id]))
+        archived = ArchivedListing.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.winning_bid_id, bid.id)
+        self.assertEqual(ArchivedBid.objects.get().bid_amount, Decimal('5.00'))
+        self.assertEqual(ArchivedComment.objects.get().content, 'Nice Old lamp')
+        self.assertEqual(set(Listing.objects.values_list('title', flat=True)), {'Recent lamp', 'Active lamp'})
+        self.assertEqual(Bid.objects.count(), 2)
+        self.assertEqual(archive.archive_closed_listings(), 0)
+
+    def test_waits_for_pending_notifications(self):
+        OutboxEvent.objects.create(kind=OutboxEvent.CLOSED, listing=self.old)
+        self.assertEqual(archive.archive_closed_listings(), 0)
+        OutboxEvent.objects.all().delete()
+        self.assertEqual(archive.archive_closed_listings(), 1)
+
+    def test_bounded_batches(self):
+        Listing.objects.filter(pk=self.recent.pk).update(closed_at=timezone.now() - timedelta(days=95))
+        self.assertEqual(archive.archive_closed_listings(batch_size=1, max_batches=1), 1)
+        # Oldest first.
+        self.assertTrue(ArchivedListing.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(archive.archive_closed_listings(batch_size=1), 1)
+
+    def test_detail_page_reads_through_to_the_archive(self):
+        archive.archive_closed_listings()
+        url = reverse('listing_detail', args=[self.old.id])
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'auctions/archived_listing.html')
+        self.assertContains(response, 'Winner: bidder with $5.00')
+        self.assertContains(response, 'Nice Old lamp')
+        # The body is cached: only the listing lookups run.
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(url), 'Nice Old lamp')
+        self.assertEqual(self.client.get(reverse('listing_detail', args=[999])).status_code, 404)
+
+    async def test_async_detail_page_reads_through_to_the_archive(self):
+        await sync_to_async(archive.archive_closed_listings)()
+        response = await self.async_client.get(reverse('listing_detail', args=[self.old.id]))
+        self.assertIs(response.resolver_match.func, async_views.listing_detail)
+        self.assertContains(response, 'Nice Old lamp')
+        self.assertEqual((await self.async_client.get(reverse('listing_detail', args=[999]))).status_code, 404)
+
+    def test_command_report(self):
+        out = io.StringIO()
+        call_command('archive_listings', '--report', '--samples', '1', stdout=out)
+        output = out.getvalue()
+        report = json.loads(output[:output.rindex('}') + 1])
+        self.assertEqual(report['archived'], 1)
+        self.assertEqual(report['before']['tables']['auctions_listing']['rows'], 3)
+        self.assertEqual(report['after']['tables']['auctions_archivedlisting']['rows'], 1)
+        self.assertIn('listing_top_bid', report['after']['latency_ms'])
+        self.assertIn('Archived 1 listing(s) closed more than 90 day(s) ago.', output)
+
+
+# ==================== Admin ====================
+@override_settings(AUCTIONS_EXACT_COUNT_LIMIT=3)
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.bidder = User.objects.create_user('bidder')
+        cls.toys = Category.objects.create(name='Toys')
+        cls.listings = [make_listing(cls.admin, cls.toys, title=f'Lamp {i}') for i in range(5)]
+        for listing in cls.listings:
+            place_bid(listing.id, cls.bidder, Decimal('5.00'))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_estimated_count(self):
+        self.assertEqual(EstimatedCountPaginator(Listing.objects.filter(title='Lamp 1').order_by('id'), 2).count, 1)
+        # Past the limit, an unfiltered table is estimated (here from its id range), a filtered one reports the limit.
+        self.assertEqual(EstimatedCountPaginator(Listing.objects.order_by('id'), 2).count, 5)
+        self.assertEqual(EstimatedCountPaginator(Listing.objects.filter(is_active=True).order_by('id'), 2).count, 3)
+
+    def test_changelists_query_count_does_not_grow_with_rows(self):
+        for model in ('listing', 'bid', 'comment'):
+            with self.subTest(model=model):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse(f'admin:auctions_{model}_changelist'))
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), 8)
+                self.assertFalse(any(
+                    query['sql'].startswith('SELECT COUNT(*) AS') for query in queries.captured_queries
+                ))
+        response = self.client.get(reverse('admin:auctions_bid_changelist'), {'is_winning__exact': '1'})
+        self.assertContains(response, 'Lamp 4')
+
+    def test_change_form_uses_raw_ids(self):
+        bid = Bid.objects.first()
+        response = self.client.get(reverse('admin:auctions_bid_change', args=[bid.id]))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertNotContains(response, '<option value="%d"' % self.listings[1].id)
+
+    def test_listing_search_is_by_id(self):
+        url = reverse('admin:auctions_listing_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'q': str(self.listings[2].id)})
+        self.assertContains(response, 'Lamp 2')
+        self.assertNotContains(response, 'Lamp 3')
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+        self.assertNotContains(self.client.get(url, {'q': 'Lamp'}), 'Lamp 2')
+
+    def test_close_and_reopen_actions(self):
+        url = reverse('admin:auctions_listing_changelist')
+        selected = [listing.id for listing in self.listings[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'action': 'close_selected', '_selected_action': selected})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "auctions_listing"') for query in queries), 1)
+        self.assertEqual(Listing.objects.filter(is_active=False).count(), 3)
+        self.assertEqual(Category.objects.get(pk=self.toys.pk).active_listing_count, 2)
+        self.assertEqual(OutboxEvent.objects.filter(kind=OutboxEvent.CLOSED).count(), 3)
+        self.assertEqual(self.client.get(reverse('search_api'), {'q': 'lamp'}).json()['total'], 2)
+
+        # Closing again changes nothing.
+        self.client.post(url, {'action': 'close_selected', '_selected_action': selected})
+        self.assertEqual(OutboxEvent.objects.filter(kind=OutboxEvent.CLOSED).count(), 3)
+
+        Listing.objects.filter(pk=selected[0]).update(ends_at=timezone.now() - timedelta(hours=1))
+        self.client.post(url, {'action': 'reopen_selected', '_selected_action': selected + [self.listings[4].id]})
+        self.assertFalse(Listing.objects.filter(is_active=False).exists())
+        self.assertFalse(Listing.objects.filter(closed_at__isnull=False).exists())
+        self.assertIsNone(Listing.objects.get(pk=selected[0]).ends_at)
+        self.assertEqual(Category.objects.get(pk=self.toys.pk).active_listing_count, 5)
+        self.assertEqual(self.client.get(reverse('search_api'), {'q': 'lamp'}).json()['total'], 5)
+
+        # Only the rows an action changed are counted.
+        self.assertEqual(reopen_listings(Listing.objects.all()), 0)
+        self.assertEqual(close_listings(Listing.objects.filter(pk__in=selected[:2])), 2)
+        self.assertEqual(Category.objects.get(pk=self.toys.pk).active_listing_count, 3)
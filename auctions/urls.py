@@ -1,4 +1,5 @@
 from django.urls import path
+from . import api, exports
 from .views import (
     index,
     create_listing,
@@ -8,12 +9,17 @@ from .views import (
     category_list,
     category_detail,
     bid,
+    proxy_bid,
     close_listing,
     add_comment,
     login_view,
     logout_view,
     register,
     remove_from_watchlist,
+    listing_events,
+    instrumentation,
+    search,
+    search_api,
 )
 
 urlpatterns = [
@@ -29,9 +35,20 @@ urlpatterns = [
     path('add_comment/<int:listing_id>/', add_comment, name='add_comment'),
     path('listing/<int:listing_id>/', listing_detail, name='listing_detail'),  # Moved to the end
     path('listing/<int:listing_id>/bid/', bid, name='bid'),
+    path('listing/<int:listing_id>/events/', listing_events, name='listing_events'),
     path('bid/<int:listing_id>/', bid, name='bid'),
+    path('listing/<int:listing_id>/proxy_bid/', proxy_bid, name='proxy_bid'),
     path('close_listing/', close_listing, name='close_listing'),
     path('close_listing/<int:listing_id>/', close_listing, name='close_listing'),
     path('remove_from_watchlist/<int:listing_id>/', remove_from_watchlist, name='remove_from_watchlist'),
+    path('instrumentation/', instrumentation, name='instrumentation'),
+    path('search/', search, name='search'),
+    path('api/search/', search_api, name='search_api'),
+    path('api/listings/', api.listings, name='api_listings'),
+    path('api/listings/<int:listing_id>/', api.listing, name='api_listing'),
+    path('api/listings/<int:listing_id>/bids/', api.listing_bids, name='api_listing_bids'),
+    path('api/listings/<int:listing_id>/comments/', api.listing_comments, name='api_listing_comments'),
+    path('api/categories/', api.categories, name='api_categories'),
+    path('exports/results/', exports.results_export, name='results_export'),
 ]
 
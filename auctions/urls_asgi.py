@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# The routes of auctions/urls.py, with the async versions of the read-only pages (used by commerce/urls_asgi.py).
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'category_list': async_views.category_list,
+    'category_detail': async_views.category_detail,
+    'listing_detail': async_views.listing_detail,
+    'watchlist': async_views.watchlist,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -4,27 +4,50 @@ from django.contrib.auth import authenticate, login, logout
 from django.db import IntegrityError
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden
 from django.urls import reverse
+from django.utils import timezone
+from django.conf import settings
 from .models import User
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
+from django.contrib.admin.views.decorators import staff_member_required
 from .models import Listing, Bid, Comment, Category,Watchlist
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import Http404
-from .forms import ListingForm, BidForm  # need to create a BidForm to handle bid input
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+import asyncio
+from decimal import Decimal
+from .forms import ListingForm, BidForm, CommentForm, ProxyBidForm  # need to create a BidForm to handle bid input
 from django.db import transaction
 import logging
-from django.db.models import Max
 from .forms import YourBidForm  # Replace with the actual name of your bid form
+from .archive import get_archived_listing
+from .caching import get_fragment_timeout, listing_version
+from .comments import pending_comments, queue_comment
+from . import instrumentation as request_metrics
+from .events import channel_name, format_sse, get_broker, publish_listing_event
+from .pagination import get_page_size, keyset_page
+from .search import get_backend as get_search_backend, parse_terms
+from .routers import pin_to_primary
+from .services import close_auction, place_bid, place_proxy_bid
 # -----------------------------------------------------------
 # def index(request):
 #     return render(request, "auctions/index.html")
 
 
 def index(request):
-    active_listings = Listing.objects.filter(is_active=True)
-    return render(request, 'auctions/index.html', {'active_listings': active_listings})
+    # One page of active listings, newest first. category and creator are rendered on every card,
+    # so they are joined in the same query instead of being fetched per listing.
+    active_listings, next_cursor = keyset_page(
+        Listing.objects.filter(is_active=True).select_related('category', 'creator', 'image'),
+        request.GET.get('cursor'),
+    )
+    return render(request, 'auctions/index.html', {
+        'active_listings': active_listings,
+        'next_cursor': next_cursor,
+        'watched_ids': Watchlist.is_watching(request.user, [listing.id for listing in active_listings]),
+    })
 
 # ====================================================================
+@pin_to_primary
 def create_listing(request):
     if request.method == 'POST':
         form = ListingForm(request.POST, request.FILES)  # Include request.FILES to handle image uploads
@@ -42,14 +65,19 @@ def create_listing(request):
 
 # =====================================================================================
 def category_list(request):
-    categories = Category.objects.annotate(num_listings=Count('listings')).filter(num_listings__gt=0)
+    # The counts are maintained on the category rows, so this never touches the listings table.
+    categories = Category.objects.filter(active_listing_count__gt=0)
     return render(request, 'auctions/category_list.html', {'categories': categories})
 
 
 def category_detail(request, category_id):
     category = get_object_or_404(Category, pk=category_id)
-    active_listings = category.listings.filter(is_active=True)
-    return render(request, 'auctions/category_detail.html', {'category': category, 'active_listings': active_listings})
+    active_listings, next_cursor = keyset_page(category.listings.filter(is_active=True), request.GET.get('cursor'))
+    return render(request, 'auctions/category_detail.html', {
+        'category': category,
+        'active_listings': active_listings,
+        'next_cursor': next_cursor,
+    })
 
 # ==========================bid, close_listing, add_comment: =================================
 # need to create the corresponding templates (close_listing.html for the close_listing view)
@@ -58,6 +86,7 @@ def category_detail(request, category_id):
 # Validates the bid amount and updates the current bid if the new bid is higher
 # ==========================================================================
 
+@pin_to_primary
 @login_required
 def bid(request, listing_id):
     listing = get_object_or_404(Listing, pk=listing_id, is_active=True)
@@ -69,12 +98,12 @@ def bid(request, listing_id):
             bid_amount = form.cleaned_data['bid_amount']
 
             if listing.current_bid is not None and bid_amount is not None:
-                if bid_amount > listing.current_bid:
-                    Bid.objects.create(listing=listing, bidder=request.user, bid_amount=bid_amount)
-                    listing.current_bid = bid_amount
-                    listing.save()
-
+                # The comparison with the current bid and the end time, and the soft-close extension of the end
+                # time, are done by the database, atomically with the write.
+                if place_bid(listing.id, request.user, bid_amount) is not None:
                     return redirect('listing_detail', listing_id=listing_id)
+                elif listing.ends_at is not None and listing.ends_at <= timezone.now():
+                    return HttpResponseForbidden("This auction has ended.")
                 else:
                     return HttpResponseForbidden("Your bid must be higher than the current bid.")
             else:
@@ -88,37 +117,56 @@ def bid(request, listing_id):
 
     return render(request, 'auctions/place_bid.html', {'form': form, 'listing': listing})
 
+# ======================== proxy_bid ======================================
+# Sets the user's maximum bid; the system then bids for them (auctions.services.place_proxy_bid).
+@pin_to_primary
+@login_required
+def proxy_bid(request, listing_id):
+    if request.method != 'POST':
+        return redirect('listing_detail', listing_id=listing_id)
+    form = ProxyBidForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseForbidden("Invalid maximum bid.")
+    if place_proxy_bid(listing_id, request.user, form.cleaned_data['max_amount']) is None:
+        return HttpResponseForbidden(
+            "Your maximum must be higher than the current bid and your previous maximum, and the auction must be open."
+        )
+    return redirect('listing_detail', listing_id=listing_id)
+
 # ======================== close_listing ======================================
+@pin_to_primary
 @login_required
 def close_listing(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id, creator=request.user, is_active=True)
-
-    # Get the highest bid for the listing
-    winning_bid = Bid.objects.filter(listing=listing).aggregate(Max('bid_amount'))['bid_amount__max']
-
-    if winning_bid is not None:
-        # Get the bid object for the winning bid
-        winning_bid_obj = Bid.objects.get(listing=listing, bid_amount=winning_bid)
-    else:
-        winning_bid_obj = None
-
     if request.method == 'POST':
-        with transaction.atomic():
-            listing.is_active = False
-            listing.save()
-            return redirect('listing_detail', listing_id=listing_id)
+        closed, winning_bid = close_auction(listing_id, request.user)
+        if not closed:
+            raise Http404("No active listing of yours with this id.")
+        return redirect('listing_detail', listing_id=listing_id)
 
-    return render(request, 'auctions/close_listing.html', {'listing': listing, 'winning_bid': winning_bid_obj})
+    # The current highest bid is denormalized on the listing, so this is one joined primary-key lookup.
+    listing = get_object_or_404(
+        Listing.objects.select_related('winning_bid__bidder'), pk=listing_id, creator=request.user, is_active=True
+    )
+    return render(request, 'auctions/close_listing.html', {'listing': listing, 'winning_bid': listing.winning_bid})
 
 # ====================== add_comment ====================================
 
+@pin_to_primary
 @login_required
 def add_comment(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing.objects.only('id'), pk=listing_id)
     if request.method == 'POST':
-        content = request.POST.get('content')
-        commenter = request.user
-        Comment.objects.create(listing=listing, commenter=commenter, content=content)
+        form = CommentForm(request.POST)
+        if form.is_valid():
+            commenter = request.user
+            # Written in batches by auctions/comments.py; the author sees it on the listing page until then.
+            comment = Comment(listing=listing, commenter=commenter, content=form.cleaned_data['content'],
+                              created_at=timezone.now())
+            queue_comment(comment)
+            publish_listing_event(listing.id, 'comment', content=comment.content, commenter=commenter.username,
+                                  created_at=comment.created_at.isoformat())
+        else:
+            messages.error(request, 'Comments must be between 1 and 300 characters long.')
     return redirect('listing_detail', listing_id=listing.id)
 # ====================Login and register============================
 
@@ -177,29 +225,28 @@ def register(request):
 @login_required
 def watchlist(request):
     if request.user.is_authenticated:
-        watchlist_items = Watchlist.objects.get_or_create(user=request.user)[0].listings.all()
+        watchlist_items = Watchlist.objects.get_or_create(user=request.user)[0].listings.select_related('image')
         return render(request, 'auctions/watchlist.html', {'watchlist_items': watchlist_items})
     else:
         return render(request, 'auctions/login_required.html')
 # ====================================================================
+@pin_to_primary
 @login_required
 def add_to_watchlist(request, listing_id):
     if request.user.is_authenticated:
-        listing = get_object_or_404(Listing, pk=listing_id)
-        watchlist = Watchlist.objects.get_or_create(user=request.user)[0]
-        watchlist.listings.add(listing)
+        listing = get_object_or_404(Listing.objects.only('id'), pk=listing_id)
+        Watchlist.add_listing(request.user, listing.id)
         return redirect('watchlist')
     else:
         return render(request, 'auctions/login_required.html')
 
 # ====================================================================
+@pin_to_primary
 @login_required
 def remove_from_watchlist(request, listing_id):
     if request.user.is_authenticated:
-        listing = get_object_or_404(Listing, pk=listing_id)
-        watchlist, created = Watchlist.objects.get_or_create(user=request.user)
-        if listing in watchlist.listings.all():
-            watchlist.listings.remove(listing)
+        listing = get_object_or_404(Listing.objects.only('id', 'title'), pk=listing_id)
+        if Watchlist.remove_listing(request.user, listing.id):
             messages.success(request, f'Listing "{listing.title}" removed from your watchlist.')
         else:
             messages.warning(request, f'Listing "{listing.title}" is not in your watchlist.')
@@ -209,6 +256,178 @@ def remove_from_watchlist(request, listing_id):
 
 # ====================================================================
 def listing_detail(request, listing_id):
-    listing = get_object_or_404(Listing, pk=listing_id)
-    return render(request, 'auctions/listing_detail.html', {'listing': listing})
-
+    listing = Listing.objects.select_related(
+        'category', 'creator', 'image', 'winning_bid__bidder'
+    ).filter(pk=listing_id).first()
+    if listing is None:
+        # Listings closed long ago live in the archive (auctions/archive.py).
+        return archived_listing_detail(request, listing_id)
+    # The listing details and the comments are cached as template fragments keyed by the listing's version,
+    # see auctions/caching.py. The comments queryset is lazy: it only runs when the fragment has to be rendered.
+    return render(request, 'auctions/listing_detail.html', {
+        'listing': listing,
+        'is_watched': listing.id in Watchlist.is_watching(request.user, [listing.id]),
+        'comments': listing.comments.select_related('commenter').order_by('created_at', 'id'),
+        'pending_comments': pending_comments(listing.id, request.user),
+        'cache_version': listing_version(listing.modified_at),
+        'cache_timeout': get_fragment_timeout(),
+        'proxy_form': ProxyBidForm(),
+    })
+
+
+def archived_listing_detail(request, listing_id):
+    listing = get_archived_listing(listing_id)
+    if listing is None:
+        raise Http404("No listing with this id.")
+    # The page of an archived listing never changes; the comments only load when its cached body has expired.
+    return render(request, 'auctions/archived_listing.html', {
+        'listing': listing,
+        'comments': listing.comments.select_related('commenter').order_by('created_at', 'id'),
+        'cache_timeout': get_fragment_timeout(),
+    })
+
+
+# ====================== listing_events ====================================
+# Server-sent events stream of new bids and comments on a listing, consumed by listing_detail.html.
+# The first event is a snapshot of the current bid so a (re)connecting client is always in sync.
+# Under ASGI the connection then stays open and receives events as they are published; under WSGI a
+# long-lived response would pin a worker, so the stream ends after the snapshot and the browser's
+# EventSource reconnects after the retry interval, which degrades to cheap polling.
+SSE_RETRY_MS = 5000
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def listing_events(request, listing_id):
+    listing = await Listing.objects.filter(pk=listing_id).values('current_bid', 'is_active', 'ends_at').afirst()
+    if listing is None:
+        raise Http404("No listing with this id.")
+    ends_at = listing['ends_at']
+    head = [
+        f'retry: {SSE_RETRY_MS}\n\n',
+        format_sse({'type': 'snapshot', 'listing_id': listing_id, 'current_bid': str(listing['current_bid']),
+                    'is_active': listing['is_active'], 'ends_at': ends_at.isoformat() if ends_at else None}),
+    ]
+
+    async def stream():
+        for chunk in head:
+            yield chunk
+        async with get_broker().subscribe(channel_name(listing_id)) as subscription:
+            while True:
+                try:
+                    event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle connection.
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event)
+
+    # A WSGI server iterates the response synchronously, so it gets a plain iterator over the snapshot.
+    content = stream() if isinstance(request, ASGIRequest) else iter(head)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ====================== instrumentation ====================================
+# Rolling per-view request metrics collected by QueryInstrumentationMiddleware (when enabled), for staff only.
+@staff_member_required
+def instrumentation(request):
+    return JsonResponse({
+        'enabled': getattr(settings, 'AUCTIONS_INSTRUMENTATION', False),
+        'window': request_metrics.registry.window,
+        'views': request_metrics.registry.snapshot(),
+    })
+
+
+# ====================== search ====================================
+# Ranked, paginated full-text search over active listings with category and price facets (auctions/search.py).
+# search renders the results page, search_api returns the same data as JSON.
+# Pages past SEARCH_MAX_PAGE and ids or prices the database can't hold (SQLite integers are 64-bit) are a 404
+# instead of an OverflowError in the backend query.
+SEARCH_MAX_PAGE = 1000
+MAX_ID = 2 ** 63 - 1
+
+
+def run_search(request):
+    terms = parse_terms(request.GET.get('q'))
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+        min_price = Decimal(request.GET['min_price']) if request.GET.get('min_price') else None
+        max_price = Decimal(request.GET['max_price']) if request.GET.get('max_price') else None
+    except (ValueError, ArithmeticError):
+        raise Http404("Invalid search parameters.")
+    if (page > SEARCH_MAX_PAGE or (category_id is not None and not 0 < category_id <= MAX_ID)
+            or any(price is not None and not price.is_finite() for price in (min_price, max_price))):
+        raise Http404("Invalid search parameters.")
+
+    page_size = get_page_size()
+    results = {'query': ' '.join(terms), 'page': page, 'listings': [], 'total': 0,
+               'categories': [], 'prices': [], 'has_next': False}
+    if not terms:
+        return results
+    ids, total, facets = get_search_backend().search(
+        terms, category_id=category_id, min_price=min_price, max_price=max_price,
+        offset=(page - 1) * page_size, limit=page_size,
+    )
+    listings = Listing.objects.select_related('category', 'image').in_bulk(ids)
+    categories = Category.objects.in_bulk(facets['categories'].keys())
+    results.update({
+        'listings': [listings[pk] for pk in ids if pk in listings],
+        'total': total,
+        'has_next': page * page_size < total,
+        'categories': [(categories[pk], count) for pk, count in facets['categories'].items() if pk in categories],
+        'prices': facets['prices'],
+    })
+    return results
+
+
+def search(request):
+    results = run_search(request)
+
+    # Links that change one search parameter and keep the others (going back to the first page).
+    def link(**changes):
+        params = request.GET.copy()
+        params.pop('page', None)
+        for key, value in changes.items():
+            if value is None:
+                params.pop(key, None)
+            else:
+                params[key] = value
+        return '?' + params.urlencode()
+
+    return render(request, 'auctions/search.html', {
+        **results,
+        'category_facets': [(category, count, link(category=category.id)) for category, count in results['categories']],
+        'price_facets': [(low, high, count, link(min_price=low, max_price=high))
+                         for low, high, count in results['prices'] if count],
+        'clear_filters': link(category=None, min_price=None, max_price=None),
+        'next_page': link(page=results['page'] + 1) if results['has_next'] else None,
+    })
+
+
+def search_api(request):
+    results = run_search(request)
+    return JsonResponse({
+        'query': results['query'],
+        'page': results['page'],
+        'total': results['total'],
+        'has_next': results['has_next'],
+        'results': [
+            {
+                'id': listing.id,
+                'title': listing.title,
+                'description': listing.description,
+                'current_bid': str(listing.current_bid),
+                'category': listing.category.name,
+                'url': reverse('listing_detail', args=[listing.id]),
+            }
+            for listing in results['listings']
+        ],
+        'facets': {
+            'categories': [{'id': category.id, 'name': category.name, 'count': count}
+                           for category, count in results['categories']],
+            'prices': [{'min': low, 'max': high, 'count': count} for low, high, count in results['prices']],
+        },
+    })
@@ -15,11 +15,9 @@ import os
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# MEDIA_ROOT = BASE_DIR + '/listing_images/'
-STATIC_URL = "listing_images/"
-
-
-# MEDIA_URL = 'listing_images/'
+# Uploaded listing images (content-addressed originals and thumbnails, see auctions/images.py).
+MEDIA_ROOT = os.path.join(BASE_DIR, 'listing_images')
+MEDIA_URL = '/listing_images/'
 
 
 # Quick-start development settings - unsuitable for production
@@ -46,16 +44,20 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 ]
 
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
-
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves the async read views to ASGI requests (AUCTIONS_ASGI_URLCONF).
+    'auctions.async_views.AsyncViewsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Keeps clients that just wrote on the primary database (auctions/routers.py).
+    'auctions.routers.ReplicaPinningMiddleware',
+    # Only active when AUCTIONS_INSTRUMENTATION is True.
+    'auctions.instrumentation.QueryInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'commerce.urls'
@@ -88,9 +90,116 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # The test database lives in a file rather than in memory so that tests can exercise
+        # concurrent writers from several threads, each with its own connection.
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    }
+}
+
+# Read replica: reads of the auctions models go to AUCTIONS_READ_REPLICAS (auctions/routers.py). To try it locally
+# with a second SQLite file standing in for the replica:
+#
+#     AUCTIONS_REPLICA_DB=replica.sqlite3 python manage.py sync_sqlite_replica --interval 1 &
+#     AUCTIONS_REPLICA_DB=replica.sqlite3 python manage.py runserver
+AUCTIONS_REPLICA_DB = os.environ.get('AUCTIONS_REPLICA_DB', '')
+if AUCTIONS_REPLICA_DB:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, AUCTIONS_REPLICA_DB),
+        'TEST': {'MIRROR': 'default'},
+    }
+AUCTIONS_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Seconds a client reads from the primary after writing through bid, proxy_bid, add_comment, create_listing or the
+# watchlist views.
+AUCTIONS_REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = ['auctions.routers.ReplicaRouter']
+
+# AUCTIONS_DB_PROFILE=edge: tuning for deployments that stay on SQLite (see auctions/db.py). Connections are kept open
+# between requests, write transactions take the write lock when they begin (BEGIN IMMEDIATE, so two transactions can't
+# both read and then deadlock trying to write), the bid writers of a process queue up on a lock instead of polling
+# SQLite's, and every connection is set up with AUCTIONS_SQLITE_PRAGMAS.
+AUCTIONS_DB_PROFILE = os.environ.get('AUCTIONS_DB_PROFILE', '')
+AUCTIONS_SQLITE_PRAGMAS = {}
+AUCTIONS_SQLITE_SERIALIZE_WRITES = False
+if AUCTIONS_DB_PROFILE == 'edge':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds to wait for a lock (the sqlite3 module's busy handler).
+            'timeout': 10,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    AUCTIONS_SQLITE_SERIALIZE_WRITES = True
+    AUCTIONS_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 10000,
+        'temp_store': 'MEMORY',
     }
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Per-process memory by default. To share the cache between worker processes without extra services,
+# switch to the file-based backend:
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': os.path.join(BASE_DIR, 'cache'),
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('AUCTIONS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('AUCTIONS_CACHE_LOCATION', 'auctions'),
+    },
+    # Sessions under the cache and cached_db session profiles below. Files on local disk by default: shared by the
+    # worker processes of a host, kept across restarts, and nothing is written to the database.
+    'sessions': {
+        'BACKEND': os.environ.get('AUCTIONS_SESSION_CACHE_BACKEND',
+                                  'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('AUCTIONS_SESSION_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'sessions')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
+# Sessions and messages
+# AUCTIONS_SESSION_PROFILE picks where sessions and flash messages live. With 'db' (the default), every request with
+# a session cookie reads django_session and every message (adding it, then showing it) rewrites the row, on the
+# same SQLite file the bids are written to. The other profiles keep messages in a cookie and:
+#   cached_db       reads sessions from the 'sessions' cache, writes them to both (survives clearing the cache),
+#   cache           keeps sessions only in the 'sessions' cache,
+#   signed_cookies  keeps sessions in a signed cookie (no server-side state; can't be revoked before they expire).
+# Expired rows left in django_session are removed by `manage.py clear_expired_sessions`. bench_sessions compares the
+# profiles.
+AUCTIONS_SESSION_PROFILES = {
+    'db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.session.SessionStorage',
+    },
+    'cached_db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'SESSION_CACHE_ALIAS': 'sessions',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    },
+    'cache': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cache',
+        'SESSION_CACHE_ALIAS': 'sessions',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    },
+    'signed_cookies': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    },
+}
+AUCTIONS_SESSION_PROFILE = os.environ.get('AUCTIONS_SESSION_PROFILE', 'db')
+SESSION_ENGINE = AUCTIONS_SESSION_PROFILES[AUCTIONS_SESSION_PROFILE]['SESSION_ENGINE']
+SESSION_CACHE_ALIAS = AUCTIONS_SESSION_PROFILES[AUCTIONS_SESSION_PROFILE].get('SESSION_CACHE_ALIAS', 'default')
+MESSAGE_STORAGE = AUCTIONS_SESSION_PROFILES[AUCTIONS_SESSION_PROFILE]['MESSAGE_STORAGE']
+
 AUTH_USER_MODEL = 'auctions.User'
 
 # Password validation
@@ -131,4 +240,70 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Auctions
+
+# Number of listings per page on the index and category pages (keyset paginated, see auctions/pagination.py).
+AUCTIONS_PAGE_SIZE = 24
+
+# Lifetime (seconds) of the cached listing page fragments, see auctions/caching.py.
+AUCTIONS_LISTING_CACHE_TIMEOUT = 300
+
+# Per-view query count and latency instrumentation, see auctions/instrumentation.py. Metrics are served to staff
+# at /instrumentation/; a warning is logged for requests running more queries than their budget.
+AUCTIONS_INSTRUMENTATION = os.environ.get('AUCTIONS_INSTRUMENTATION', '') == '1'
+AUCTIONS_INSTRUMENTATION_WINDOW = 1000
+AUCTIONS_QUERY_BUDGET = 10
+AUCTIONS_QUERY_BUDGETS = {
+    'index': 4,
+    'category_list': 3,
+    'listing_detail': 6,
+}
+
+# Thumbnail generation for uploaded images: number of background worker threads (0 = generate inline).
+AUCTIONS_THUMBNAIL_WORKERS = 2
+
+# Seconds the expire_auctions worker waits between sweeps for auctions past their ends_at, see auctions/expiry.py.
+AUCTIONS_EXPIRY_INTERVAL = 5
+
+# Soft close: a bid placed within AUCTIONS_SOFT_CLOSE_WINDOW seconds of ends_at moves the end to
+# AUCTIONS_SOFT_CLOSE_EXTENSION seconds after the bid (0 disables it), see auctions/services.py.
+AUCTIONS_SOFT_CLOSE_WINDOW = 120
+AUCTIONS_SOFT_CLOSE_EXTENSION = 120
+
+# Step by which proxy (maximum) bids outbid each other, see auctions/services.py.
+AUCTIONS_BID_INCREMENT = '1.00'
+
+# URLconf for requests served through commerce/asgi.py: the same routes, with the read-only pages replaced by their
+# async versions (auctions/async_views.py).
+AUCTIONS_ASGI_URLCONF = 'commerce.urls_asgi'
+
+# Times a write transaction that failed with "database is locked" is re-run, and the base of its exponential backoff
+# in seconds, see auctions/db.py.
+AUCTIONS_WRITE_RETRIES = 3
+AUCTIONS_WRITE_RETRY_BACKOFF = 0.05
+
+# Write-behind comments: queued comments are written in one batch once AUCTIONS_COMMENT_BATCH_SIZE are waiting
+# (1 = write each comment inline) or AUCTIONS_COMMENT_FLUSH_INTERVAL seconds after the first, see auctions/comments.py.
+AUCTIONS_COMMENT_BATCH_SIZE = 50
+AUCTIONS_COMMENT_FLUSH_INTERVAL = 1.0
+
+# Outbid and auction-closed notifications (auctions/notifications.py): where they are delivered, how many go to the
+# sink at once, and how often `dispatch_notifications --loop` checks the outbox, in seconds.
+AUCTIONS_NOTIFICATION_SINK = 'auctions.notifications.EmailSink'
+AUCTIONS_NOTIFICATION_SEND_BATCH = 500
+AUCTIONS_NOTIFICATION_INTERVAL = 2
+
+# Email for the notifications: printed to the console by default. To collect them in files instead:
+#     AUCTIONS_EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend
+EMAIL_BACKEND = os.environ.get('AUCTIONS_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+DEFAULT_FROM_EMAIL = 'auctions@localhost'
+
+# Listings closed more than this many days ago are moved to the archive tables by `manage.py archive_listings`,
+# see auctions/archive.py.
+AUCTIONS_ARCHIVE_AFTER_DAYS = 90
+
+# Admin changelists count at most this many rows exactly; bigger tables are estimated, see auctions/pagination.py.
+AUCTIONS_EXACT_COUNT_LIMIT = 10000
@@ -14,6 +14,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.template.defaulttags import url
 from django.urls import include, path
@@ -25,4 +26,8 @@ urlpatterns = [
     # path('auctions/', include('auctions.urls')),
 ]
 
+if settings.DEBUG:
+    # Uploaded listing images; in production the web server serves MEDIA_ROOT directly.
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
 
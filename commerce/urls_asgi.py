@@ -0,0 +1,17 @@
+"""commerce URL Configuration for ASGI requests
+
+Same routes as commerce/urls.py, with the auctions pages served by their async views (auctions/urls_asgi.py).
+Selected per request by auctions.async_views.AsyncViewsMiddleware.
+"""
+from django.conf import settings
+from django.conf.urls.static import static
+from django.contrib import admin
+from django.urls import include, path
+
+urlpatterns = [
+    path("", include("auctions.urls_asgi")),
+    path("admin/", admin.site.urls),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)